@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from main.images import derivative_url
 from main.models import Article, UploadFiles, TagPost, UserLoginHistory, Categorys
 from profdetails.models import JobDetails, Equipment
 from study.models import SubjectCompletion, Subject
@@ -55,16 +56,30 @@ class SubjectCompletionSerializer(serializers.ModelSerializer):
 class LeaderSerializer(serializers.ModelSerializer):
     cat_name = serializers.CharField(source='cat2.name', read_only=True)
     subject_completions = SubjectCompletionSerializer(many=True, read_only=True)
-    instructaj = serializers.CharField(source='user.profile.instructaj', read_only=True)
+    instructaj = serializers.BooleanField(source='profile.instructaj', read_only=True)
 
     class Meta:
         model = get_user_model()
         fields = ('id', 'username', 'email', 'status', 'cat_name', 'instructaj', 'last_activity', 'subject_completions')
 
 
+class ResizedImageField(serializers.Field):
+    """Ссылка на уменьшенную копию изображения заданного размера (или на оригинал, пока копии нет)"""
+    def __init__(self, size='medium', **kwargs):
+        self.size = size
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        url = derivative_url(value, self.size)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url or None
+
+
 class ProfileUserSerializer(serializers.ModelSerializer):
     cat_name = serializers.CharField(source='cat2.name', read_only=True)
     photo = serializers.ImageField(source='profile.photo')
+    photo_thumb = ResizedImageField(source='profile.photo', size='thumb')
     patronymic = serializers.CharField(source='profile.patronymic')
     prof = serializers.CharField(source='profile.profession')
     date_birth = serializers.DateField(source='profile.date_birth')
@@ -72,7 +87,7 @@ class ProfileUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = (
-        'id', 'photo', 'username', 'first_name', 'last_name', 'patronymic', 'cat_name', 'status', 'prof', 'date_birth')
+        'id', 'photo', 'photo_thumb', 'username', 'first_name', 'last_name', 'patronymic', 'cat_name', 'status', 'prof', 'date_birth')
         read_only_fields = ('id', 'username', 'cat_name', 'status')
 
 
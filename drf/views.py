@@ -12,6 +12,7 @@ from main.models import Article, Categorys, UploadFiles, TagPost, UserLoginHisto
 from profdetails.models import JobDetails, WorkingConditions, Equipment
 from study.models import Subject
 from study.utils import UserQuerysetMixin
+from users.activity import attach_last_activity
 from users.models import Profession, Departments
 
 
@@ -77,7 +78,8 @@ class LeaderViewSet(viewsets.ViewSet, UserQuerysetMixin):
 
     def list(self, request):
         user = request.user
-        queryset = self.get_user_queryset(user)
+        queryset = list(self.get_user_queryset(user))
+        attach_last_activity(queryset)
         serializer = self.serializer_class(queryset, many=True)
         return Response(serializer.data)
 
@@ -1,14 +1,16 @@
 from django.contrib import admin, messages
-from django.db.models import Q
+from django.db import transaction
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django_mptt_admin.admin import DjangoMpttAdmin
 from simple_history.admin import SimpleHistoryAdmin
 from django import forms
 
+from main.blobs import publish_files, store_blob, release_blob
 from main.models import Categorys, UploadFiles, Article, Rating, TagPost, \
-    Comment, UniqueView, Notification, Notice, UserLoginHistory, SentMessage
+    Comment, UniqueView, Notification, Notice, UserLoginHistory, SentMessage, SlowQuery
+from main.slowlog import explain_slow_query
 from main.utils import validate_file
-from users.models import Departments
 
 
 class CustomUploadFileAdminForm(forms.ModelForm):
@@ -47,29 +49,16 @@ class UploadFilesAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         if not change:  # Если создается новый объект
-            category = obj.cat
-            is_common = category.is_inpatient
-
-            if is_common:
-                departments = Departments.objects.filter(Q(is_inpatient=is_common))
-                first_department = departments.first()
-
-                # Создаем общую запись
-                common_upload = UploadFiles.objects.create(
-                    cat=first_department,
-                    file=obj.file,
-                    is_common=True
-                )
-                # Создаем ссылки на общий файл для остальных отделений
-                for department in departments.exclude(pk=first_department.pk):
-                    UploadFiles.objects.create(
-                        cat=department,
-                        file=common_upload.file,
-                        is_common=True
-                    )
-            else:
-                # Создаем отдельную запись для амбулаторного отделения
-                obj.save()
+            # Для стационарного отделения файл станет общим; содержимое хранится в одном экземпляре
+            uploads = publish_files([form.cleaned_data['file']], obj.cat, title=obj.title)
+            obj.pk = uploads[0].pk  # pk нужен админке для журнала действий и перенаправления
+        elif 'file' in form.changed_data:
+            previous_blob_id = obj.blob_id
+            blob = store_blob(form.cleaned_data['file'])
+            obj.blob, obj.file = blob, blob.file.name
+            obj.save()
+            if previous_blob_id and previous_blob_id != blob.pk:
+                transaction.on_commit(lambda: release_blob(previous_blob_id))
         else:
             obj.save()
 
@@ -103,8 +92,9 @@ class CommentAdmin(DjangoMpttAdmin):
 
 @admin.register(Article)
 class ArticleAdmin(SimpleHistoryAdmin):
-    fields = ['title', 'slug', 'content', 'photo', 'post_photo', 'category', 'tags', 'views', 'is_published']
-    readonly_fields = ['post_photo', 'views']
+    fields = ['title', 'slug', 'content', 'photo', 'post_photo', 'category', 'tags', 'views', 'likes_count',
+              'dislikes_count', 'rating', 'comments_count', 'is_published']
+    readonly_fields = ['post_photo', 'views', 'likes_count', 'dislikes_count', 'rating', 'comments_count']
     prepopulated_fields = {"slug": ("title",)}
     filter_vertical = ['tags']
     list_display = ('title', 'post_photo', 'time_create', 'is_published', 'category')
@@ -170,3 +160,50 @@ class SentMessageAdmin(admin.ModelAdmin):
     list_select_related = ['user']
     readonly_fields = ['user', 'purpose', 'timestamp']
     list_filter = ['user', 'purpose']
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['short_sql', 'view', 'calls', 'average', 'max_ms', 'last_seen', 'explained_at']
+    list_filter = ['view']
+    search_fields = ['sql', 'view', 'source']
+    fields = ['view', 'source', 'calls', 'total_ms', 'max_ms', 'first_seen', 'last_seen', 'sql', 'params',
+              'explained_at', 'plan_text']
+    readonly_fields = fields
+    actions = ['refresh_plan']
+
+    def has_add_permission(self, request):
+        return False
+
+    # В тексте запросов и параметрах остаются данные пользователей, поэтому журнал только для суперпользователей
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    @admin.display(description='SQL')
+    def short_sql(self, slow_query: SlowQuery):
+        return slow_query.sql[:120]
+
+    @admin.display(description='Среднее время, мс', ordering='total_ms')
+    def average(self, slow_query: SlowQuery):
+        return round(slow_query.avg_ms, 1)
+
+    @admin.display(description='План выполнения')
+    def plan_text(self, slow_query: SlowQuery):
+        return format_html('<pre>{}</pre>', slow_query.plan)
+
+    @admin.action(description='Получить план выполнения заново')
+    def refresh_plan(self, request, queryset):
+        count = 0
+        for slow_query in queryset:
+            explain_slow_query(slow_query)
+            count += 1
+        self.message_user(request, f"Обновлено планов: {count}.")
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import uuid
+import zipfile
+
+from django.core.files.storage import default_storage
+
+from ohr.settings import ARCHIVES_DIR
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamBuffer:
+    """
+    Файлоподобный объект без seek: ZipFile пишет в него архив, а генератор сразу забирает записанное.
+    В поток без seek ZipFile пишет размеры файлов после их данных, поэтому память не растёт с размером архива.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_entries(uploads) -> list[tuple[str, str]]:
+    """Пары (имя в архиве, путь на диске); одинаковые имена получают номер."""
+    entries, used = [], set()
+    for upload in uploads:
+        _, ext = os.path.splitext(upload.file.name)
+        base = upload.title if upload.title.lower().endswith(ext.lower()) else upload.title + ext
+        name, stem, number = base, os.path.splitext(base)[0], 1
+        while name.lower() in used:
+            number += 1
+            name = f'{stem} ({number}){ext}'
+        used.add(name.lower())
+        entries.append((name, upload.file.path))
+    return entries
+
+
+def manifest_hash(uploads) -> str:
+    """Хэш состава папки: меняется при добавлении, удалении, переименовании или замене любого файла."""
+    digest = hashlib.sha256()
+    for upload in sorted(uploads, key=lambda upload: upload.pk):
+        content = upload.blob.sha256 if upload.blob_id else f'{upload.file.name}:{upload.uploaded_at.isoformat()}'
+        digest.update(f'{upload.pk}|{upload.title}|{content}\n'.encode())
+    return digest.hexdigest()
+
+
+def stream_zip(entries, save_as: str = None):
+    """
+    Генератор байтов ZIP-архива, который собирается по мере отправки клиенту.
+    Если указан save_as, архив одновременно записывается в хранилище и после полной отправки
+    становится кэшем для следующих запросов; при обрыве соединения недописанный файл удаляется.
+    """
+    buffer = StreamBuffer()
+    cache_file = part_path = None
+    if save_as:
+        part_path = default_storage.path(save_as) + f'.{uuid.uuid4().hex}.part'  # Параллельные запросы не мешают
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        cache_file = open(part_path, 'wb')
+
+    def emit():
+        data = buffer.pop()
+        if cache_file and data:
+            cache_file.write(data)
+        return data
+
+    completed = False
+    try:
+        # Документы (pdf, docx, xlsx) уже сжаты, поэтому достаточно быстрого уровня сжатия
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for arcname, path in entries:
+                if not os.path.isfile(path):
+                    continue
+                with open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        if data := emit():
+                            yield data
+                if data := emit():
+                    yield data
+        if data := emit():  # Центральный каталог
+            yield data
+        completed = True
+    finally:
+        if cache_file:
+            cache_file.close()
+            if completed:
+                os.replace(part_path, default_storage.path(save_as))
+            else:
+                os.remove(part_path)
+
+
+def cached_archive_name(dep_slug: str, manifest: str) -> str:
+    return f'{ARCHIVES_DIR}/{dep_slug}/{manifest}.zip'
+
+
+def remove_stale_archives(dep_slug: str, keep: str) -> None:
+    """Удаляет архивы папки, собранные для прежнего состава файлов."""
+    directory = default_storage.path(f'{ARCHIVES_DIR}/{dep_slug}')
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith('.zip') and name != os.path.basename(keep):
+            os.remove(os.path.join(directory, name))
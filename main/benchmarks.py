@@ -0,0 +1,95 @@
+"""
+Бюджеты горячих страниц: сколько SQL-запросов и миллисекунд допускается на один ответ.
+Используются тестами (регрессии N+1) и командой bench_views (отчёт на синтетических данных generate_dataset).
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import Article
+
+# Страница -> имя URL, роль пользователя, параметр URL, GET-параметры, бюджет запросов, потолок времени (мс).
+# Бюджет считается для повторного запроса, когда кэши (шапка сайта, рейтинги) уже заполнены,
+# и не должен зависеть от объёма данных: каждая строка сверх бюджета — признак N+1.
+HOT_VIEWS = {
+    'index': {'url': 'main:index', 'role': 'worker', 'queries': 10, 'ms': 300},
+    'articles': {'url': 'main:home', 'role': 'worker', 'queries': 10, 'ms': 300},
+    'article': {'url': 'main:post', 'role': 'worker', 'arg': 'article', 'queries': 14, 'ms': 400},
+    'mainfiles': {'url': 'main:maindoc', 'role': 'worker', 'arg': 'department', 'queries': 10, 'ms': 300},
+    'search': {'url': 'main:post_search', 'role': 'worker', 'params': {'query': 'охрана труда'},
+               'queries': 12, 'ms': 500},
+    'notifications': {'url': 'main:notification-list', 'role': 'worker', 'queries': 10, 'ms': 300},
+    'login_history': {'url': 'main:login_history', 'role': 'worker', 'queries': 10, 'ms': 300},
+    'my_results': {'url': 'study:result', 'role': 'worker', 'queries': 10, 'ms': 300},
+    'leader_results': {'url': 'study:leader_results', 'role': 'leader', 'queries': 14, 'ms': 500},
+    'leader_results_all': {'url': 'study:leader_results', 'role': 'staff', 'queries': 14, 'ms': 800},
+    'leader_incomplete': {'url': 'study:leader_results', 'role': 'leader', 'params': {'show_incomplete': 'on'},
+                          'queries': 14, 'ms': 300},
+    'leader_api': {'url': 'drf:leader-list', 'role': 'leader', 'params': {'format': 'json'},
+                   'queries': 10, 'ms': 800},
+}
+
+
+def pick_user(role: str):
+    """Пользователь для роли: руководитель отделения, администратор или рядовой сотрудник с профилем."""
+    User = get_user_model()
+    users = User.objects.filter(is_active=True, profile__isnull=False, cat2__isnull=False).order_by('pk')
+    if role == 'staff':
+        return users.filter(is_superuser=True).first()
+    if role == 'leader':
+        return users.filter(status=User.Status.LEADER).first()
+    return users.filter(status=User.Status.WORKER).first()
+
+
+def view_url(view: dict, user) -> str:
+    if view.get('arg') == 'department':
+        return reverse(view['url'], kwargs={'dep_slug': user.cat2.slug})
+    if view.get('arg') == 'article':
+        # Статья с наибольшим числом комментариев — самый тяжёлый случай
+        article = Article.published.order_by('-comments_count', 'pk').first()
+        return reverse(view['url'], kwargs={'post_slug': article.slug})
+    return reverse(view['url'])
+
+
+def measure(client, name: str, user=None) -> dict:
+    """
+    Запрашивает страницу от имени пользователя её роли и возвращает число запросов и время ответа.
+    Первый запрос прогревает кэши и не учитывается.
+    """
+    view = HOT_VIEWS[name]
+    user = user or pick_user(view['role'])
+    result = {'name': name, 'queries_budget': view['queries'], 'ms_budget': view['ms'],
+              'status': None, 'queries': None, 'ms': None}
+    if user is None:
+        return result
+    client.force_login(user)
+    url = view_url(view, user)
+    client.get(url, view.get('params'))
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url, view.get('params'))
+        result['ms'] = (time.perf_counter() - started) * 1000
+    result.update(status=response.status_code, queries=len(queries))
+    return result
+
+
+def within_budget(result: dict, check_time: bool = True) -> bool:
+    if result['status'] != 200:
+        return False
+    return result['queries'] <= result['queries_budget'] and (not check_time or result['ms'] <= result['ms_budget'])
+
+
+def report_table(results: list[dict], check_time: bool = True) -> str:
+    """Таблица результатов для вывода в консоль и журнал сборки."""
+    lines = [f'{"Страница":<20} {"Код":>4} {"Запросы":>9} {"Бюджет":>7} {"Время, мс":>10} {"Потолок":>8}  Итог']
+    for result in results:
+        if result['status'] is None:
+            lines.append(f'{result["name"]:<20} {"-":>4} {"":>9} {"":>7} {"":>10} {"":>8}  нет пользователя')
+            continue
+        verdict = 'OK' if within_budget(result, check_time) else 'ПРЕВЫШЕН'
+        lines.append(f'{result["name"]:<20} {result["status"]:>4} {result["queries"]:>9} '
+                     f'{result["queries_budget"]:>7} {result["ms"]:>10.1f} {result["ms_budget"]:>8}  {verdict}')
+    return '\n'.join(lines)
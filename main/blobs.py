@@ -0,0 +1,117 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from main.models import FileBlob, UploadFiles
+from main.previews import delete_preview
+from users.models import Departments
+
+BLOBS_DIR = 'uploads_model/blobs'
+
+
+def blob_name(sha256: str, filename: str) -> str:
+    """Путь файла в хранилище: uploads_model/blobs/<первые 2 символа хэша>/<хэш>/<исходное имя>."""
+    return f'{BLOBS_DIR}/{sha256[:2]}/{sha256}/{os.path.basename(filename)}'
+
+
+def tmp_path(name: str) -> str:
+    """Абсолютный путь временного файла в том же хранилище, что и содержимое (переименование без копирования)."""
+    path = default_storage.path(f'{BLOBS_DIR}/tmp/{name}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def adopt_blob(path: str, filename: str, sha256: str = None) -> FileBlob:
+    """
+    Делает файл на диске содержимым FileBlob: переносит его в хранилище по хэшу
+    или удаляет, если такое содержимое уже сохранено. Вызывается в той же транзакции, в которой создаются
+    ссылающиеся на содержимое записи: найденная строка блокируется до её конца, и release_blob не удалит
+    содержимое, на которое ещё не успели сослаться.
+    """
+    digest = sha256 or hash_file(path)
+    # Если release_blob как раз удаляет это содержимое, запрос дождётся конца удаления и не найдёт строку
+    with transaction.atomic():  # Без внешней транзакции блокировка снимается сразу после проверки
+        blob = FileBlob.objects.select_for_update().filter(sha256=digest).first()
+    if blob is not None:
+        os.remove(path)
+        return blob
+
+    name = blob_name(digest, filename)
+    size = os.path.getsize(path)
+    final_path = default_storage.path(name)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(path, final_path)  # Переименование в пределах одного диска атомарно
+    try:
+        with transaction.atomic():
+            return FileBlob.objects.create(sha256=digest, file=name, size=size)
+    except IntegrityError:
+        # Тот же файл параллельно загрузил другой запрос: путь совпадает, копия на диске одна
+        return FileBlob.objects.get(sha256=digest)
+
+
+def store_blob(uploaded_file) -> FileBlob:
+    """
+    Сохраняет загруженный файл в хранилище один раз на содержимое.
+    Хэш считается в том же проходе, в котором файл записывается во временный файл.
+    """
+    path = tmp_path(uuid.uuid4().hex)
+    sha256 = hashlib.sha256()
+    with open(path, 'wb') as tmp:
+        for chunk in uploaded_file.chunks():
+            sha256.update(chunk)
+            tmp.write(chunk)
+    return adopt_blob(path, uploaded_file.name, sha256=sha256.hexdigest())
+
+
+def publish_blobs(blobs, category, title: str = None) -> list[UploadFiles]:
+    """
+    Публикует содержимое (пары FileBlob и исходное имя файла) для отделения. Файл стационарного
+    отделения становится общим для всех стационарных отделений: записи создаются одним bulk_create.
+    """
+    is_common = category.is_inpatient
+    departments = list(Departments.objects.filter(is_inpatient=True)) if is_common else [category]
+    uploads = [UploadFiles(cat=department, file=blob.file.name, blob=blob, is_common=is_common,
+                           title=title or os.path.basename(filename))
+               for blob, filename in blobs for department in departments]
+    return UploadFiles.objects.bulk_create(uploads, batch_size=500)
+
+
+@transaction.atomic
+def publish_files(files, category, title: str = None) -> list[UploadFiles]:
+    """Сохраняет загруженные файлы в хранилище и публикует их для отделения."""
+    return publish_blobs([(store_blob(uploaded_file), uploaded_file.name) for uploaded_file in files],
+                         category, title)
+
+
+def release_blob(blob_id: int) -> None:
+    """
+    Удаляет содержимое вместе с физическим файлом, если на него больше не ссылается ни одна запись.
+    Файл удаляется до фиксации, пока строка заблокирована: adopt_blob с тем же хэшем ждёт блокировку
+    и после неё кладёт новый файл на уже освобождённое место.
+    """
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None or blob.uploads.exists():
+            return
+        name, sha256 = blob.file.name, blob.sha256
+        blob.delete()
+        default_storage.delete(name)
+        delete_preview(sha256)
+        # Убираем опустевшие каталоги <хэш> и <первые 2 символа хэша>
+        directory = os.path.dirname(default_storage.path(name))
+        for path in (directory, os.path.dirname(directory)):
+            try:
+                os.rmdir(path)
+            except OSError:  # Каталог не пуст
+                break
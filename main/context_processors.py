@@ -1,14 +1,14 @@
+from main.summary import get_header_summary
 from ohr.settings import TELEPHONE, POCHTA
 
 
 def notifications(request):
     if request.user.is_authenticated:
-        notifications = request.user.notifications.filter(user=request.user, is_read=False)
-        notice = request.user.notice.filter(user=request.user, is_read=False)
+        summary = get_header_summary(request)
         return {
-            'notifications': notifications,
-            'notice': notice,
-            'notifications_count': notifications.count() + notice.count()
+            'notifications': summary['notifications'],
+            'notice': summary['notice'],
+            'notifications_count': summary['notifications_count']
         }
     return {}
 
@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from main.models import Article, UniqueView, Rating, Comment
+from main.utils import CacheQueue
+from ohr.settings import VIEWS_DEDUP_TIMEOUT
+
+views_queue = CacheQueue('article-views')
+
+# Из повторных оценок одного владельца остаётся последняя; {owner} — условие совпадения владельца
+DEDUPLICATE_RATINGS_SQL = """
+    DELETE FROM {table} AS older USING {table} AS newer
+    WHERE older.post_id = newer.post_id AND {owner}
+      AND (older.time_create, older.id) < (newer.time_create, newer.id)
+    RETURNING older.post_id
+"""
+RATING_OWNERS = (
+    'older.user_id = newer.user_id',
+    'older.user_id IS NULL AND newer.user_id IS NULL AND older.ip_address = newer.ip_address',
+)
+
+
+def record_view(article_id: int, ip_address: str) -> None:
+    """
+    Регистрирует просмотр статьи без обращения к базе данных.
+    Повторные просмотры с того же IP отсекаются в кэше, уникальные попадают в очередь,
+    которую периодически сбрасывает flush_views.
+    """
+    if cache.add(f'article-views:seen:{article_id}:{ip_address}', 1, VIEWS_DEDUP_TIMEOUT):
+        views_queue.push((article_id, ip_address))
+
+
+def flush_views(batch_size: int = 5000) -> int:
+    """
+    Переносит накопленные просмотры в UniqueView и пересчитывает Article.views
+    одним UPDATE для всех затронутых статей. Просмотры удалённых статей отбрасываются; при ошибке записи
+    пачка остаётся в очереди до следующего запуска. Возвращает количество обработанных просмотров.
+    """
+    processed = 0
+    while True:
+        with views_queue.consume(limit=batch_size) as hits:
+            if not hits:
+                break
+            article_ids = set(Article.objects.filter(pk__in={article_id for article_id, _ in hits})
+                              .values_list('pk', flat=True))
+            UniqueView.objects.bulk_create(
+                [UniqueView(article_id=article_id, ip_address=ip_address) for article_id, ip_address in set(hits)
+                 if article_id in article_ids],
+                ignore_conflicts=True,  # Просмотр мог быть учтён раньше, чем истекла отметка в кэше
+                batch_size=1000,
+            )
+            unique_views = UniqueView.objects.filter(article=OuterRef('pk')).order_by().values('article').annotate(
+                total=Count('pk')).values('total')
+            Article.objects.filter(pk__in=article_ids).update(views=Coalesce(Subquery(unique_views), 0))
+            processed += len(hits)
+    return processed
+
+
+def _count_subquery(queryset):
+    """Коррелированный подзапрос COUNT(*) по статье для использования в UPDATE."""
+    return Coalesce(Subquery(
+        queryset.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_article_counters(queryset=None) -> int:
+    """
+    Пересчитывает денормализованные счётчики статей по исходным таблицам.
+    Возвращает количество обновлённых статей.
+    """
+    queryset = Article.objects.all() if queryset is None else queryset
+    updated = queryset.update(
+        likes_count=_count_subquery(Rating.objects.filter(value=1)),
+        dislikes_count=_count_subquery(Rating.objects.filter(value=-1)),
+        comments_count=_count_subquery(Comment.objects.all()),
+        views=Coalesce(Subquery(
+            UniqueView.objects.filter(article=OuterRef('pk')).order_by().values('article').annotate(
+                total=Count('pk')).values('total')
+        ), 0),
+    )
+    # Рейтинг считается вторым шагом, когда лайки и дизлайки уже актуальны
+    queryset.update(rating=F('likes_count') - F('dislikes_count'))
+    return updated
+
+
+def deduplicate_ratings(using: str = 'default') -> set[int]:
+    """
+    Удаляет повторные оценки статьи от одного пользователя (для анонимов — от одного IP), оставляя последнюю.
+    Раньше повторы были возможны, а ограничения unique_rating_user и unique_rating_anonymous их запрещают,
+    поэтому чистка выполняется перед миграцией, пока ограничений в базе нет. Возвращает id затронутых статей.
+    """
+    connection = connections[using]
+    table = Rating._meta.db_table
+    post_ids = set()
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return post_ids
+        constraints = connection.introspection.get_constraints(cursor, table)
+        if {'unique_rating_user', 'unique_rating_anonymous'} <= constraints.keys():
+            return post_ids
+        for owner in RATING_OWNERS:
+            cursor.execute(DEDUPLICATE_RATINGS_SQL.format(table=connection.ops.quote_name(table), owner=owner))
+            post_ids.update(post_id for post_id, in cursor.fetchall())
+    return post_ids
@@ -0,0 +1,82 @@
+"""
+Извлечение текста из загруженных документов для полнотекстового поиска.
+Модуль не зависит от Django, чтобы его можно было выполнять в отдельных процессах.
+"""
+import os
+import re
+import zipfile
+
+from defusedxml.ElementTree import fromstring
+
+# Пространства имён OOXML, в которых лежат текстовые узлы
+WORD_TEXT = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'
+WORD_PARAGRAPH = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p'
+SHEET_TEXT = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t'
+SLIDE_TEXT = '{http://schemas.openxmlformats.org/drawingml/2006/main}t'
+
+
+def _xml_text(data: bytes, tag: str) -> str:
+    return ' '.join(node.text for node in fromstring(data).iter(tag) if node.text)
+
+
+def _docx_text(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        root = fromstring(archive.read('word/document.xml'))
+    # Абзацы разделяем переводом строки, чтобы слова из соседних абзацев не склеивались
+    return '\n'.join(''.join(node.text or '' for node in paragraph.iter(WORD_TEXT))
+                     for paragraph in root.iter(WORD_PARAGRAPH))
+
+
+def _xlsx_text(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        parts = [name for name in archive.namelist()
+                 if name == 'xl/sharedStrings.xml' or name.startswith('xl/worksheets/sheet')]
+        return '\n'.join(_xml_text(archive.read(name), SHEET_TEXT) for name in parts)
+
+
+def _pptx_text(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        slides = sorted(name for name in archive.namelist() if re.fullmatch(r'ppt/slides/slide\d+\.xml', name))
+        return '\n'.join(_xml_text(archive.read(name), SLIDE_TEXT) for name in slides)
+
+
+def _pdf_text(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:  # pypdf не установлен: PDF индексируется только по названию
+        return ''
+    return '\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)
+
+
+def _rtf_text(path: str) -> str:
+    with open(path, 'rb') as file:
+        data = file.read().decode('latin-1')
+    # Символы вида \'e0 в кодировке cp1251, \uN — юникод; управляющие слова и группы отбрасываем
+    data = re.sub(r"\\'([0-9a-fA-F]{2})", lambda m: bytes.fromhex(m.group(1)).decode('cp1251'), data)
+    data = re.sub(r'\\u(-?\d+)\??', lambda m: chr(int(m.group(1)) % 65536), data)
+    data = re.sub(r'\\[a-zA-Z]+-?\d* ?|[{}]', ' ', data)
+    return data
+
+
+EXTRACTORS = {
+    'docx': _docx_text,
+    'xlsx': _xlsx_text,
+    'pptx': _pptx_text,
+    'pdf': _pdf_text,
+    'rtf': _rtf_text,
+}
+
+
+def extract_text(path: str, limit: int) -> str:
+    """
+    Возвращает текст документа (не более limit символов).
+    Неподдерживаемые форматы (например, .doc) и повреждённые файлы дают пустую строку.
+    """
+    extractor = EXTRACTORS.get(os.path.splitext(path)[1].lstrip('.').lower())
+    if extractor is None or not os.path.isfile(path):
+        return ''
+    try:
+        text = extractor(path)
+    except Exception:
+        return ''
+    return re.sub(r'\s+', ' ', text).strip()[:limit]
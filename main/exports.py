@@ -0,0 +1,151 @@
+"""
+Потоковая выгрузка таблиц в CSV и XLSX: строки берутся из генератора и сразу отдаются клиенту или пишутся в файл,
+поэтому память не растёт с числом строк. XLSX — это ZIP из нескольких XML-частей; лист пишется в архив по мере
+получения строк через StreamBuffer, как архивы папок отделений, без сторонних библиотек.
+"""
+import csv
+import datetime
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from main.archives import StreamBuffer
+
+FLUSH_SIZE = 64 * 1024  # Сколько символов строк копится перед отправкой
+EXCEL_EPOCH = datetime.date(1899, 12, 30)
+ILLEGAL_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+PACKAGE_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DOCUMENT_RELS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        f'<Relationships xmlns="{PACKAGE_RELS_NS}">'
+        f'<Relationship Id="rId1" Type="{DOCUMENT_RELS_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/_rels/workbook.xml.rels': (
+        f'<Relationships xmlns="{PACKAGE_RELS_NS}">'
+        f'<Relationship Id="rId1" Type="{DOCUMENT_RELS_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{DOCUMENT_RELS_NS}/styles" Target="styles.xml"/>'
+        '</Relationships>'),
+    # Стили: 0 — обычная ячейка, 1 — дата (встроенный формат 14), 2 — жирный заголовок
+    'xl/styles.xml': (
+        f'<styleSheet xmlns="{MAIN_NS}">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '</styleSheet>'),
+}
+WORKBOOK = (f'<workbook xmlns="{MAIN_NS}" xmlns:r="{DOCUMENT_RELS_NS}">'
+            '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+# Первая строка закреплена, чтобы заголовки оставались видны при прокрутке
+SHEET_START = (f'<worksheet xmlns="{MAIN_NS}"><sheetViews><sheetView workbookViewId="0">'
+               '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+               '</sheetView></sheetViews><sheetData>')
+SHEET_END = '</sheetData></worksheet>'
+
+
+def _display(value):
+    """Значение ячейки в виде, понятном человеку: да/нет вместо True/False."""
+    if isinstance(value, bool):
+        return 'Да' if value else 'Нет'
+    return value
+
+
+class _Echo:
+    """Приёмник для csv.writer: возвращает строку вместо того, чтобы копить её."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _csv_value(value):
+    value = _display(value)
+    if value is None:
+        return ''
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value  # Excel не должен выполнять текст из базы как формулу
+    return value
+
+
+def stream_csv(header, rows):
+    """Генератор байтов CSV в UTF-8 с BOM и разделителем «;» — так его без настройки открывает Excel."""
+    writer = csv.writer(_Echo(), delimiter=';')
+    lines, size = ['\ufeff' + writer.writerow(header)], 0
+    for row in rows:
+        line = writer.writerow([_csv_value(value) for value in row])
+        lines.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(lines).encode()
+            lines, size = [], 0
+    yield ''.join(lines).encode()
+
+
+def _xlsx_cell(value, style: int = 0) -> str:
+    value = _display(value)
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+    text = escape(ILLEGAL_XML_RE.sub('', str(value)))
+    style_attr = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(row, style: int = 0) -> str:
+    return '<row>' + ''.join(_xlsx_cell(value, style) for value in row) + '</row>'
+
+
+def stream_xlsx(header, rows, sheet_name: str = 'Лист1'):
+    """
+    Генератор байтов книги XLSX с одним листом. Строки записываются как встроенные строки (inlineStr),
+    без общей таблицы строк, которую пришлось бы держать в памяти до конца выгрузки.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as book:
+        for name, content in XLSX_PARTS.items():
+            book.writestr(name, XML_DECLARATION + content)
+        book.writestr('xl/workbook.xml', XML_DECLARATION + WORKBOOK.format(name=escape(sheet_name[:31])))
+        with book.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((XML_DECLARATION + SHEET_START + _xlsx_row(header, style=2)).encode())
+            lines, size = [], 0
+            for row in rows:
+                line = _xlsx_row(row)
+                lines.append(line)
+                size += len(line)
+                if size >= FLUSH_SIZE:
+                    sheet.write(''.join(lines).encode())
+                    lines, size = [], 0
+                    if data := buffer.pop():
+                        yield data
+            sheet.write((''.join(lines) + SHEET_END).encode())
+    if data := buffer.pop():
+        yield data
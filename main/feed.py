@@ -0,0 +1,86 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import CharField, Q, Value
+
+from main.models import Notification, Notice
+
+# Тип записи в ленте -> модель и связанные объекты, нужные шаблону
+FEED_KINDS = {
+    'notification': (Notification, ('comment__user',)),
+    'notice': (Notice, ()),
+}
+
+
+def encode_cursor(created_at: datetime, kind: str, pk: int) -> str:
+    """Курсор указывает на последнюю показанную запись: (время создания, тип, id)."""
+    raw = f'{created_at.isoformat()}|{kind}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, str, int] | None:
+    """Разбирает курсор; повреждённый курсор считается отсутствующим (первая страница)."""
+    if not cursor:
+        return None
+    try:
+        created_at, kind, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), kind, int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _after_cursor(kind: str, cursor: tuple[datetime, str, int]) -> Q:
+    """
+    Условие «строго после курсора» при сортировке по (created_at, kind, id) по убыванию.
+    Тип внутри ветки UNION постоянен, поэтому сравнение кортежей сводится к простым условиям.
+    """
+    created_at, cursor_kind, pk = cursor
+    if kind < cursor_kind:
+        return Q(created_at__lte=created_at)
+    if kind > cursor_kind:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+
+
+def notification_feed(user, is_read: bool, kinds=None, cursor: str = None,
+                      limit: int = 15) -> tuple[list[Notification | Notice], str | None]:
+    """
+    Общая лента оповещений и уведомлений пользователя, собранная одним запросом UNION ALL.
+    Каждая ветка ограничена limit + 1 строками, поэтому стоимость страницы не зависит от размера архива.
+    Возвращает записи страницы и курсор следующей страницы (None, если страница последняя).
+    """
+    position = decode_cursor(cursor)
+    branches = []
+    for kind in kinds or FEED_KINDS:
+        model, _ = FEED_KINDS[kind]
+        queryset = model.objects.filter(user=user, is_read=is_read)
+        if position is not None:
+            queryset = queryset.filter(_after_cursor(kind, position))
+        branches.append(queryset.annotate(kind=Value(kind, output_field=CharField())).values(
+            'created_at', 'kind', 'id').order_by('-created_at', '-id')[:limit + 1])
+
+    first, *rest = branches
+    feed = first.union(*rest, all=True).order_by('-created_at', '-kind', '-id')[:limit + 1] if rest else first
+    rows = list(feed)
+    page, has_next = rows[:limit], len(rows) > limit
+
+    # Загружаем сами объекты одним запросом на тип и восстанавливаем порядок ленты
+    objects = {}
+    for kind, (model, related) in FEED_KINDS.items():
+        ids = [row['id'] for row in page if row['kind'] == kind]
+        if ids:
+            objects.update({(kind, obj.pk): obj for obj in model.objects.select_related(*related).filter(pk__in=ids)})
+    items = [objects[row['kind'], row['id']] for row in page if (row['kind'], row['id']) in objects]
+
+    next_cursor = None
+    if has_next:
+        last = page[-1]
+        next_cursor = encode_cursor(last['created_at'], last['kind'], last['id'])
+    return items, next_cursor
+
+
+def mark_all_read(user) -> int:
+    """Отмечает все оповещения и уведомления пользователя прочитанными. Возвращает количество записей."""
+    return sum(model.objects.filter(user=user, is_read=False).update(is_read=True)
+               for model, _ in FEED_KINDS.values())
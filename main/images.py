@@ -0,0 +1,91 @@
+import os
+
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from main.utils import CacheQueue
+from ohr.settings import IMAGE_SIZES, IMAGE_DERIVATIVES_DIR
+
+images_queue = CacheQueue('image-derivatives')
+
+# Формат -> (формат Pillow, параметры сохранения). Шаблоны выдают только WebP, поэтому JPEG не создаётся
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+}
+# Копии, которые уже есть на диске: созданная копия не исчезает, поэтому её не нужно проверять при каждом выводе
+_existing_derivatives = set()
+EXISTING_DERIVATIVES_LIMIT = 10_000
+
+
+def derivative_name(name: str, size: str, fmt: str = 'webp') -> str:
+    """Путь уменьшенной копии: derivatives/<путь оригинала без расширения>/<размер>.<формат>."""
+    return f'{IMAGE_DERIVATIVES_DIR}/{os.path.splitext(name)[0]}/{size}.{fmt}'
+
+
+def derivative_url(image, size: str, fmt: str = 'webp') -> str:
+    """URL уменьшенной копии, если она уже создана, иначе URL оригинала."""
+    if not image:
+        return ''
+    name = derivative_name(image.name, size, fmt)
+    if name not in _existing_derivatives:
+        if not default_storage.exists(name):
+            return image.url
+        if len(_existing_derivatives) >= EXISTING_DERIVATIVES_LIMIT:
+            _existing_derivatives.clear()
+        _existing_derivatives.add(name)
+    return default_storage.url(name)
+
+
+def schedule_derivatives(*images) -> None:
+    """Ставит изображения в очередь на создание уменьшенных копий."""
+    for image in images:
+        if image:
+            images_queue.push(image.name)
+
+
+def generate_derivatives(name: str, force: bool = False) -> int:
+    """
+    Создаёт копии изображения во всех размерах и форматах. Копии новее оригинала пропускаются; если актуальны все,
+    изображение не открывается. Возвращает количество созданных файлов.
+    """
+    source = default_storage.path(name)
+    if not os.path.isfile(source):
+        return 0
+    source_mtime = os.path.getmtime(source)
+    pending = {}
+    for size in IMAGE_SIZES:
+        for fmt in FORMATS:
+            target = default_storage.path(derivative_name(name, size, fmt))
+            if force or not os.path.isfile(target) or os.path.getmtime(target) < source_mtime:
+                pending.setdefault(size, []).append((fmt, target))
+    if not pending:
+        return 0
+
+    created = 0
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)  # Учитываем поворот снимков с телефона
+        for size, targets in pending.items():
+            resized = original.copy()
+            box = IMAGE_SIZES[size]
+            resized.thumbnail((box, box), Image.LANCZOS)  # Только уменьшение, пропорции сохраняются
+            for fmt, target in targets:
+                pillow_format, options = FORMATS[fmt]
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # WebP хранит RGB и RGBA, остальные режимы (палитра, CMYK) переводим в RGB
+                keep_mode = resized.mode in ('RGB', 'RGBA')
+                (resized if keep_mode else resized.convert('RGB')).save(target, pillow_format, **options)
+                created += 1
+    return created
+
+
+def process_image_queue(batch_size: int = 200) -> int:
+    """Обрабатывает очередь изображений (периодическая задача). Возвращает количество обработанных изображений."""
+    processed = 0
+    while names := images_queue.drain(limit=batch_size):
+        for name in set(names):
+            try:
+                generate_derivatives(name)
+            except OSError:  # Повреждённый или неподдерживаемый файл: остаётся оригинал
+                pass
+        processed += len(names)
+    return processed
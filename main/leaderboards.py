@@ -0,0 +1,67 @@
+import random
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from main.models import Article, Categorys, TagPost
+from ohr.settings import LEADERBOARD_SIZE, LEADERBOARD_TIMEOUT, TAGS_POOL_SIZE
+
+
+def _popular_posts() -> list[Article]:
+    return list(Article.published.order_by('-rating').only('title', 'slug')[:LEADERBOARD_SIZE])
+
+
+def _commented_posts() -> list[Article]:
+    return list(Article.objects.order_by('-comments_count').only('title', 'slug')[:LEADERBOARD_SIZE])
+
+
+def _categories() -> list[Categorys]:
+    return list(Categorys.objects.annotate(total=Count('posts')).filter(total__gt=0))
+
+
+def _tags_pool() -> list[TagPost]:
+    return list(TagPost.objects.annotate(total=Count('tags')).filter(total__gt=0).order_by('-total')[:TAGS_POOL_SIZE])
+
+
+# Ключ кэша -> функция, которая заново вычисляет список
+LEADERBOARDS = {
+    'leaderboard:popular-posts': _popular_posts,
+    'leaderboard:commented-posts': _commented_posts,
+    'leaderboard:categories': _categories,
+    'leaderboard:tags-pool': _tags_pool,
+}
+
+
+def _get(key: str) -> list:
+    return cache.get_or_set(key, LEADERBOARDS[key], LEADERBOARD_TIMEOUT)
+
+
+def popular_posts(count: int) -> list[Article]:
+    """Статьи с наибольшим рейтингом."""
+    return _get('leaderboard:popular-posts')[:count]
+
+
+def commented_posts(count: int) -> list[Article]:
+    """Статьи с наибольшим количеством комментариев."""
+    return _get('leaderboard:commented-posts')[:count]
+
+
+def categories() -> list[Categorys]:
+    """Категории, в которых есть статьи."""
+    return _get('leaderboard:categories')
+
+
+def random_tags(count: int) -> list[TagPost]:
+    """Случайные теги из закэшированного пула вместо ORDER BY RANDOM() по всей таблице."""
+    pool = _get('leaderboard:tags-pool')
+    return random.sample(pool, min(count, len(pool)))
+
+
+def refresh_leaderboards() -> None:
+    """Пересчитывает все рейтинги и кладёт их в кэш (периодическая задача)."""
+    cache.set_many({key: compute() for key, compute in LEADERBOARDS.items()}, LEADERBOARD_TIMEOUT)
+
+
+def invalidate_leaderboards() -> None:
+    """Сбрасывает закэшированные рейтинги; они пересчитаются при следующем обращении."""
+    cache.delete_many(list(LEADERBOARDS))
@@ -0,0 +1,73 @@
+import logging
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from user_agents import parse
+
+from main.models import UserLoginHistory
+from main.utils import CacheQueue
+from ohr.settings import GEOIP_DATABASE
+
+logger = logging.getLogger(__name__)
+
+login_queue = CacheQueue('login-events')
+_geoip_reader = None
+
+
+def enqueue_login(user_id: int, ip_address: str, user_agent: str) -> None:
+    """Ставит вход пользователя в очередь; разбор и запись в базу выполняет process_login_events."""
+    login_queue.push((user_id, ip_address, user_agent[:512], timezone.now()))
+
+
+def get_geoip_reader():
+    """Один долгоживущий Reader на процесс: база GeoIP отображается в память, а не открывается при каждом входе."""
+    global _geoip_reader
+    if _geoip_reader is None:
+        from geoip2.database import MODE_MMAP, Reader
+        _geoip_reader = Reader(str(GEOIP_DATABASE), mode=MODE_MMAP)
+    return _geoip_reader
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent: str) -> tuple[str, str, str]:
+    """Тип устройства, ОС и браузер по строке User-Agent."""
+    parsed = parse(user_agent)
+    return parsed.device.family, parsed.os.family, parsed.browser.family
+
+
+@lru_cache(maxsize=4096)
+def get_location(ip: str) -> str:
+    """Функция для получения геолокации по IP"""
+    try:
+        response = get_geoip_reader().city(ip)
+    except Exception as e:
+        logger.warning('Error getting geolocation for IP %s: %s', ip, e)
+        return 'Неизвестно'
+    return f"{response.city.name}, {response.country.iso_code}"
+
+
+def process_login_events(batch_size: int = 1000) -> int:
+    """
+    Обрабатывает очередь входов и записывает историю пачками. Входы удалённых пользователей отбрасываются;
+    при ошибке записи пачка остаётся в очереди. Возвращает количество записей.
+    """
+    user_model = get_user_model()
+    processed = 0
+    while True:
+        with login_queue.consume(limit=batch_size) as events:
+            if not events:
+                break
+            existing = set(user_model.objects.filter(pk__in={event[0] for event in events})
+                           .values_list('pk', flat=True))
+            rows = []
+            for user_id, ip_address, user_agent, login_time in events:
+                if user_id not in existing:
+                    continue
+                device_type, os, browser = parse_user_agent(user_agent)
+                rows.append(UserLoginHistory(user_id=user_id, login_time=login_time, ip_address=ip_address,
+                                             location=get_location(ip_address), device_type=device_type,
+                                             browser=browser, os=os))
+            UserLoginHistory.objects.bulk_create(rows, batch_size=batch_size)
+            processed += len(rows)
+    return processed
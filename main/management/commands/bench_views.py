@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from main.benchmarks import HOT_VIEWS, measure, report_table, within_budget
+
+
+class Command(BaseCommand):
+    help = ('Запрашивает горячие страницы на текущей базе (например, после generate_dataset), '
+            'сравнивает число запросов и время ответа с бюджетами и завершается с ошибкой при превышении')
+
+    def add_arguments(self, parser):
+        parser.add_argument('views', nargs='*', help='Проверить только указанные страницы')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз запрашивать страницу (берётся медиана)')
+        parser.add_argument('--output', help='JSON-файл для сохранения результатов')
+        parser.add_argument('--no-time', action='store_true', help='Проверять только число запросов')
+
+    def handle(self, *args, **options):
+        names = options['views'] or list(HOT_VIEWS)
+        unknown = set(names) - set(HOT_VIEWS)
+        if unknown:
+            raise CommandError(f'Неизвестные страницы: {", ".join(sorted(unknown))}')
+
+        results = []
+        # Тестовый клиент обращается к хосту testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in names:
+                runs = [measure(Client(), name) for _ in range(options['repeat'])]
+                runs.sort(key=lambda run: run['ms'] or 0)
+                results.append(runs[len(runs) // 2])
+
+        self.stdout.write(report_table(results, check_time=not options['no_time']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+        failed = [result['name'] for result in results
+                  if result['status'] is not None and not within_budget(result, check_time=not options['no_time'])]
+        if failed:
+            raise CommandError(f'Бюджет превышен: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Все страницы укладываются в бюджет'))
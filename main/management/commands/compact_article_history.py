@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import MD5
+
+from main.models import Article
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из истории статей изменения, которые не отличаются от предыдущей версии '
+            '(например, сохранения счётчика просмотров)')
+
+    # Поля, которые меняются при любом сохранении и не означают правку статьи
+    IGNORED_FIELDS = ('time_update',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пачки при удалении записей')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать записи, ничего не удаляя')
+
+    def handle(self, *args, **options):
+        historical_model = Article.history.model
+        tracked_fields = [
+            field.attname for field in historical_model._meta.concrete_fields
+            if not field.name.startswith('history_')
+            and field.name not in self.IGNORED_FIELDS + Article.COUNTER_FIELDS + ('content',)
+        ]
+        # Текст статьи сравниваем по хэшу, чтобы не тянуть его целиком из базы
+        rows = historical_model.objects.annotate(content_md5=MD5('content')).order_by(
+            'id', 'history_date', 'history_id').values_list('history_id', 'history_type', 'content_md5',
+                                                            *tracked_fields)
+
+        redundant = []
+        previous = None
+        for history_id, history_type, *snapshot in rows.iterator(chunk_size=options['batch_size']):
+            # id статьи входит в snapshot, поэтому версии разных статей никогда не совпадут
+            if previous is not None and history_type == '~' and snapshot == previous:
+                redundant.append(history_id)
+                continue
+            previous = snapshot
+
+        self.stdout.write(f'Найдено избыточных записей истории: {len(redundant)}')
+        if options['dry_run'] or not redundant:
+            return
+
+        deleted = 0
+        for start in range(0, len(redundant), options['batch_size']):
+            batch = redundant[start:start + options['batch_size']]
+            deleted += historical_model.objects.filter(history_id__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {deleted}. Для возврата места на диске выполните VACUUM FULL для таблицы '
+            f'{historical_model._meta.db_table}.'))
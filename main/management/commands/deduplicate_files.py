@@ -0,0 +1,48 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.blobs import blob_name, hash_file
+from main.models import FileBlob, UploadFiles
+
+
+class Command(BaseCommand):
+    help = ('Переносит файлы, загруженные до появления FileBlob, в хранилище по содержимому '
+            'и удаляет дублирующиеся копии с диска')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать файлы, ничего не изменяя')
+
+    def handle(self, *args, **options):
+        names = UploadFiles.objects.filter(blob__isnull=True).exclude(file='').values_list(
+            'file', flat=True).distinct()
+        storage = UploadFiles._meta.get_field('file').storage
+        moved = removed = missing = 0
+        for name in names.iterator():
+            path = storage.path(name)
+            if not os.path.isfile(path):
+                missing += 1
+                continue
+            digest = hash_file(path)
+            if options['dry_run']:
+                moved += 1
+                continue
+
+            with transaction.atomic():
+                blob = FileBlob.objects.filter(sha256=digest).first()
+                if blob is None:
+                    new_name = blob_name(digest, name)
+                    os.makedirs(os.path.dirname(storage.path(new_name)), exist_ok=True)
+                    os.replace(path, storage.path(new_name))
+                    blob = FileBlob.objects.create(sha256=digest, file=new_name,
+                                                   size=os.path.getsize(storage.path(new_name)))
+                    moved += 1
+                else:
+                    removed += 1
+                UploadFiles.objects.filter(file=name, blob__isnull=True).update(blob=blob, file=blob.file.name)
+            if os.path.isfile(path):
+                os.remove(path)  # Копия с тем же содержимым уже есть в хранилище
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, удалено дубликатов: {removed}, не найдено на диске: {missing}'))
@@ -0,0 +1,78 @@
+import json
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from main.models import Notification, Notice, SentMessage, UploadFiles, UserLoginHistory
+from study.models import SubjectCompletion
+
+EXECUTION_TIME_RE = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+def busiest(queryset, field: str):
+    """Значение field, у которого больше всего строк: планы смотрим на самом тяжёлом случае."""
+    row = queryset.values(field).annotate(rows=Count('pk')).order_by('-rows').first()
+    return row[field] if row else None
+
+
+def query_shapes() -> dict:
+    """Запросы горячих страниц в том виде, в котором их выполняют представления."""
+    User = get_user_model()
+    user = busiest(Notification.objects, 'user')
+    department = busiest(UploadFiles.objects, 'cat')
+    subject = busiest(SubjectCompletion.objects, 'subjects')
+    return {
+        'header_unread': Notification.objects.filter(user=user, is_read=False).order_by('-created_at')[:5],
+        'header_unread_count': Notification.objects.filter(user=user, is_read=False).values('pk'),
+        'notice_feed': Notice.objects.filter(user=user, is_read=False).order_by('-created_at', '-id')[:20],
+        'notification_read': Notification.objects.filter(user=user, is_read=True).order_by('-created_at', '-id')[:20],
+        'sent_message_limit': SentMessage.objects.filter(user=user, purpose=SentMessage.PURPOSE.CONTACT,
+                                                         timestamp__gte=timezone.now() - timedelta(days=1)),
+        'login_history': UserLoginHistory.objects.filter(user=user).order_by('-login_time')[:20],
+        'mainfiles_by_date': UploadFiles.objects.filter(cat=department).order_by('-uploaded_at')[:6],
+        'mainfiles_by_title': UploadFiles.objects.filter(cat=department).order_by('title')[:6],
+        'subject_results': SubjectCompletion.objects.filter(subjects=subject, completed=True),
+        'department_staff': User.objects.filter(cat2=department, is_active=True).order_by('status')[:5],
+        'department_leader': User.objects.filter(cat2=department, status=User.Status.LEADER)[:1],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN (ANALYZE, BUFFERS) для запросов горячих страниц и сохраняет планы, '
+            'чтобы сравнить их до и после изменения индексов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='JSON-файл, в который сохраняются планы')
+        parser.add_argument('--baseline', help='JSON-файл с планами прошлого запуска для сравнения')
+        parser.add_argument('--verbose-plans', action='store_true', help='Выводить планы целиком')
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать {options["baseline"]}: {e}')
+
+        plans = {}
+        for name, queryset in query_shapes().items():
+            plan = queryset.explain(analyze=True, buffers=True)
+            match = EXECUTION_TIME_RE.search(plan)
+            plans[name] = {'sql': str(queryset.query), 'plan': plan, 'ms': float(match.group(1)) if match else 0.0}
+
+            line = f'{name:<32} {plans[name]["ms"]:>10.3f} ms'
+            if name in baseline and baseline[name]['ms']:
+                line += f'   было {baseline[name]["ms"]:>10.3f} ms'
+            self.stdout.write(line)
+            if options['verbose_plans']:
+                self.stdout.write(plan + '\n')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(plans, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Планы сохранены в {options["output"]}'))
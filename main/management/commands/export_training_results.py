@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from study.exports import FORMATS, export_training_results
+from users.models import Departments
+
+
+def parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Дата должна быть в формате ГГГГ-ММ-ДД: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Выгружает результаты обучения сотрудников в CSV или XLSX для проверок по охране труда'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл, в который записывается выгрузка')
+        parser.add_argument('--format', choices=sorted(FORMATS), help='Формат (по умолчанию — по расширению файла)')
+        parser.add_argument('--department', help='slug отделения; без него выгружается вся организация')
+        parser.add_argument('--date-from', type=parse_date, help='Курсы, сданные не раньше этой даты')
+        parser.add_argument('--date-to', type=parse_date, help='Курсы, сданные не позже этой даты')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or options['output'].rsplit('.', 1)[-1].lower()
+        if file_format not in FORMATS:
+            raise CommandError('Укажите --format csv или xlsx либо файл с таким расширением')
+        department_id = None
+        if options['department']:
+            department_id = Departments.objects.filter(slug=options['department']).values_list('pk', flat=True).first()
+            if department_id is None:
+                raise CommandError(f'Отделение "{options["department"]}" не найдено')
+
+        content, _ = export_training_results(file_format, department_id=department_id,
+                                             date_from=options['date_from'], date_to=options['date_to'])
+        size = 0
+        with open(options['output'], 'wb') as file:
+            for chunk in content:
+                file.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Выгрузка сохранена в {options["output"]} ({size // 1024} КБ)'))
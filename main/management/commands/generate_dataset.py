@@ -0,0 +1,350 @@
+import io
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from main.counters import reconcile_article_counters
+from main.models import Article, Categorys, Comment, Notice, Notification, Rating, TagPost, UniqueView, \
+    UserLoginHistory
+from main.utils import html_to_text
+from study.compliance import refresh_compliance
+from study.models import Question, Subject, SubjectCompletion, UserAnswer
+from users.models import Departments, Profession, Profile
+
+FIRST_NAMES = ('Иван', 'Анна', 'Сергей', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Елена', 'Николай', 'Татьяна')
+LAST_NAMES = ('Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева', 'Козлов', 'Новикова', 'Морозов')
+WORDS = ('работник', 'инструктаж', 'защита', 'безопасность', 'требования', 'оборудование', 'пожарный', 'средства',
+         'отделение', 'проверка', 'обучение', 'порядок', 'медицинский', 'помощь', 'охрана', 'труд', 'риск', 'смена')
+DEVICES = (('Десктоп', 'Chrome 126', 'Windows 10'), ('Десктоп', 'Firefox 127', 'Ubuntu'),
+           ('Мобильное', 'Mobile Safari 17', 'iOS 17'), ('Мобильное', 'Chrome Mobile 126', 'Android 14'))
+CITIES = ('Москва, Россия', 'Санкт-Петербург, Россия', 'Казань, Россия', '')
+COPY_CHUNK = 100_000  # строк в одной команде COPY: ограничивает память под буфер
+
+
+def copy_value(value) -> str:
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, date):  # В том числе datetime
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model, fields, rows) -> int:
+    """Загружает строки в таблицу модели через COPY FROM STDIN. Сигналы и save() не вызываются."""
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+    total = 0
+    buffer = io.StringIO()
+    with connection.cursor() as cursor:
+        for row in rows:
+            buffer.write('\t'.join(map(copy_value, row)) + '\n')
+            total += 1
+            if total % COPY_CHUNK == 0:
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+                buffer = io.StringIO()
+        if buffer.tell():
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+    return total
+
+
+def unique_pairs(rnd: random.Random, count: int, left: list, right) -> list:
+    """
+    count различных пар (элемент left, значение right()); right — функция, выбирающая второй элемент.
+    Пары сортируются: порядок обхода множества строк зависит от PYTHONHASHSEED и сломал бы воспроизводимость.
+    """
+    pairs = set()
+    limit = count * 3  # Защита от бесконечного цикла, если различных пар меньше, чем запрошено
+    while len(pairs) < count and limit:
+        pairs.add((rnd.choice(left), right()))
+        limit -= 1
+    return sorted(pairs)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными реалистичного объёма для нагрузочного тестирования '
+            'и проверки планов запросов. Одинаковые параметры и --seed дают одинаковый набор данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench', help='Префикс логинов, slug и названий создаваемых записей')
+        parser.add_argument('--departments', type=int, default=40)
+        parser.add_argument('--professions', type=int, default=80)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--subjects-per-user', type=int, default=4)
+        parser.add_argument('--answers-per-test', type=int, default=10)
+        parser.add_argument('--articles', type=int, default=2_000)
+        parser.add_argument('--tags', type=int, default=100)
+        parser.add_argument('--ratings', type=int, default=1_000_000)
+        parser.add_argument('--views', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--comment-depth', type=int, default=12, help='Наибольшая вложенность комментариев')
+        parser.add_argument('--notices', type=int, default=10, help='Оповещений на пользователя (в среднем)')
+        parser.add_argument('--logins', type=int, default=20, help='Записей истории входа на пользователя')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Генератор использует COPY и работает только с PostgreSQL')
+        User = get_user_model()
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Данные с префиксом "{options["prefix"]}" уже есть, укажите другой --prefix')
+
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.started = time.monotonic()
+        with transaction.atomic():
+            departments = self.create_departments()
+            professions = self.create_professions()
+            users = self.create_users(departments, professions)
+            self.create_completions(users)
+            articles = self.create_articles()
+            self.create_ratings(articles, users)
+            self.create_views(articles)
+            self.create_comments(articles, users)
+            self.create_notices(users)
+            self.create_logins(users)
+            reconcile_article_counters(Article.objects.filter(pk__in=articles))
+            self.report('Счётчики статей пересчитаны')
+            self.report(f'Сводки обучения пересчитаны: {refresh_compliance()} сотрудников')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')  # Свежая статистика, иначе планы запросов не соответствуют объёму данных
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - self.started:.0f} с'))
+
+    def report(self, message: str) -> None:
+        self.stdout.write(f'[{time.monotonic() - self.started:7.1f} с] {message}')
+
+    def moment(self, days: int = 365):
+        """Случайный момент за последние days дней."""
+        return self.now - timedelta(seconds=self.rnd.randrange(days * 24 * 60 * 60))
+
+    def text(self, words: int) -> str:
+        return ' '.join(self.rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+    def create_departments(self) -> list[int]:
+        prefix = self.options['prefix']
+        departments = Departments.objects.bulk_create(
+            [Departments(name=f'Отделение {prefix} {i}', slug=f'{prefix}-dep-{i}', is_inpatient=self.rnd.random() < 0.4)
+             for i in range(self.options['departments'])])
+        self.report(f'Отделений: {len(departments)}')
+        return [department.pk for department in departments]
+
+    def create_professions(self) -> list[int]:
+        prefix = self.options['prefix']
+        professions = Profession.objects.bulk_create(
+            [Profession(name=f'Должность {prefix} {i}', worker=self.rnd.random() < 0.3)
+             for i in range(self.options['professions'])])
+        self.report(f'Профессий: {len(professions)}')
+        return [profession.pk for profession in professions]
+
+    def create_users(self, departments: list[int], professions: list[int]) -> list[int]:
+        User = get_user_model()
+        prefix, rnd = self.options['prefix'], self.rnd
+        password = make_password(prefix)  # Хэш пароля считается один раз: это самая дорогая часть создания
+        statuses = [User.Status.WORKER] * 6 + [User.Status.MEDIC] * 3 + [User.Status.ADMINISTRATION]
+        users = []
+        for i in range(self.options['users']):
+            joined = self.moment(days=5 * 365)
+            users.append(User(
+                username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password,
+                first_name=rnd.choice(FIRST_NAMES), last_name=rnd.choice(LAST_NAMES),
+                cat2_id=rnd.choice(departments), status=rnd.choice(statuses), date_joined=joined,
+                last_activity=self.moment(days=30), is_active=rnd.random() < 0.95))
+        # По одному руководителю на отделение
+        for department, user in zip(departments, users):
+            user.cat2_id, user.status = department, User.Status.LEADER
+        users = User.objects.bulk_create(users, batch_size=self.options['batch_size'])
+
+        Profile.objects.bulk_create(
+            [Profile(user=user, profession_id=rnd.choice(professions),
+                     date_of_work=(user.date_joined + timedelta(days=rnd.randrange(30))).date(),
+                     date_birth=date(rnd.randrange(1960, 2004), rnd.randrange(1, 13), rnd.randrange(1, 29)),
+                     sex=rnd.choice(Profile.Sex.values), instructaj=rnd.random() < 0.8)
+             for user in users], batch_size=self.options['batch_size'])
+        self.report(f'Пользователей с профилями: {len(users)}')
+        return [user.pk for user in users]
+
+    def ensure_subjects(self) -> dict[int, list[int]]:
+        """Предметы и вопросы к ним: существующие используются, недостающие создаются. Предмет -> вопросы."""
+        prefix = self.options['prefix']
+        if not Subject.objects.exists():
+            Subject.objects.bulk_create([Subject(title=value, slug=f'{prefix}-{value}')
+                                         for value in Subject.TypeOfStudy.values])
+        questions = {}
+        for subject in Subject.objects.all():
+            ids = list(subject.questions.values_list('pk', flat=True))
+            if not ids:
+                ids = [question.pk for question in Question.objects.bulk_create(
+                    [Question(subject=subject, text=f'{self.text(8)}?', option1=self.text(3), option2=self.text(3),
+                              option3=self.text(3), option4=self.text(3), correct_option=self.rnd.randint(1, 4))
+                     for _ in range(20)])]
+            questions[subject.pk] = ids
+        return questions
+
+    def create_completions(self, users: list[int]) -> None:
+        rnd = self.rnd
+        questions = self.ensure_subjects()
+        subjects = list(questions)
+        per_user = min(self.options['subjects_per_user'], len(subjects))
+        completions = []
+        for user in users:
+            for subject in rnd.sample(subjects, per_user):
+                completed = rnd.random() < 0.7
+                completions.append(SubjectCompletion(
+                    users_id=user, subjects_id=subject, completed=completed,
+                    study_completed=completed or rnd.random() < 0.5, score=rnd.randrange(len(questions[subject]) + 1),
+                    data=self.moment().date() if completed else None))
+        completions = SubjectCompletion.objects.bulk_create(completions, batch_size=self.options['batch_size'])
+        self.report(f'Экзаменов: {len(completions)}')
+
+        def answers():
+            for completion in completions:
+                if completion.completed or completion.score:
+                    subject_questions = questions[completion.subjects_id]
+                    for question in rnd.sample(subject_questions,
+                                               min(self.options['answers_per_test'], len(subject_questions))):
+                        yield completion.pk, question, rnd.randint(1, 4)
+
+        count = copy_rows(UserAnswer, ('user_completion', 'question', 'selected_answer'), answers())
+        self.report(f'Ответов пользователей: {count}')
+
+    def create_articles(self) -> list[int]:
+        prefix, rnd = self.options['prefix'], self.rnd
+        categories = Categorys.objects.bulk_create(
+            [Categorys(name=f'Категория {prefix} {i}', slug=f'{prefix}-cat-{i}') for i in range(10)])
+        tags = TagPost.objects.bulk_create(
+            [TagPost(tag=f'{rnd.choice(WORDS)} {i}', slug=f'{prefix}-tag-{i}') for i in range(self.options['tags'])])
+
+        articles = []
+        for i in range(self.options['articles']):
+            content = ''.join(f'<p>{self.text(rnd.randint(20, 80))}.</p>' for _ in range(rnd.randint(3, 15)))
+            articles.append(Article(title=self.text(rnd.randint(3, 8)), slug=f'{prefix}-article-{i}', content=content,
+                                    plain_content=html_to_text(content), is_published=rnd.random() < 0.9,
+                                    category_id=rnd.choice(categories).pk))
+        articles = Article.objects.bulk_create(articles, batch_size=self.options['batch_size'])
+        # auto_now_add проставляет всем статьям текущее время: разносим даты создания по году
+        for article in articles:
+            article.time_create = self.moment()
+        Article.objects.bulk_update(articles, ['time_create'], batch_size=self.options['batch_size'])
+        ids = [article.pk for article in articles]
+        Article.objects.filter(pk__in=ids).update(search_vector=Article.search_vector_expression())
+
+        Through = Article.tags.through
+        copy_rows(Through, ('article', 'tagpost'),
+                  ((article_id, tag.pk) for article_id in ids for tag in rnd.sample(tags, min(3, len(tags)))))
+        self.report(f'Статей: {len(ids)}')
+        return ids
+
+    def random_ip(self) -> str:
+        value = self.rnd.getrandbits(32)
+        return f'{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}'
+
+    def create_ratings(self, articles: list[int], users: list[int]) -> None:
+        rnd, count = self.rnd, self.options['ratings']
+        # Большинство оценок ставят сотрудники, остальные — анонимы по IP
+        by_users = unique_pairs(rnd, int(count * 0.8), articles, lambda: rnd.choice(users))
+        by_ips = unique_pairs(rnd, count - len(by_users), articles, self.random_ip)
+        rows = [(article, user, None, rnd.choice((1, 1, 1, -1)), self.moment()) for article, user in by_users]
+        rows += [(article, None, ip, rnd.choice((1, 1, -1)), self.moment()) for article, ip in by_ips]
+        total = copy_rows(Rating, ('post', 'user', 'ip_address', 'value', 'time_create'), rows)
+        self.report(f'Оценок: {total}')
+
+    def create_views(self, articles: list[int]) -> None:
+        pairs = unique_pairs(self.rnd, self.options['views'], articles, self.random_ip)
+        total = copy_rows(UniqueView, ('article', 'ip_address', 'timestamp'),
+                          ((article, ip, self.moment()) for article, ip in pairs))
+        self.report(f'Уникальных просмотров: {total}')
+
+    def create_comments(self, articles: list[int], users: list[int]) -> None:
+        """
+        Деревья комментариев с заранее посчитанными полями MPTT (lft, rght, level, tree_id).
+        Идентификаторы назначаются здесь же, чтобы ответы ссылались на родителей в одной команде COPY.
+        """
+        rnd = self.rnd
+        next_id = (Comment.objects.aggregate(value=Max('id'))['value'] or 0) + 1
+        next_tree = (Comment.objects.aggregate(value=Max('tree_id'))['value'] or 0) + 1
+        remaining = self.options['comments']
+        rows, notifications = [], []
+
+        while remaining > 0:
+            # Одно дерево: корень и ответы, каждый ответ на случайный уже существующий комментарий
+            size = min(remaining, max(1, int(rnd.paretovariate(1.2))))  # Несколько веток очень длинные
+            post = rnd.choice(articles)
+            nodes = [{'parent': None, 'level': 0, 'children': []}]
+            for _ in range(size - 1):
+                candidates = [node for node in nodes[-20:] if node['level'] < self.options['comment_depth']] or nodes
+                parent = rnd.choice(candidates)
+                node = {'parent': parent, 'level': parent['level'] + 1, 'children': []}
+                parent['children'].append(node)
+                nodes.append(node)
+
+            # Обход в глубину задаёт вложенные множества
+            counter = 0
+            stack = [(nodes[0], False)]
+            while stack:
+                node, leaving = stack.pop()
+                counter += 1
+                if leaving:
+                    node['rght'] = counter
+                    continue
+                node['lft'] = counter
+                node['id'], next_id = next_id, next_id + 1
+                node['user'] = rnd.choice(users)
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node['children']))
+
+            created = self.moment()
+            for node in nodes:
+                parent = node['parent']
+                rows.append((node['id'], post, node['user'], self.text(rnd.randint(5, 40)), created, created,
+                             'published', parent['id'] if parent else None, None,
+                             node['lft'], node['rght'], next_tree, node['level']))
+                if parent and parent['user'] != node['user']:
+                    notifications.append((parent['user'], node['id'], rnd.random() < 0.7, created))
+            next_tree += 1
+            remaining -= size
+
+        total = copy_rows(Comment, ('id', 'post', 'user', 'content', 'time_create', 'time_update', 'status', 'parent',
+                                    'image', 'lft', 'rght', 'tree_id', 'level'), rows)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(self.style, [Comment]):
+                cursor.execute(sql)
+        copy_rows(Notification, ('user', 'comment', 'is_read', 'created_at'), notifications)
+        self.report(f'Комментариев: {total}, уведомлений об ответах: {len(notifications)}')
+
+    def create_notices(self, users: list[int]) -> None:
+        rnd = self.rnd
+
+        def notices():
+            for user in users:
+                for _ in range(rnd.randint(0, self.options['notices'] * 2)):
+                    yield user, self.text(rnd.randint(4, 12)), self.moment(), rnd.random() < 0.3, rnd.random() < 0.8
+
+        total = copy_rows(Notice, ('user', 'message', 'created_at', 'is_study', 'is_read'), notices())
+        self.report(f'Оповещений: {total}')
+
+    def create_logins(self, users: list[int]) -> None:
+        rnd = self.rnd
+
+        def logins():
+            for user in users:
+                device, browser, os_name = rnd.choice(DEVICES)
+                location = rnd.choice(CITIES)
+                for _ in range(rnd.randint(1, self.options['logins'] * 2)):
+                    yield user, self.moment(), self.random_ip(), location, device, browser, os_name
+
+        total = copy_rows(UserLoginHistory, ('user', 'login_time', 'ip_address', 'location', 'device_type',
+                                             'browser', 'os'), logins())
+        self.report(f'Записей истории входа: {total}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.images import generate_derivatives
+from main.signals import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии (WebP и JPEG) для всех загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие копии')
+
+    def handle(self, *args, **options):
+        created = 0
+        for model, field in IMAGE_FIELDS.items():
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(
+                field, flat=True).distinct()
+            for name in names.iterator():
+                try:
+                    created += generate_derivatives(name, force=options['force'])
+                except OSError as e:
+                    self.stderr.write(f'{name}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Создано уменьшенных копий: {created}'))
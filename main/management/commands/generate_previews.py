@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.previews import generate_pending_previews
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры первых страниц загруженных документов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать миниатюры для всех файлов')
+
+    def handle(self, *args, **options):
+        count = generate_pending_previews(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Создано миниатюр: {count}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.models import UploadFiles
+from main.search import index_pending_files
+
+
+class Command(BaseCommand):
+    help = 'Извлекает текст из загруженных документов для полнотекстового поиска'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Переиндексировать все файлы, а не только новые')
+        parser.add_argument('--batch-size', type=int, default=50, help='Количество файлов в одной пачке')
+
+    def handle(self, *args, **options):
+        queryset = UploadFiles.objects.all() if options['all'] else None
+        count = index_pending_files(batch_size=options['batch_size'], queryset=queryset)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано файлов: {count}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает текст без разметки и поисковый вектор всех статей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки при обновлении статей')
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс обновлён для статей: {count}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import reconcile_article_counters
+from main.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики лайков, дизлайков, рейтинга, комментариев и просмотров статей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', nargs='*', help='Пересчитать только статьи с указанными slug')
+
+    def handle(self, *args, **options):
+        queryset = Article.objects.all()
+        if options['slug']:
+            queryset = queryset.filter(slug__in=options['slug'])
+        updated = reconcile_article_counters(queryset)
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересчитаны для {updated} статей'))
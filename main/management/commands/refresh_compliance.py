@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from study.compliance import refresh_compliance
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводки обучения сотрудников и отделений для страницы руководителя'
+
+    def handle(self, *args, **options):
+        count = refresh_compliance()
+        self.stdout.write(self.style.SUCCESS(f'Сводки пересчитаны для {count} сотрудников'))
@@ -0,0 +1,174 @@
+"""
+Метрики запросов в памяти процесса в текстовом формате Prometheus.
+Каждый процесс веб-сервера считает свои значения; Prometheus суммирует их по меткам экземпляров.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.utils.module_loading import import_string
+
+from ohr.settings import METRICS_LATENCY_BUCKETS, METRICS_QUERY_BUCKETS, METRICS_SIZE_BUCKETS
+
+_MISSING = object()
+_state = threading.local()  # Счётчики кэша текущего запроса
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Последняя корзина — +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        result, total = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            result.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        result.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        result.append(f'{name}_count{{{labels}}} {total}')
+        return result
+
+
+class Registry:
+    """Агрегаты по имени URL: количество ответов, время ответа, запросы к базе и размер ответа."""
+    HISTOGRAMS = {
+        'ohr_request_duration_seconds': ('Время ответа', METRICS_LATENCY_BUCKETS),
+        'ohr_request_db_queries': ('Запросов к базе на ответ (выборка)', METRICS_QUERY_BUCKETS),
+        'ohr_request_db_seconds': ('Время запросов к базе на ответ (выборка)', METRICS_LATENCY_BUCKETS),
+        'ohr_response_size_bytes': ('Размер ответа', METRICS_SIZE_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = {}  # (view, метод, код) -> количество
+        self.histograms = {name: {} for name in self.HISTOGRAMS}  # имя -> view -> Histogram
+        self.cache = {'hit': 0, 'miss': 0}
+
+    def observe(self, name: str, view: str, value: float) -> None:
+        histograms = self.histograms[name]
+        if view not in histograms:
+            histograms[view] = Histogram(self.HISTOGRAMS[name][1])
+        histograms[view].observe(value)
+
+    def record(self, view: str, method: str, status: int, seconds: float, size: int | None,
+               queries: int | None, db_seconds: float | None) -> None:
+        with self.lock:
+            key = (view, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            self.observe('ohr_request_duration_seconds', view, seconds)
+            if size is not None:
+                self.observe('ohr_response_size_bytes', view, size)
+            if queries is not None:
+                self.observe('ohr_request_db_queries', view, queries)
+                self.observe('ohr_request_db_seconds', view, db_seconds)
+
+    def count_cache(self, hits: int, misses: int) -> None:
+        with self.lock:
+            self.cache['hit'] += hits
+            self.cache['miss'] += misses
+
+    def render(self) -> str:
+        with self.lock:
+            lines = ['# HELP ohr_responses_total Количество ответов', '# TYPE ohr_responses_total counter']
+            for (view, method, status), count in sorted(self.responses.items()):
+                lines.append(f'ohr_responses_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+            for name, (description, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for view, histogram in sorted(self.histograms[name].items()):
+                    lines += histogram.lines(name, f'view="{view}"')
+            lines += ['# HELP ohr_cache_requests_total Обращения к кэшу по результату',
+                      '# TYPE ohr_cache_requests_total counter']
+            lines += [f'ohr_cache_requests_total{{result="{result}"}} {count}'
+                      for result, count in self.cache.items()]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def start_request() -> None:
+    """Заводит счётчики кэша для текущего запроса."""
+    _state.hits = _state.misses = 0
+
+
+def finish_request() -> None:
+    """Переносит счётчики кэша запроса в реестр."""
+    registry.count_cache(getattr(_state, 'hits', 0), getattr(_state, 'misses', 0))
+    _state.__dict__.clear()
+
+
+class QueryRecorder:
+    """Обёртка выполнения SQL (connection.execute_wrapper): число, время и текст запросов одного ответа."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []  # (время, SQL)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            self.statements.append((elapsed, sql))
+
+    def slowest(self, limit: int) -> list[tuple[float, str]]:
+        return sorted(self.statements, key=lambda statement: statement[0], reverse=True)[:limit]
+
+
+class InstrumentedCache:
+    """
+    Обёртка бэкенда кэша, считающая попадания и промахи для метрик.
+    В CACHES указывается как BACKEND, а настоящий бэкенд передаётся в WRAPPED_BACKEND.
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        self._cache = import_string(params.pop('WRAPPED_BACKEND'))(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    @staticmethod
+    def _count(hits: int, misses: int) -> None:
+        # Вне запроса (планировщик, команды) счётчики запроса не заведены: считаем сразу в общий реестр
+        if hasattr(_state, 'hits'):
+            _state.hits += hits
+            _state.misses += misses
+        else:
+            registry.count_cache(hits, misses)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(0, 1)
+            return default
+        self._count(1, 0)
+        return value
+
+    def get_or_set(self, key, default, timeout=_MISSING, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            self._count(1, 0)
+            return value
+        self._count(0, 1)
+        if timeout is _MISSING:
+            return self._cache.get_or_set(key, default, version=version)
+        return self._cache.get_or_set(key, default, timeout, version=version)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._cache.get_many(keys, version=version)
+        self._count(len(values), len(keys) - len(values))
+        return values
@@ -0,0 +1,71 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from main.metrics import QueryRecorder, finish_request, registry, start_request
+from main.slowlog import SlowQueryRecorder
+from ohr.settings import METRICS_SAMPLE_RATE, METRICS_SLOW_REQUEST_MS, METRICS_SLOW_SQL_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """
+    Считает время ответа и его размер для каждого запроса, а для доли METRICS_SAMPLE_RATE запросов
+    ещё и запросы к базе. Медленные ответы из выборки пишутся в журнал вместе с самыми долгими SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < METRICS_SAMPLE_RATE
+        recorder = QueryRecorder() if sampled else None
+        start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                if recorder is not None:
+                    for alias in connections:
+                        stack.enter_context(connections[alias].execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            finish_request()
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.record(view, request.method, response.status_code, seconds, self.response_size(response),
+                        recorder.count if recorder else None, recorder.seconds if recorder else None)
+
+        if recorder is not None and seconds * 1000 >= METRICS_SLOW_REQUEST_MS:
+            statements = '\n'.join(f'  {elapsed * 1000:.1f} мс: {sql}'
+                                   for elapsed, sql in recorder.slowest(METRICS_SLOW_SQL_LIMIT))
+            logger.warning('Медленный ответ %s %s (%s): %.0f мс, запросов к базе %s (%.0f мс)\n%s',
+                           request.method, request.path, view, seconds * 1000, recorder.count,
+                           recorder.seconds * 1000, statements)
+        return response
+
+    @staticmethod
+    def response_size(response) -> int | None:
+        if response.streaming:
+            length = response.get('Content-Length')
+            return int(length) if length else None
+        return len(response.content)
+
+
+class SlowQueryMiddleware:
+    """Передаёт SQL-запросы дольше SLOW_QUERY_MS в журнал медленных запросов (main.slowlog)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            return self.get_response(request)
@@ -1,14 +1,20 @@
 import os
+import uuid
 
 from ckeditor.fields import RichTextField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinLengthValidator, MaxLengthValidator
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router
 from django.urls import reverse
+from django.utils import timezone
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
 from simple_history.models import HistoricalRecords
-from main.utils import get_upload_path
+from main.utils import get_upload_path, html_to_text
+from ohr.settings import SEARCH_CONFIG
 
 
 class Categorys(models.Model):
@@ -26,25 +32,103 @@ class Categorys(models.Model):
         return reverse('main:category', kwargs={'cat_slug': self.slug})
 
 
+class FileBlob(models.Model):
+    '''Физический файл, хранящийся в одном экземпляре и адресуемый по SHA-256 содержимого'''
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    file = models.FileField(max_length=500, verbose_name='Файл')
+    size = models.PositiveBigIntegerField(verbose_name='Размер')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время добавления')
+    has_preview = models.BooleanField(default=False, editable=False, verbose_name='Есть миниатюра')
+    preview_checked_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                              verbose_name='Время создания миниатюры')
+
+    class Meta:
+        verbose_name = 'Содержимое файла'
+        verbose_name_plural = 'Содержимое файлов'
+        indexes = [
+            # Очередь на создание миниатюр
+            models.Index(fields=['id'], name='fileblob_preview_pending_idx',
+                         condition=models.Q(preview_checked_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.sha256[:12]} - {self.file.name}'
+
+
+class UploadSession(models.Model):
+    '''Докачиваемая загрузка большого файла по частям'''
+    class Target(models.TextChoices):
+        FILE = 'file', 'Файл отделения'
+        VIDEO = 'video', 'Видео инструктажа'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='upload_sessions',
+                             verbose_name='Пользователь')
+    target = models.CharField(max_length=10, choices=Target.choices, verbose_name='Назначение')
+    filename = models.CharField(max_length=255, verbose_name='Имя файла')
+    size = models.PositiveBigIntegerField(verbose_name='Размер')
+    offset = models.PositiveBigIntegerField(default=0, verbose_name='Получено байт')
+    metadata = models.JSONField(default=dict, blank=True, verbose_name='Параметры')  # Отделение, название, slug
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+
+    class Meta:
+        verbose_name = 'Загрузка файла'
+        verbose_name_plural = 'Загрузки файлов'
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+
 class UploadFiles(models.Model):
     cat = models.ForeignKey('users.Departments', on_delete=models.CASCADE, related_name='upload_files', verbose_name="Отделение")
     title = models.CharField(max_length=700, blank=True, db_index=True, verbose_name='Название файла')
     file = models.FileField(upload_to=get_upload_path, max_length=500)
+    # Общий файл отделений ссылается на один FileBlob; file хранит тот же путь для обратной совместимости
+    blob = models.ForeignKey(FileBlob, on_delete=models.PROTECT, related_name='uploads', null=True, blank=True,
+                             editable=False, verbose_name='Содержимое')
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Время добавления')
     is_common = models.BooleanField(default=False, verbose_name='Общий файл')
     description = models.TextField(max_length=900, verbose_name='Описание', default='',blank=True, null=True)
+    content_text = models.TextField(blank=True, editable=False, verbose_name='Текст документа')
+    search_vector = SearchVectorField(null=True, editable=False)
+    content_indexed_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Время индексации')
 
     class Meta:
         verbose_name = "Файл"
         verbose_name_plural = "Файлы"
         ordering = ['-uploaded_at']
+        indexes = [
+            # Список файлов отделения с сортировкой по дате (по умолчанию) или по названию
+            models.Index(fields=['cat', '-uploaded_at'], name='uploadfiles_cat_uploaded_idx'),
+            models.Index(fields=['cat', 'title'], name='uploadfiles_cat_title_idx'),
+            GinIndex(fields=['search_vector'], name='uploadfiles_search_vector_idx'),
+            GinIndex(fields=['title'], name='uploadfiles_title_trgm_idx', opclasses=['gin_trgm_ops']),
+            # Очередь на индексацию: файлы, текст которых ещё не извлечён
+            models.Index(fields=['uploaded_at'], name='uploadfiles_unindexed_idx',
+                         condition=models.Q(content_indexed_at__isnull=True)),
+        ]
 
     def save(self, *args, **kwargs):
         # Устанавливаем title по умолчанию, если оно пустое
         if not self.title and self.file:
             self.title = os.path.basename(self.file.name)
+        if kwargs.get('update_fields') is None:
+            self.content_indexed_at = None  # Файл или название могли измениться: проиндексировать заново
         super().save(*args, **kwargs)
 
+    def get_absolute_url(self):
+        return reverse('main:file_download', kwargs={'dep_slug': self.cat.slug, 'pk': self.pk})
+
+    def get_preview_url(self):
+        # Миниатюра проверяет права по отделению записи, как и скачивание, поэтому ссылки строятся по одной записи
+        return reverse('main:file_preview', kwargs={'dep_slug': self.cat.slug, 'pk': self.pk})
+
+    @staticmethod
+    def search_vector_expression():
+        return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+                + SearchVector('content_text', weight='C', config=SEARCH_CONFIG))
+
     def __str__(self):
         if self.cat:
             return f'{str(self.cat)} - {str(self.file.name)}'
@@ -78,7 +162,18 @@ class Article(models.Model):
                                  blank=True, null=True)
     tags = models.ManyToManyField('TagPost', blank=True, related_name='tags', verbose_name="Теги")
     views=models.PositiveIntegerField(default=0,verbose_name='Просмотры')
-    history = HistoricalRecords()
+    likes_count = models.PositiveIntegerField(default=0, verbose_name='Лайки')
+    dislikes_count = models.PositiveIntegerField(default=0, verbose_name='Дизлайки')
+    rating = models.IntegerField(default=0, verbose_name='Рейтинг')
+    comments_count = models.PositiveIntegerField(default=0, verbose_name='Комментарии')
+    plain_content = models.TextField(blank=True, editable=False, verbose_name='Текст без разметки')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    COUNTER_FIELDS = ('views', 'likes_count', 'dislikes_count', 'rating', 'comments_count')
+    SEARCH_FIELDS = ('plain_content', 'search_vector')
+
+    # Счётчики и поисковые поля не версионируются: они производны от остальных полей статьи
+    history = HistoricalRecords(excluded_fields=list(COUNTER_FIELDS + SEARCH_FIELDS))
 
     objects = models.Manager()
     published = PublishedManager()
@@ -91,14 +186,42 @@ class Article(models.Model):
         verbose_name_plural = "Статьи"
         ordering = ['-time_create']
         indexes = [
-            models.Index(fields=['-time_create'])
+            models.Index(fields=['-time_create']),
+            GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+            GinIndex(fields=['title'], name='article_title_trgm_idx', opclasses=['gin_trgm_ops']),
         ]
 
     def get_absolute_url(self):
         return reverse('main:post', kwargs={'post_slug': self.slug})
 
+    @staticmethod
+    def search_vector_expression():
+        # Заголовок весит больше текста; используется русская морфология
+        return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('plain_content', weight='B', config=SEARCH_CONFIG))
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields and set(update_fields) <= set(self.COUNTER_FIELDS):
+            # Сохранение только счётчиков не попадает в историю изменений
+            self.skip_history_when_saving = True
+            try:
+                return super().save(*args, **kwargs)
+            finally:
+                del self.skip_history_when_saving
+
+        if update_fields is None or 'content' in update_fields:
+            self.plain_content = html_to_text(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'plain_content'}
+        super().save(*args, **kwargs)
+        if update_fields is None or {'title', 'content'} & set(update_fields):
+            # Вектор считается в базе по уже сохранённому тексту
+            Article.objects.filter(pk=self.pk).update(search_vector=self.search_vector_expression())
+
     def get_sum_rating(self):
-        return max(sum([rating.value for rating in self.ratings.all()]), 0)
+        return max(self.rating, 0)
+
 
 class UniqueView(models.Model):
     article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='unique_views', verbose_name='Статья')
@@ -128,6 +251,76 @@ class TagPost(models.Model):
         return reverse('main:tag', kwargs={'tag_slug': self.slug})
 
 
+class RatingManager(models.Manager):
+    # Один запрос: снять оценку при повторном нажатии, иначе вставить или заменить её (INSERT ... ON CONFLICT),
+    # и тут же поправить счётчики статьи. Частичные уникальные индексы задают цель конфликта
+    # отдельно для авторизованных пользователей и для анонимов (по IP).
+    TOGGLE_SQL = """
+        WITH deleted AS (
+            DELETE FROM {rating} WHERE post_id = %(post_id)s AND {owner} AND value = %(value)s
+            RETURNING value
+        ), upserted AS (
+            INSERT INTO {rating} (post_id, user_id, ip_address, value, time_create)
+            SELECT %(post_id)s::bigint, %(user_id)s::bigint, %(ip_address)s::inet, %(value)s::integer, NOW()
+            WHERE NOT EXISTS (SELECT 1 FROM deleted) AND EXISTS (SELECT 1 FROM {article} WHERE id = %(post_id)s)
+            ON CONFLICT {conflict_target}
+            DO UPDATE SET value = EXCLUDED.value WHERE {rating}.value <> EXCLUDED.value
+            RETURNING (xmax = 0) AS created
+        ), result AS (
+            SELECT CASE
+                WHEN EXISTS (SELECT 1 FROM deleted) THEN 'deleted'
+                WHEN EXISTS (SELECT 1 FROM upserted WHERE created) THEN 'created'
+                WHEN EXISTS (SELECT 1 FROM upserted) THEN 'updated'
+                ELSE 'unchanged'
+            END AS status
+        ), article AS (
+            UPDATE {article} SET
+                likes_count = likes_count + delta.likes,
+                dislikes_count = dislikes_count + delta.dislikes,
+                rating = rating + delta.likes - delta.dislikes
+            FROM (
+                SELECT
+                    CASE status WHEN 'deleted' THEN -%(like)s WHEN 'created' THEN %(like)s
+                        WHEN 'updated' THEN %(like)s - %(dislike)s ELSE 0 END AS likes,
+                    CASE status WHEN 'deleted' THEN -%(dislike)s WHEN 'created' THEN %(dislike)s
+                        WHEN 'updated' THEN %(dislike)s - %(like)s ELSE 0 END AS dislikes
+                FROM result
+            ) AS delta
+            WHERE {article}.id = %(post_id)s
+            RETURNING {article}.rating
+        )
+        SELECT result.status, article.rating FROM result, article
+    """
+
+    def toggle(self, post_id: int, value: int, user_id: int | None, ip_address: str | None) -> tuple[str, int]:
+        """
+        Ставит, меняет или снимает оценку статьи одним запросом.
+        Возвращает статус ('created', 'updated', 'deleted' или 'unchanged') и новый рейтинг статьи.
+        Если статьи нет, вызывает Article.DoesNotExist.
+        """
+        if user_id is not None:
+            # IP хранится только у анонимных оценок: иначе оценка удалённого пользователя (user = NULL)
+            # совпала бы с анонимными оценками с того же адреса
+            ip_address = None
+        if user_id is None:
+            owner = 'user_id IS NULL AND ip_address = %(ip_address)s'
+            conflict_target = '(post_id, ip_address) WHERE user_id IS NULL'
+        else:
+            owner = 'user_id = %(user_id)s'
+            conflict_target = '(post_id, user_id) WHERE user_id IS NOT NULL'
+        sql = self.TOGGLE_SQL.format(rating=self.model._meta.db_table, article=Article._meta.db_table,
+                                     owner=owner, conflict_target=conflict_target)
+        params = {'post_id': int(post_id), 'value': value, 'user_id': user_id, 'ip_address': ip_address,
+                  'like': int(value == 1), 'dislike': int(value == -1)}
+        with connections[router.db_for_write(self.model)].cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:  # Статья не найдена: счётчики обновлять некому
+            raise Article.DoesNotExist(f'Статья {post_id} не найдена')
+        status, rating = row
+        return status, rating
+
+
 class Rating(models.Model):
     """
     Модель рейтинга: Лайк - Дизлайк
@@ -140,8 +333,16 @@ class Rating(models.Model):
     time_create = models.DateTimeField(verbose_name='Время добавления', auto_now_add=True)
     ip_address = models.GenericIPAddressField(verbose_name='IP Адрес', blank=True, null=True)
 
+    objects = RatingManager()
+
     class Meta:
-        unique_together = ('post', 'user', 'ip_address')
+        constraints = [
+            # Одна оценка на статью от пользователя, а для анонимов — от IP-адреса
+            models.UniqueConstraint(fields=['post', 'user'], condition=models.Q(user__isnull=False),
+                                    name='unique_rating_user'),
+            models.UniqueConstraint(fields=['post', 'ip_address'], condition=models.Q(user__isnull=True),
+                                    name='unique_rating_anonymous'),
+        ]
         indexes = [models.Index(fields=['-time_create', 'value'])]
         verbose_name = 'Рейтинг'
         verbose_name_plural = 'Рейтинги'
@@ -207,6 +408,12 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['user','-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at', '-id']),  # Лента уведомлений
+            # Счётчик и последние непрочитанные в шапке сайта; прочитанные (большинство строк) в индекс не входят
+            models.Index(fields=['user', '-created_at'], name='notification_unread_idx',
+                         condition=models.Q(is_read=False)),
+        ]
         verbose_name = 'Оповещение'
         verbose_name_plural = 'Оповещения'
 
@@ -226,6 +433,10 @@ class Notice(models.Model):
 
     class Meta:
         ordering = ['user','-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at', '-id']),  # Лента уведомлений
+            models.Index(fields=['user', '-created_at'], name='notice_unread_idx', condition=models.Q(is_read=False)),
+        ]
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
 
@@ -235,7 +446,7 @@ class Notice(models.Model):
 
 class UserLoginHistory(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
-    login_time = models.DateTimeField(auto_now_add=True)
+    login_time = models.DateTimeField(default=timezone.now)  # Задаётся при постановке входа в очередь
     ip_address = models.GenericIPAddressField()
     location = models.CharField(max_length=100, blank=True)  # Для хранения геолокации
     device_type = models.CharField(max_length=50, blank=True)  # Тип устройства (мобильное, десктоп)
@@ -245,6 +456,7 @@ class UserLoginHistory(models.Model):
     class Meta:
         verbose_name = 'История входа пользователей'
         verbose_name_plural = 'История входа пользователей'
+        indexes = [models.Index(fields=['user', '-login_time'], name='loginhistory_user_time_idx')]
 
     def __str__(self):
         return f"{self.user.username} logged in at {self.login_time.strftime('%d.%m.%Y %H:%M')}"
@@ -262,6 +474,38 @@ class SentMessage(models.Model):
     class Meta:
         verbose_name = "Количество попыток для отправки сообщений"
         verbose_name_plural = "Количество попыток для отправки сообщений"
+        # Ограничение числа писем: попытки пользователя с той же целью за последний период
+        indexes = [models.Index(fields=['user', 'purpose', 'timestamp'], name='sentmessage_limit_idx')]
 
     def __str__(self):
-        return f'{self.user} - {self.timestamp} -  {dict(SentMessage.PURPOSE.choices)[self.purpose]}'
\ No newline at end of file
+        return f'{self.user} - {self.timestamp} -  {dict(SentMessage.PURPOSE.choices)[self.purpose]}'
+
+class SlowQuery(models.Model):
+    """
+    Медленный SQL-запрос из журнала main.slowlog. Одна запись на форму запроса (отпечаток):
+    хранится самый долгий из попавших в выборку случаев и его план выполнения.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')
+    sql = models.TextField(verbose_name='SQL')
+    params = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Параметры')
+    view = models.CharField(max_length=200, blank=True, verbose_name='Представление')
+    source = models.CharField(max_length=300, blank=True, verbose_name='Место вызова')
+    calls = models.PositiveIntegerField(default=0, verbose_name='Вызовов в выборке')
+    total_ms = models.FloatField(default=0, verbose_name='Суммарное время, мс')
+    max_ms = models.FloatField(default=0, verbose_name='Наибольшее время, мс')
+    first_seen = models.DateTimeField(auto_now_add=True, verbose_name='Впервые')
+    last_seen = models.DateTimeField(default=timezone.now, verbose_name='Последний раз')
+    plan = models.TextField(blank=True, verbose_name='План выполнения')
+    explained_at = models.DateTimeField(null=True, blank=True, verbose_name='План получен')
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f'{self.view or "-"}: {self.sql[:80]}'
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
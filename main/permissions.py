@@ -1,3 +1,6 @@
+# Отделения, файлы которых доступны всем сотрудникам
+SPECIAL_CATEGORIES = ['administraciya', 'sout', 'obshie', 'shablony']
+
 
 class AuthorPermissionsMixin:
     def has_permissions(self):
@@ -9,8 +12,7 @@ class AuthorPermissionsMixin:
         return self.request.user.cat2.slug == self.kwargs['dep_slug']
 
     def is_special_category(self):
-        special_categories = ['administraciya', 'sout', 'obshie', 'shablony']
-        return self.kwargs['dep_slug'] in special_categories
+        return self.kwargs['dep_slug'] in SPECIAL_CATEGORIES
 
 
 
@@ -0,0 +1,86 @@
+import logging
+import os
+import subprocess
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from main.models import FileBlob
+from main.utils import claim_batch
+from ohr.settings import PREVIEWS_DIR, PREVIEW_WIDTH, PREVIEW_TIMEOUT, SOFFICE_BINARY, PDFTOPPM_BINARY
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые LibreOffice может преобразовать в PDF для отрисовки первой страницы
+OFFICE_EXTENSIONS = ('doc', 'docx', 'rtf', 'xlsx', 'pptx')
+
+
+def preview_name(sha256: str) -> str:
+    """Путь миниатюры первой страницы: previews/<первые 2 символа хэша>/<хэш>.webp."""
+    return f'{PREVIEWS_DIR}/{sha256[:2]}/{sha256}.webp'
+
+
+def render_first_page(source: str, target: str) -> bool:
+    """
+    Сохраняет первую страницу документа в target (WebP шириной не более PREVIEW_WIDTH).
+    Офисные документы сначала преобразуются в PDF. Возвращает False для неподдерживаемых форматов.
+    """
+    extension = os.path.splitext(source)[1].lstrip('.').lower()
+    if extension != 'pdf' and extension not in OFFICE_EXTENSIONS:
+        return False
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf = source
+        if extension in OFFICE_EXTENSIONS:
+            # Отдельный профиль: параллельные запуски soffice с общим профилем блокируют друг друга
+            subprocess.run([SOFFICE_BINARY, f'-env:UserInstallation=file://{work_dir}/profile', '--headless',
+                            '--convert-to', 'pdf', '--outdir', work_dir, source],
+                           check=True, capture_output=True, timeout=PREVIEW_TIMEOUT)
+            pdf = os.path.join(work_dir, os.path.splitext(os.path.basename(source))[0] + '.pdf')
+        page = os.path.join(work_dir, 'page')
+        subprocess.run([PDFTOPPM_BINARY, '-f', '1', '-l', '1', '-singlefile', '-png',
+                        '-scale-to', str(PREVIEW_WIDTH * 2), pdf, page],
+                       check=True, capture_output=True, timeout=PREVIEW_TIMEOUT)
+        with Image.open(page + '.png') as image:
+            image.thumbnail((PREVIEW_WIDTH, PREVIEW_WIDTH * 2), Image.LANCZOS)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            image.convert('RGB').save(target, 'WEBP', quality=80, method=6)
+    return True
+
+
+def generate_preview(blob: FileBlob, force: bool = False) -> bool:
+    """Создаёт миниатюру для содержимого файла; одна миниатюра на хэш, сколько бы записей на него ни ссылалось."""
+    target = default_storage.path(preview_name(blob.sha256))
+    has_preview = os.path.isfile(target) and not force
+    if not has_preview:
+        try:
+            has_preview = render_first_page(blob.file.path, target)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning('Не удалось создать миниатюру %s: %s', blob.file.name, e)
+            has_preview = False
+    blob.has_preview = has_preview
+    blob.preview_checked_at = timezone.now()
+    blob.save(update_fields=['has_preview', 'preview_checked_at'])
+    return has_preview
+
+
+def generate_pending_previews(batch_size: int = 20, force: bool = False) -> int:
+    """
+    Создаёт миниатюры для содержимого, которое ещё не обрабатывалось (периодическая задача).
+    С force пересоздаёт миниатюры для всех файлов. Возвращает количество созданных миниатюр.
+    """
+    queryset = FileBlob.objects.all() if force else FileBlob.objects.filter(preview_checked_at__isnull=True)
+    created = 0
+    last_pk = 0
+    # Как и индексация текста: пачка забирается отметкой preview_checked_at, чтобы soffice и pdftoppm
+    # не запускались для одного файла в нескольких процессах сайта
+    while pks := claim_batch(queryset, batch_size, last_pk, preview_checked_at=timezone.now()):
+        last_pk = pks[-1]
+        batch = FileBlob.objects.filter(pk__in=pks).order_by('pk')
+        created += sum(generate_preview(blob, force=force) for blob in batch)
+    return created
+
+
+def delete_preview(sha256: str) -> None:
+    default_storage.delete(preview_name(sha256))
@@ -0,0 +1,92 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import Case, F, Q, QuerySet, When
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from main.documents import extract_text
+from main.models import Article, UploadFiles
+from main.permissions import SPECIAL_CATEGORIES
+from main.utils import claim_batch, html_to_text
+from ohr.settings import SEARCH_CONFIG, DOCUMENT_INDEX_WORKERS, DOCUMENT_TEXT_LIMIT, PREVIEW_EXCERPT_LENGTH
+
+
+def search_articles(query: str) -> QuerySet:
+    """
+    Полнотекстовый поиск статей по сохранённому search_vector с ранжированием SearchRank.
+    Совпадения заголовка по триграммам (оператор %) добавляются для устойчивости к опечаткам;
+    оба условия обслуживаются GIN-индексами.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return Article.objects.annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        similarity=TrigramSimilarity('title', query),
+    ).filter(Q(search_vector=search_query) | Q(title__trigram_similar=query)).order_by('-rank', '-similarity')
+
+
+def rebuild_search_index(batch_size: int = 500) -> int:
+    """Заново извлекает текст статей и пересчитывает search_vector. Возвращает количество статей."""
+    count = 0
+    batch = []
+    for article in Article.objects.only('pk', 'content').iterator(chunk_size=batch_size):
+        article.plain_content = html_to_text(article.content)
+        batch.append(article)
+        if len(batch) == batch_size:
+            count += Article.objects.bulk_update(batch, ['plain_content'])
+            batch = []
+    count += Article.objects.bulk_update(batch, ['plain_content'])
+    Article.objects.update(search_vector=Article.search_vector_expression())
+    return count
+
+
+def search_files(query: str, user) -> QuerySet:
+    """
+    Поиск файлов по извлечённому тексту, названию и описанию среди файлов, которые пользователь может скачать
+    (те же правила, что в AuthorPermissionsMixin). Общие файлы хранятся отдельной записью на каждое отделение,
+    поэтому одинаковые названия схлопываются; остаётся запись отделения пользователя, а если её нет — самая новая.
+    По этой записи строятся ссылки на скачивание и миниатюру.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    matches = UploadFiles.objects.filter(Q(search_vector=search_query) | Q(title__trigram_similar=query))
+    if not user.is_superuser:
+        matches = matches.filter(Q(cat_id=user.cat2_id) | Q(cat__slug__in=SPECIAL_CATEGORIES))
+    own_first = Case(When(cat_id=user.cat2_id, then=0), default=1)
+    unique_ids = matches.order_by('title', own_first, '-uploaded_at').distinct('title').values('pk')
+    return UploadFiles.objects.filter(pk__in=unique_ids).select_related('cat', 'blob').annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        excerpt=Substr('content_text', 1, PREVIEW_EXCERPT_LENGTH),
+        similarity=TrigramSimilarity('title', query),
+    ).defer('content_text', 'search_vector').order_by(  # У ещё не проиндексированных файлов rank равен NULL
+        F('rank').desc(nulls_last=True), '-similarity')
+
+
+def index_pending_files(batch_size: int = 50, queryset=None) -> int:
+    """
+    Извлекает текст из ещё не проиндексированных файлов в пуле процессов и обновляет search_vector.
+    Один и тот же файл, привязанный к нескольким отделениям, разбирается один раз; файлы, которые уже разбирает
+    другой процесс, пропускаются. Возвращает количество проиндексированных записей.
+    """
+    queryset = UploadFiles.objects.filter(content_indexed_at__isnull=True) if queryset is None else queryset
+    indexed = 0
+    # spawn: планировщик работает в потоке веб-сервера, а fork многопоточного процесса небезопасен
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=DOCUMENT_INDEX_WORKERS, mp_context=context) as pool:
+        last_pk = 0
+        # Планировщик запущен в каждом процессе сайта: пачка забирается отметкой content_indexed_at,
+        # чтобы один и тот же файл не разбирали несколько процессов
+        while pks := claim_batch(queryset, batch_size, last_pk, content_indexed_at=timezone.now()):
+            last_pk = pks[-1]
+            batch = list(UploadFiles.objects.filter(pk__in=pks).order_by('pk').only('pk', 'file'))
+            paths = sorted({upload.file.path for upload in batch if upload.file})
+            texts = dict(zip(paths, pool.map(extract_text, paths, [DOCUMENT_TEXT_LIMIT] * len(paths))))
+            now = timezone.now()
+            for upload in batch:
+                upload.content_text = texts.get(upload.file.path, '') if upload.file else ''
+                upload.content_indexed_at = now
+            UploadFiles.objects.bulk_update(batch, ['content_text', 'content_indexed_at'])
+            UploadFiles.objects.filter(pk__in=[upload.pk for upload in batch]).update(
+                search_vector=UploadFiles.search_vector_expression())
+            indexed += len(batch)
+    return indexed
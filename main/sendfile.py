@@ -0,0 +1,103 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from ohr.settings import MEDIA_ROOT, SENDFILE_BACKEND, SENDFILE_URL
+
+# Типы файлов HLS, которых может не быть в системной таблице mimetypes
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def sendfile(request, name: str, as_attachment: bool = False, filename: str = None) -> HttpResponse:
+    """
+    Отдаёт файл из MEDIA_ROOT после проверки прав во view.
+    При SENDFILE_BACKEND = 'nginx' или 'apache' передачу выполняет веб-сервер (X-Accel-Redirect / X-Sendfile),
+    иначе файл отдаётся из Python с поддержкой Range и условных запросов.
+    """
+    path = os.path.join(MEDIA_ROOT, name)
+    if not os.path.isfile(path):
+        raise Http404('Файл не найден')
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if SENDFILE_BACKEND in ('nginx', 'apache'):
+        response = HttpResponse(content_type=content_type)
+        if SENDFILE_BACKEND == 'nginx':
+            response['X-Accel-Redirect'] = quote(f'{SENDFILE_URL}{name}')
+        else:
+            response['X-Sendfile'] = str(path)
+    else:
+        response = _python_response(request, path, content_type)
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def _python_response(request, path: str, content_type: str) -> HttpResponse:
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    # 304 Not Modified / 412 Precondition Failed по If-None-Match, If-Modified-Since и т.п.
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return conditional
+
+    byte_range = _parse_range(request, size, etag, last_modified)
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif byte_range == ():
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _parse_range(request, size: int, etag: str, last_modified: int):
+    """
+    Возвращает (start, end) запрошенного диапазона, () для неудовлетворимого диапазона
+    и None, если нужно отдать файл целиком (нет Range, несколько диапазонов или файл изменился — If-Range).
+    """
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if not match or not size:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    start, end = match.groups()
+    if not start:  # bytes=-N: последние N байт
+        if not end:
+            return None
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return ()
+    return start, end
+
+
+def _read_range(path: str, start: int, end: int):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining and (chunk := file.read(min(CHUNK_SIZE, remaining))):
+            remaining -= len(chunk)
+            yield chunk
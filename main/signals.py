@@ -1,54 +1,122 @@
 import os
 
-from django.contrib.auth import user_logged_in
-from django.db.models.signals import post_delete
+from django.contrib.auth import get_user_model, user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed, pre_migrate, post_migrate
 from django.dispatch import receiver
-from user_agents import parse
+from main.blobs import release_blob
+from main.counters import deduplicate_ratings, reconcile_article_counters
+from main.images import schedule_derivatives
+from main.leaderboards import invalidate_leaderboards
+from main.logins import enqueue_login
+from main.summary import invalidate_header_summary
 from main.utils import get_client_ip
-from main.models import UploadFiles, UserLoginHistory
+from main.models import UploadFiles, Article, Categorys, TagPost, Notification, Notice, Comment, Rating
+from study.compliance import schedule_department_refresh, schedule_employee_refresh
+from study.models import Achievement, SubjectCompletion, Slide
+from users.models import Profile
 
 
 @receiver(post_delete, sender=UploadFiles)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
-    """ Уничтожает файл из файловой системы при удалении соответствующего объекта `UploadFiles`. """
-    if instance.file:
+    """ Уничтожает файл из файловой системы, когда на него не осталось ни одной записи `UploadFiles`. """
+    if instance.blob_id:
+        blob_id = instance.blob_id
+        transaction.on_commit(lambda: release_blob(blob_id))
+    elif instance.file and not UploadFiles.objects.filter(file=instance.file.name).exists():
+        # Файлы, загруженные до появления FileBlob: общий файл мог использоваться другими отделениями
         if os.path.isfile(instance.file.path):
             os.remove(instance.file.path)
 
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Categorys)
+@receiver([post_save, post_delete], sender=TagPost)
+@receiver(m2m_changed, sender=Article.tags.through)
+def reset_leaderboards(sender, **kwargs):
+    """ Сбрасывает закэшированные рейтинги боковой панели при изменении статей, категорий и тегов. """
+    invalidate_leaderboards()
+
+
+@receiver([post_save, post_delete], sender=Notification)
+@receiver([post_save, post_delete], sender=Notice)
+@receiver([post_save, post_delete], sender=Achievement)
+def reset_user_header_summary(sender, instance, **kwargs):
+    """ Сбрасывает сводку шапки сайта при изменении уведомлений и достижений пользователя. """
+    invalidate_header_summary(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=SubjectCompletion)
+def reset_completion_header_summary(sender, instance, **kwargs):
+    """ Сбрасывает сводку шапки сайта при изменении курсов пользователя. """
+    invalidate_header_summary(instance.users_id)
+
+
+@receiver([post_save, post_delete], sender=SubjectCompletion)
+def refresh_completion_compliance(sender, instance, update_fields=None, **kwargs):
+    """ Пересчитывает сводку обучения сотрудника при назначении, сдаче и удалении курса. """
+    if update_fields is None or 'completed' in update_fields:  # Переход по слайдам сводку не меняет
+        schedule_employee_refresh(instance.users_id)
+
+
+@receiver(post_save, sender=Profile)
+def refresh_profile_compliance(sender, instance, update_fields=None, **kwargs):
+    """ Срок сдачи и инструктаж в сводке обучения берутся из профиля. """
+    if update_fields is None or {'date_of_work', 'instructaj'} & set(update_fields):
+        schedule_employee_refresh(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def refresh_user_compliance(sender, instance, update_fields=None, **kwargs):
+    """ Перевод в другое отделение и увольнение меняют итоги отделений. """
+    if update_fields is None or {'cat2', 'is_active'} & set(update_fields):
+        schedule_employee_refresh(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def refresh_deleted_user_compliance(sender, instance, **kwargs):
+    schedule_department_refresh(instance.cat2_id)
+
+
+# Модель -> поле с изображением, для которого создаются уменьшенные копии
+IMAGE_FIELDS = {Article: 'photo', Comment: 'image', Profile: 'photo', Slide: 'photo'}
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Slide)
+def create_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    """ Ставит загруженное изображение в очередь на создание уменьшенных копий. """
+    field = IMAGE_FIELDS[sender]
+    if update_fields is None or field in update_fields:
+        schedule_derivatives(getattr(instance, field))
+
+
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
-    ip=get_client_ip(request)
-    # Извлечение информации об устройстве
-    user_agent = parse(request.META.get('HTTP_USER_AGENT', ''))
-    device_type = user_agent.device.family
-    os = user_agent.os.family
-    browser = user_agent.browser.family
-
-    # Опциональная часть для получения геолокации
-    try:
-        location = get_location(ip)
-    except Exception as e:
-        print(f"Error getting geolocation for IP {ip}: {e}")
-        location = "Неизвестно"
-
-    UserLoginHistory.objects.create(
-        user=user,
-        ip_address=ip,
-        location=location,
-        device_type=device_type,
-        browser=browser,
-        os=os
-    )
-
-
-def get_location(ip):
-    """Функция для получения геолокации по IP"""
-    # Здесь можно использовать сторонние сервисы вроде GeoIP
-    # Пример использования библиотеки geoip2
-    from geoip2.database import Reader
-
-    reader = Reader('geoip/GeoLite2-City.mmdb')  # путь к базе данных
-    response = reader.city(ip)
-    city = response.city.name
-    country = response.country.iso_code
-    return f"{city}, {country}"
\ No newline at end of file
+    """ Ставит вход в очередь, чтобы не разбирать User-Agent и геолокацию внутри запроса. """
+    enqueue_login(user.pk, get_client_ip(request), request.META.get('HTTP_USER_AGENT', ''))
+
+
+@receiver(pre_delete, sender=get_user_model())
+def detach_user_ratings(sender, instance, **kwargs):
+    """ Оценки удалённого пользователя остаются в рейтинге без IP, чтобы не слиться с анонимными оценками. """
+    Rating.objects.filter(user=instance).exclude(ip_address=None).update(ip_address=None)
+
+
+_deduplicated_posts = set()
+
+
+@receiver(pre_migrate)
+def deduplicate_ratings_before_migrate(sender, using, **kwargs):
+    """ Убирает повторные оценки до создания уникальных ограничений Rating, иначе migrate завершится ошибкой. """
+    if sender.name == 'main':
+        _deduplicated_posts.update(deduplicate_ratings(using))
+
+
+@receiver(post_migrate)
+def reconcile_deduplicated_posts(sender, using, **kwargs):
+    """ Пересчитывает счётчики лайков статей, у которых при миграции удалялись повторные оценки. """
+    if sender.name == 'main' and _deduplicated_posts:
+        reconcile_article_counters(Article.objects.using(using).filter(pk__in=_deduplicated_posts))
+        _deduplicated_posts.clear()
@@ -0,0 +1,186 @@
+"""
+Журнал медленных SQL-запросов. Обёртка выполнения запросов (SlowQueryRecorder) ставит запросы дольше
+SLOW_QUERY_MS в очередь вместе с представлением и местом вызова в коде проекта, а периодическая задача
+process_slow_queries сводит их по отпечатку в SlowQuery и получает для них планы EXPLAIN (ANALYZE, BUFFERS).
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from main.models import SlowQuery
+from main.utils import CacheQueue
+from ohr.settings import BASE_DIR, SLOW_QUERY_MS, SLOW_QUERY_SAMPLE_RATE, SLOW_QUERY_EXPLAIN_TTL, \
+    SLOW_QUERY_EXPLAIN_BATCH, SLOW_QUERY_EXPLAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+slow_query_queue = CacheQueue('slow-queries')
+
+IN_LIST_RE = re.compile(r'\((?:%s,\s*)+%s\)')
+PROJECT_DIR = str(BASE_DIR)
+# Кадры, которые не являются местом вызова: сам журнал и обёртки запросов
+SKIP_FRAMES = ('/main/slowlog.py', '/main/middleware.py', '/main/metrics.py')
+# Столбцы с паролями, ключами сессий и устройств, ответами и адресами почты: их значения в журнал не попадают
+SENSITIVE_COLUMNS = frozenset({'password', 'secret_answer', 'otp_secret', 'key', 'token', 'session_key',
+                               'session_data', 'email', 'reserve_email'})
+REDACTED = '[скрыто]'
+PLACEHOLDER_RE = re.compile(r'%%|%\((\w+)\)s|%s')
+COLUMN_RE = re.compile(r'"(\w+)"')
+
+
+def fingerprint(sql: str) -> str:
+    """Отпечаток формы запроса: списки IN разной длины считаются одним запросом."""
+    normalized = IN_LIST_RE.sub('(...)', ' '.join(sql.split()))
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def source_frame() -> str:
+    """Ближайший к запросу кадр стека из кода проекта (не Django и не сторонних пакетов)."""
+    for frame, lineno in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename \
+                and not filename.endswith(SKIP_FRAMES):
+            return f'{filename[len(PROJECT_DIR) + 1:]}:{lineno} in {frame.f_code.co_name}'[:300]
+    return ''
+
+
+def serialize_params(params):
+    """Параметры в виде JSON для повторного выполнения в EXPLAIN; None, если их не сохранить."""
+    try:
+        return json.loads(json.dumps(params, cls=DjangoJSONEncoder))
+    except (TypeError, ValueError):
+        return None
+
+
+def keeps_params(sql: str) -> bool:
+    """Параметры сохраняются только у SELECT: в изменяющих запросах передаются хеши паролей, ключи и коды."""
+    return sql.lstrip()[:6].upper() == 'SELECT'
+
+
+def redact_params(sql: str, params):
+    """
+    Заменяет строки, которые сравниваются со столбцами SENSITIVE_COLUMNS, на REDACTED. Столбец параметра —
+    ближайший идентификатор перед ним: так Django записывает условия ("таблица"."столбец" = %s, IN (%s, %s)).
+    """
+    if not params:
+        return params
+    named = isinstance(params, dict)
+    redacted = dict(params) if named else list(params)
+    position = -1
+    for match in PLACEHOLDER_RE.finditer(sql):
+        if match.group() == '%%':
+            continue
+        position += 1
+        key = match.group(1) if named else position
+        columns = COLUMN_RE.findall(sql, max(0, match.start() - 200), match.start())
+        try:
+            if columns and columns[-1] in SENSITIVE_COLUMNS and isinstance(redacted[key], str):
+                redacted[key] = REDACTED
+        except (IndexError, KeyError):
+            break
+    return redacted
+
+
+def record_slow_query(sql: str, params, ms: float, view: str) -> None:
+    params = serialize_params(redact_params(sql, params)) if keeps_params(sql) else None
+    slow_query_queue.push({'fingerprint': fingerprint(sql), 'sql': sql, 'params': params,
+                           'ms': ms, 'view': view, 'source': source_frame(), 'at': timezone.now()})
+
+
+class SlowQueryRecorder:
+    """Обёртка выполнения SQL (connection.execute_wrapper) для одного запроса к сайту."""
+
+    def __init__(self, request):
+        self.request = request
+
+    def view_name(self) -> str:
+        # Маршрут известен только после разбора URL, поэтому берём его в момент записи
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else 'unresolved'
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if ms >= SLOW_QUERY_MS and not many and random.random() < SLOW_QUERY_SAMPLE_RATE:
+                try:
+                    record_slow_query(sql, params, ms, self.view_name())
+                except Exception as e:
+                    logger.warning('Не удалось записать медленный запрос: %s', e)
+
+
+def explain(slow_query: SlowQuery) -> str:
+    """
+    План запроса с фактическими временами. ANALYZE выполняет запрос, поэтому он применяется только к SELECT
+    и внутри транзакции, которая откатывается; для изменяющих запросов сохраняется план без выполнения.
+    """
+    sql = slow_query.sql.lstrip()
+    analyze = sql[:6].upper() == 'SELECT' and 'FOR UPDATE' not in sql.upper()
+    options = 'ANALYZE, BUFFERS' if analyze else 'VERBOSE'
+    if slow_query.params is None and '%s' in sql:
+        return 'План не получен: параметры запроса не сохраняются'
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SET LOCAL statement_timeout = {int(SLOW_QUERY_EXPLAIN_TIMEOUT)}')
+            cursor.execute(f'EXPLAIN ({options}) {sql}', slow_query.params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            transaction.set_rollback(True)
+    except DatabaseError as e:
+        plan = f'Ошибка EXPLAIN: {e}'
+    return plan
+
+
+def explain_slow_query(slow_query: SlowQuery) -> None:
+    slow_query.plan = explain(slow_query)
+    slow_query.explained_at = timezone.now()
+    slow_query.save(update_fields=['plan', 'explained_at'])
+
+
+def process_slow_queries(batch_size: int = 1000) -> int:
+    """
+    Сводит очередь медленных запросов в SlowQuery и получает планы для не более SLOW_QUERY_EXPLAIN_BATCH
+    самых долгих запросов без плана или с планом старше SLOW_QUERY_EXPLAIN_TTL. Возвращает число событий.
+    """
+    processed = 0
+    while events := slow_query_queue.drain(limit=batch_size):
+        processed += len(events)
+        grouped = {}
+        for event in events:
+            grouped.setdefault(event['fingerprint'], []).append(event)
+        existing = SlowQuery.objects.in_bulk(list(grouped), field_name='fingerprint')
+        created, updated = [], []
+        for key, group in grouped.items():
+            slowest = max(group, key=lambda event: event['ms'])
+            slow_query = existing.get(key) or SlowQuery(fingerprint=key)
+            if slowest['ms'] > slow_query.max_ms:
+                slow_query.sql, slow_query.params = slowest['sql'], slowest['params']
+                slow_query.view, slow_query.source = slowest['view'], slowest['source']
+                slow_query.max_ms = slowest['ms']
+            slow_query.calls += len(group)
+            slow_query.total_ms += sum(event['ms'] for event in group)
+            slow_query.last_seen = max(event['at'] for event in group)
+            (updated if slow_query.pk else created).append(slow_query)
+        SlowQuery.objects.bulk_create(created, ignore_conflicts=True)
+        SlowQuery.objects.bulk_update(updated, ['sql', 'params', 'view', 'source', 'max_ms', 'calls',
+                                                'total_ms', 'last_seen'])
+
+    stale = timezone.now() - timedelta(seconds=SLOW_QUERY_EXPLAIN_TTL)
+    pending = SlowQuery.objects.filter(Q(explained_at__isnull=True) | Q(explained_at__lt=stale))
+    for slow_query in pending.order_by('-max_ms')[:SLOW_QUERY_EXPLAIN_BATCH]:
+        # Планировщик запущен в каждом процессе сайта: запрос получает тот, чьё условное обновление прошло,
+        # иначе ANALYZE выполнил бы самые тяжёлые запросы столько раз, сколько процессов
+        if pending.filter(pk=slow_query.pk).update(explained_at=timezone.now()):
+            explain_slow_query(slow_query)
+    return processed
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+
+from main.models import Notification, Notice
+from ohr.settings import HEADER_SUMMARY_TIMEOUT, HEADER_SUMMARY_LATEST
+from study.models import Achievement, SubjectCompletion
+
+
+def _summary_key(user_id: int) -> str:
+    return f'header-summary:{user_id}'
+
+
+def _build_summary(user) -> dict:
+    """Собирает из базы всё, что выводится в шапке сайта для пользователя."""
+    notifications = Notification.objects.filter(user=user, is_read=False)
+    notices = Notice.objects.filter(user=user, is_read=False)
+    achievements = list(Achievement.objects.filter(user=user, is_received=False))
+    return {
+        'notifications': list(notifications.order_by('-created_at')[:HEADER_SUMMARY_LATEST]),
+        'notice': list(notices.order_by('-created_at')[:HEADER_SUMMARY_LATEST]),
+        'notifications_count': notifications.count() + notices.count(),
+        'achievements': achievements,
+        'achievements_count': len(achievements),
+        'subject_completions': list(SubjectCompletion.objects.filter(users=user).select_related('subjects')),
+    }
+
+
+def get_header_summary(request) -> dict:
+    """
+    Возвращает сводку для шапки сайта: непрочитанные уведомления, новые достижения и курсы пользователя.
+    Сводка хранится в кэше и запоминается на время запроса, поэтому все контекст-процессоры
+    вместе обходятся одним обращением к кэшу.
+    """
+    if not hasattr(request, '_header_summary'):
+        user = request.user
+        summary = cache.get(_summary_key(user.pk))
+        if summary is None:
+            summary = _build_summary(user)
+            cache.set(_summary_key(user.pk), summary, HEADER_SUMMARY_TIMEOUT)
+        request._header_summary = summary
+    return request._header_summary
+
+
+def invalidate_header_summary(*user_ids: int) -> None:
+    """Сбрасывает сводку пользователей после изменения их уведомлений, достижений или курсов."""
+    cache.delete_many([_summary_key(user_id) for user_id in user_ids])
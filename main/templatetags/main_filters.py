@@ -2,11 +2,12 @@ import os
 import re
 
 import markdown
-from django.db.models import Count, Q, F
 from django.template.defaultfilters import stringfilter
 from django import template
 from django.utils.safestring import mark_safe
-from main.models import Categorys, TagPost, Article
+from main import leaderboards
+from main.images import derivative_url
+from main.models import Categorys
 
 register = template.Library()
 
@@ -70,7 +71,7 @@ def show_categories(cat_selected=0):
     Пример использования:
     {% show_categories cat_selected=selected_category_id %}
     """
-    cats = Categorys.objects.annotate(total=Count("posts")).filter(total__gt=0)
+    cats = leaderboards.categories()
     return {'cats': cats, 'cat_selected': cat_selected}
 
 
@@ -84,7 +85,7 @@ def show_all_tags():
     Пример использования:
     {% show_all_tags %}
     """
-    return {'tags': TagPost.objects.annotate(total=Count("tags")).filter(total__gt=0).order_by('?')[:3]}
+    return {'tags': leaderboards.random_tags(3)}
 
 
 @register.inclusion_tag('main/latest_posts.html')
@@ -99,11 +100,7 @@ def show_popular_posts(count):
     Пример использования:
     {% show_popular_posts 5 %}
     """
-    popular_posts = Article.published.annotate(
-        total_likes=Count('ratings', filter=Q(ratings__value=1)),
-        total_dislikes=Count('ratings', filter=Q(ratings__value=-1)),
-        net_rating=F('total_likes') - F('total_dislikes')
-    ).order_by('-net_rating')[:count]
+    popular_posts = leaderboards.popular_posts(count)
     return {'popular_posts': popular_posts}
 
 
@@ -118,7 +115,7 @@ def articles_by_comment_count(count):
     Пример использования:
     {% articles_by_comment_count 5 %}
     """
-    comment_posts = Article.objects.annotate(comment_count=Count('comments')).order_by('-comment_count')[:count]
+    comment_posts = leaderboards.commented_posts(count)
     return {'comment_posts': comment_posts}
 
 @register.filter(name='markdown')
@@ -154,3 +151,9 @@ def file_icon(file_path):
 @register.filter
 def div_size(size):
     return round(size / 1048576,1)
+
+
+@register.filter
+def resized(image, size='medium'):
+    """URL уменьшенной копии изображения (WebP), пока копии нет — URL оригинала."""
+    return derivative_url(image, size)
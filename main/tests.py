@@ -1,8 +1,33 @@
-from django.test import SimpleTestCase, TestCase
+import io
+import os
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse, resolve
 
-from main.models import Article
+from main.archives import stream_zip
+from main.benchmarks import HOT_VIEWS, measure
+from main.blobs import store_blob
+from main.counters import record_view, flush_views
+from main.documents import extract_text
+from main.feed import notification_feed
+from main.images import derivative_name, generate_derivatives
+from main.logins import enqueue_login, get_location, process_login_events
+from main.metrics import InstrumentedCache, Registry, finish_request, start_request
+from main.previews import generate_pending_previews
+from main.search import search_articles, search_files
+from main.sendfile import sendfile
+from main.slowlog import fingerprint, process_slow_queries, record_slow_query
+from main.models import Article, UniqueView, Rating, Notice, UploadFiles, SlowQuery, UserLoginHistory
 from main.views import IndexView
+from users.models import Departments, Profession, Profile
 
 
 class IndexURLsTest(SimpleTestCase):
@@ -22,4 +47,331 @@ class ArticlePostsTest(TestCase):
         a = Article.published.all().select_related('category')
         path=reverse('main:home')
         response = self.client.get(path)
-        print(a)
\ No newline at end of file
+        print(a)
+
+class ArticleViewsCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = Article.objects.create(title='Статья', slug='statya-1', is_published=True)
+
+    def test_show_post_does_not_write(self):
+        path = reverse('main:post', kwargs={'post_slug': self.article.slug})
+        self.client.get(path)
+        self.client.get(path)
+        self.assertFalse(UniqueView.objects.exists())
+
+    def test_flush_views_deduplicates_by_ip(self):
+        record_view(self.article.pk, '10.0.0.1')
+        record_view(self.article.pk, '10.0.0.1')
+        record_view(self.article.pk, '10.0.0.2')
+        flush_views()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 2)
+        self.assertEqual(UniqueView.objects.filter(article=self.article).count(), 2)
+
+    def test_failed_flush_keeps_views_queued(self):
+        record_view(self.article.pk, '10.0.0.1')
+        record_view(self.article.pk + 1000, '10.0.0.1')  # Статью удалили, пока просмотр ждал в очереди
+        with mock.patch.object(UniqueView.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_views()
+        self.assertEqual(flush_views(), 2)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 1)
+
+
+class RatingCountersTest(TestCase):
+    def setUp(self):
+        self.article = Article.objects.create(title='Статья', slug='statya-2', is_published=True)
+        self.path = reverse('main:rating')
+
+    def test_like_toggle_updates_counters(self):
+        response = self.client.post(self.path, {'post_id': self.article.pk, 'value': 1})
+        self.assertEqual(response.json(), {'status': 'created', 'rating_sum': 1})
+        self.client.post(self.path, {'post_id': self.article.pk, 'value': -1})
+        self.article.refresh_from_db()
+        self.assertEqual((self.article.likes_count, self.article.dislikes_count, self.article.rating), (0, 1, -1))
+        response = self.client.post(self.path, {'post_id': self.article.pk, 'value': -1})
+        self.assertEqual(response.json(), {'status': 'deleted', 'rating_sum': 0})
+        self.article.refresh_from_db()
+        self.assertEqual((self.article.likes_count, self.article.dislikes_count, self.article.rating), (0, 0, 0))
+
+    def test_anonymous_vote_is_unique_per_ip(self):
+        self.client.post(self.path, {'post_id': self.article.pk, 'value': 1}, REMOTE_ADDR='10.0.0.5')
+        self.client.post(self.path, {'post_id': self.article.pk, 'value': -1}, REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(Rating.objects.filter(post=self.article, user=None).count(), 1)
+
+    def test_deleted_user_vote_does_not_clash_with_anonymous(self):
+        user = get_user_model().objects.create_user(username='voter', email='voter@example.com', password='password')
+        self.client.force_login(user)
+        self.client.post(self.path, {'post_id': self.article.pk, 'value': 1}, REMOTE_ADDR='10.0.0.5')
+        self.client.logout()
+        self.client.post(self.path, {'post_id': self.article.pk, 'value': 1}, REMOTE_ADDR='10.0.0.5')
+        user.delete()
+        self.assertEqual(Rating.objects.filter(post=self.article, user=None).count(), 2)
+        self.assertEqual(Rating.objects.filter(post=self.article, ip_address='10.0.0.5').count(), 1)
+
+    def test_vote_for_missing_article_is_not_found(self):
+        response = self.client.post(self.path, {'post_id': self.article.pk + 1000, 'value': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Rating.objects.exists())
+
+
+class NotificationFeedTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='reader', password='password')
+        Notice.objects.bulk_create([Notice(user=self.user, message=f'Уведомление {i}') for i in range(5)])
+
+    def test_cursor_pages_cover_feed_once(self):
+        first, cursor = notification_feed(self.user, is_read=False, limit=3)
+        second, last_cursor = notification_feed(self.user, is_read=False, cursor=cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertEqual({notice.pk for notice in first + second}, set(Notice.objects.values_list('pk', flat=True)))
+
+    def test_mark_all_read(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('main:notification_read_all'))
+        self.assertFalse(Notice.objects.filter(user=self.user, is_read=False).exists())
+
+
+class LoginHistoryQueueTest(TestCase):
+    IPHONE = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1')
+
+    def setUp(self):
+        cache.clear()
+        get_location.cache_clear()
+        self.addCleanup(get_location.cache_clear)
+        self.user = get_user_model().objects.create_user(username='employee', password='password')
+
+    def test_queued_login_is_parsed_and_saved(self):
+        with mock.patch('main.logins.get_geoip_reader') as reader:
+            response = reader.return_value.city.return_value
+            response.city.name, response.country.iso_code = 'Москва', 'RU'
+            enqueue_login(self.user.pk, '8.8.8.8', self.IPHONE)
+            enqueue_login(self.user.pk + 1000, '8.8.8.8', self.IPHONE)  # Пользователь уже удалён
+            enqueue_login(self.user.pk, '8.8.8.8', self.IPHONE)
+            self.assertEqual(process_login_events(), 2)
+        reader.return_value.city.assert_called_once_with('8.8.8.8')  # Повторный адрес берётся из кэша
+        history = UserLoginHistory.objects.filter(user=self.user)
+        self.assertEqual(history.count(), 2)
+        self.assertEqual(set(history.values_list('ip_address', 'location', 'device_type', 'os', 'browser')),
+                         {('8.8.8.8', 'Москва, RU', 'iPhone', 'iOS', 'Mobile Safari')})
+        self.assertEqual(process_login_events(), 0)
+
+
+class ArticleSearchTest(TestCase):
+    def test_search_uses_plain_text_and_stemming(self):
+        article = Article.objects.create(title='Средства защиты', slug='sredstva-zaschity',
+                                         content='<p>Выдача&nbsp;<b>респираторов</b> работникам</p>')
+        self.assertEqual(article.plain_content, 'Выдача\xa0респираторов работникам')
+        self.assertEqual(list(search_articles('респиратор')), [article])
+        self.assertEqual(list(search_articles('b')), [])
+
+
+class FileSearchTest(TestCase):
+    def test_shared_file_links_to_users_department(self):
+        User = get_user_model()
+        surgery, therapy, icu = (Departments.objects.create(name=name, slug=slug, is_inpatient=True)
+                                 for name, slug in (('Хирургия', 'surgery'), ('Терапия', 'therapy'), ('ОРИТ', 'icu')))
+        own = UploadFiles.objects.create(cat=surgery, title='Инструкция по пожарной безопасности', file='a.pdf')
+        UploadFiles.objects.create(cat=therapy, title='Инструкция по пожарной безопасности', file='a.pdf')
+        nurse = User.objects.create_user(username='nurse', password='password', cat2=surgery)
+        outsider = User.objects.create_user(username='outsider', password='password', cat2=icu)
+        self.assertEqual(list(search_files('пожарной безопасности', nurse)), [own])
+        self.assertEqual(list(search_files('пожарной безопасности', outsider)), [])
+
+
+class DocumentTextTest(SimpleTestCase):
+    def test_docx_paragraphs_are_extracted(self):
+        namespace = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'instruction.docx')
+            with zipfile.ZipFile(path, 'w') as archive:
+                archive.writestr('word/document.xml', f'<w:document xmlns:w="{namespace}"><w:body>'
+                                                      f'<w:p><w:r><w:t>Инструкция по охране</w:t></w:r></w:p>'
+                                                      f'<w:p><w:r><w:t>труда</w:t></w:r></w:p></w:body></w:document>')
+            self.assertEqual(extract_text(path, limit=100), 'Инструкция по охране труда')
+            self.assertEqual(extract_text(path, limit=10), 'Инструкция')
+
+
+class FileBlobTest(TestCase):
+    def test_same_content_is_stored_once(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            first = store_blob(SimpleUploadedFile('instruction.pdf', b'%PDF-1.4 content'))
+            second = store_blob(SimpleUploadedFile('copy.pdf', b'%PDF-1.4 content'))
+            self.assertEqual(first.pk, second.pk)
+            self.assertTrue(first.file.name.endswith(f'{first.sha256}/instruction.pdf'))
+            self.assertEqual(first.size, len(b'%PDF-1.4 content'))
+
+
+class FilePreviewTest(TestCase):
+    def test_unsupported_document_is_checked_once(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            blob = store_blob(SimpleUploadedFile('notes.txt', b'text'))
+            self.assertEqual(generate_pending_previews(), 0)
+            blob.refresh_from_db()
+            self.assertFalse(blob.has_preview)
+            self.assertIsNotNone(blob.preview_checked_at)
+            with mock.patch('main.previews.render_first_page') as render:
+                generate_pending_previews()  # Уже обработанное содержимое повторно не разбирается
+                render.assert_not_called()
+
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(username='admin', email='admin@example.com',
+                                                          password='password', is_staff=True)
+        self.department = Departments.objects.create(name='Хирургия', slug='surgery', is_inpatient=False)
+        self.client.force_login(self.admin)
+
+    def test_upload_resumes_from_server_offset(self):
+        content = b'x' * 10
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('main:upload_create'), {
+                'target': 'file', 'filename': 'instruction.pdf', 'size': len(content), 'cat': self.department.pk})
+            session_url = response['Location']
+            self.client.generic('PATCH', session_url, content[:4], HTTP_UPLOAD_OFFSET='0')
+            # Повтор уже отправленной части отклоняется, клиент узнаёт смещение и продолжает
+            response = self.client.generic('PATCH', session_url, content[:4], HTTP_UPLOAD_OFFSET='0')
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(self.client.head(session_url)['Upload-Offset'], '4')
+            self.client.generic('PATCH', session_url, content[4:], HTTP_UPLOAD_OFFSET='4')
+            self.assertEqual(self.client.post(session_url + 'finalize/').status_code, 201)
+            self.assertEqual(self.client.post(session_url + 'finalize/').status_code, 404)
+            upload = UploadFiles.objects.get(cat=self.department)
+            self.assertEqual(upload.blob.size, len(content))
+
+    def test_extension_is_checked_before_upload(self):
+        response = self.client.post(reverse('main:upload_create'), {
+            'target': 'file', 'filename': 'virus.exe', 'size': 10, 'cat': self.department.pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class SendfileRangeTest(SimpleTestCase):
+    def test_range_and_conditional_requests(self):
+        with tempfile.TemporaryDirectory() as media_root:
+            with open(os.path.join(media_root, 'video.mp4'), 'wb') as file:
+                file.write(b'0123456789')
+            with mock.patch('main.sendfile.MEDIA_ROOT', media_root):
+                response = sendfile(RequestFactory().get('/', HTTP_RANGE='bytes=2-5'), 'video.mp4')
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+                self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+                not_modified = sendfile(RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag']), 'video.mp4')
+                self.assertEqual(not_modified.status_code, 304)
+
+                unsatisfiable = sendfile(RequestFactory().get('/', HTTP_RANGE='bytes=20-'), 'video.mp4')
+                self.assertEqual(unsatisfiable.status_code, 416)
+
+
+class ImageDerivativesTest(SimpleTestCase):
+    def test_derivatives_are_downscaled(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'users'))
+            Image.new('RGBA', (2000, 1000)).save(os.path.join(media_root, 'users', 'avatar.png'))
+            self.assertEqual(generate_derivatives('users/avatar.png'), 3)
+            with Image.open(os.path.join(media_root, derivative_name('users/avatar.png', 'thumb'))) as thumb:
+                self.assertEqual(thumb.size, (160, 80))
+            with mock.patch('main.images.Image.open') as image_open:
+                self.assertEqual(generate_derivatives('users/avatar.png'), 0)  # Копии уже актуальны
+                image_open.assert_not_called()
+
+
+class ZipStreamTest(SimpleTestCase):
+    def test_archive_is_streamed_and_cached(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            source = os.path.join(media_root, 'report.txt')
+            with open(source, 'wb') as file:
+                file.write(b'report' * 1000)
+            content = b''.join(stream_zip([('Отчёт.txt', source)], save_as='archive.zip'))
+            with open(os.path.join(media_root, 'archive.zip'), 'rb') as cached:
+                self.assertEqual(cached.read(), content)
+            with zipfile.ZipFile(os.path.join(media_root, 'archive.zip')) as archive:
+                self.assertEqual(archive.read('Отчёт.txt'), b'report' * 1000)
+
+
+class HotViewBudgetTest(TestCase):
+    """Число запросов горячих страниц не должно выходить за бюджет из main.benchmarks"""
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', users=60, departments=3, professions=3, articles=12, tags=5, ratings=300,
+                     views=300, comments=150, notices=3, logins=3, stdout=io.StringIO())
+        leader = get_user_model().objects.filter(status='leader', is_active=True, cat2__isnull=False).first()
+        admin = get_user_model().objects.create_superuser(username='boss', email='boss@example.com',
+                                                          password='password', cat2=leader.cat2, status='leader')
+        Profile.objects.create(user=admin, profession=Profession.objects.first(), date_of_work='2024-01-01')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hot_views_fit_query_budget(self):
+        for name in HOT_VIEWS:
+            with self.subTest(view=name):
+                result = measure(self.client, name)
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['queries'], result['queries_budget'])
+
+    def test_leader_pages_do_not_query_per_employee(self):
+        leader = get_user_model().objects.filter(status='leader', is_active=True, cat2__isnull=False).first()
+        department = leader.cat2
+        get_user_model().objects.filter(cat2=department).exclude(pk=leader.pk).update(is_active=False)
+        alone = {name: measure(self.client, name, leader)['queries'] for name in ('leader_results', 'leader_api')}
+        get_user_model().objects.filter(cat2=department).update(is_active=True)
+        for name, queries in alone.items():
+            with self.subTest(view=name):
+                self.assertEqual(measure(self.client, name, leader)['queries'], queries)
+
+
+class MetricsTest(SimpleTestCase):
+    def test_prometheus_output(self):
+        registry = Registry()
+        registry.record('main:index', 'GET', 200, 0.03, 2048, 4, 0.005)
+        registry.record('main:index', 'GET', 200, 0.3, 2048, None, None)
+        output = registry.render()
+        self.assertIn('ohr_responses_total{view="main:index",method="GET",status="200"} 2', output)
+        self.assertIn('ohr_request_duration_seconds_bucket{view="main:index",le="0.05"} 1', output)
+        self.assertIn('ohr_request_duration_seconds_count{view="main:index"} 2', output)
+        self.assertIn('ohr_request_db_queries_count{view="main:index"} 1', output)
+
+    def test_cache_hits_are_counted(self):
+        backend = InstrumentedCache('metrics-test',
+                                    {'WRAPPED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})
+        backend.set('key', 'value')
+        with mock.patch('main.metrics.registry') as registry:
+            start_request()
+            backend.get('key')
+            backend.get('missing')
+            backend.get_many(['key', 'missing'])
+            finish_request()
+            registry.count_cache.assert_called_once_with(2, 2)
+
+
+class SlowQueryLogTest(TestCase):
+    def test_in_lists_share_fingerprint(self):
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+                         fingerprint('SELECT *  FROM t WHERE id IN (%s, %s, %s)'))
+
+    def test_queue_is_grouped_and_explained(self):
+        cache.clear()
+        record_slow_query('SELECT %s::int', [1], 250.0, 'main:index')
+        record_slow_query('SELECT %s::int', [2], 400.0, 'main:home')
+        self.assertEqual(process_slow_queries(), 2)
+        slow_query = SlowQuery.objects.get()
+        self.assertEqual((slow_query.calls, slow_query.max_ms, slow_query.view), (2, 400.0, 'main:home'))
+        self.assertEqual(slow_query.params, [2])
+        self.assertIn('Execution Time', slow_query.plan)
+
+    def test_sensitive_params_are_redacted(self):
+        cache.clear()
+        record_slow_query('UPDATE "users_user" SET "password" = %s WHERE "id" = %s', ['hash', 1], 300.0, 'users:x')
+        record_slow_query('SELECT 1 FROM "users_user" WHERE "users_user"."is_active" = %s AND '
+                          '"users_user"."email" IN (%s, %s)', [True, 'a@example.com', 'b@example.com'], 300.0, 'a')
+        process_slow_queries()
+        self.assertEqual(sorted(SlowQuery.objects.values_list('params', flat=True), key=str),
+                         [None, [True, '[скрыто]', '[скрыто]']])
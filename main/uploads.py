@@ -0,0 +1,143 @@
+"""
+Докачиваемая загрузка файлов по частям (упрощённый протокол tus).
+
+1. POST   /uploads/                 — создать сессию (target, filename, size и параметры); имя и размер
+                                      проверяются сразу, до передачи содержимого.
+2. PATCH  /uploads/<id>/            — дописать часть; заголовок Upload-Offset должен совпадать с уже
+                                      полученным объёмом, необязательный Upload-Checksum: sha256 <base64>.
+3. HEAD   /uploads/<id>/            — узнать, сколько байт уже получено, чтобы продолжить после обрыва.
+4. POST   /uploads/<id>/finalize/   — создать записи UploadFiles или Video из полученного файла.
+"""
+import base64
+import hashlib
+import os
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from main.blobs import adopt_blob, hash_file, publish_blobs, tmp_path
+from main.models import UploadSession
+from main.utils import validate_upload
+from ohr.settings import VIDEO_EXTENSIONS, UPLOAD_CHUNK_MAX_SIZE, UPLOAD_SESSION_TTL
+from study.models import Video
+from users.models import Departments
+
+CHUNK_LOCK_TIMEOUT = 10 * 60  # Сколько может передаваться одна часть файла
+
+
+def session_path(session: UploadSession) -> str:
+    return tmp_path(f'session-{session.pk}')
+
+
+def create_session(user, data) -> UploadSession:
+    """Проверяет параметры загрузки и создаёт сессию с пустым файлом."""
+    target = data.get('target', UploadSession.Target.FILE)
+    filename = os.path.basename(data.get('filename', ''))
+    try:
+        size = int(data.get('size', ''))
+    except ValueError:
+        raise ValidationError('Не указан размер файла.')
+
+    if target == UploadSession.Target.FILE:
+        validate_upload(filename, size)
+        if not Departments.objects.filter(pk=data.get('cat') or None).exists():
+            raise ValidationError('Отделение не выбрано.')
+        metadata = {'cat': int(data['cat']), 'title': data.get('title', '')}
+    elif target == UploadSession.Target.VIDEO:
+        validate_upload(filename, size, extensions=VIDEO_EXTENSIONS)
+        if not data.get('title') or not data.get('slug'):
+            raise ValidationError('Для видео необходимо указать название и slug.')
+        if Video.objects.filter(slug=data['slug']).exists():
+            raise ValidationError('Видео с таким slug уже существует.')
+        metadata = {'title': data['title'], 'slug': data['slug']}
+    else:
+        raise ValidationError('Неизвестное назначение загрузки.')
+
+    session = UploadSession.objects.create(user=user, target=target, filename=filename, size=size, metadata=metadata)
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def write_chunk(session_id, user, offset: int, stream, length: int, checksum: str = None) -> int:
+    """
+    Дописывает часть файла с позиции offset, читая запрос потоком прямо в файл сессии, и возвращает новый объём.
+    Пока часть передаётся, сессию занимает блокировка в кэше, а не транзакция: медленный клиент не держит
+    соединение с базой и блокировку строки. Под блокировкой строки только сверяется и сохраняется смещение.
+    Контрольная сумма считается по мере чтения; при несовпадении записанное после offset отбрасывается.
+    Ошибки различаются по code: 'offset', 'size', 'checksum'.
+    """
+    session = UploadSession.objects.get(pk=session_id, user=user)
+    if length > UPLOAD_CHUNK_MAX_SIZE or offset + length > session.size:
+        raise ValidationError('Часть файла слишком велика.', code='size')
+    lock_key = f'upload-session:{session.pk}:lock'
+    if not cache.add(lock_key, 1, timeout=CHUNK_LOCK_TIMEOUT):
+        raise ValidationError('Другая часть файла ещё передаётся.', code='offset')
+    try:
+        session.refresh_from_db(fields=['offset'])
+        if offset != session.offset:
+            raise ValidationError('Смещение не совпадает с полученным объёмом.', code='offset')
+        sha256 = hashlib.sha256()
+        with open(session_path(session), 'r+b') as file:
+            file.seek(offset)
+            remaining = length
+            while remaining and (chunk := stream.read(min(remaining, 64 * 1024))):
+                sha256.update(chunk)
+                file.write(chunk)
+                remaining -= len(chunk)
+            if checksum and checksum != 'sha256 ' + base64.b64encode(sha256.digest()).decode():
+                file.truncate(offset)
+                raise ValidationError('Контрольная сумма части не совпадает.', code='checksum')
+            file.truncate()
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+            if offset != session.offset:  # Блокировка в кэше истекла, и часть успел записать другой запрос
+                raise ValidationError('Смещение не совпадает с полученным объёмом.', code='offset')
+            session.offset = offset + length - remaining
+            session.save(update_fields=['offset'])
+    finally:
+        cache.delete(lock_key)
+    return session.offset
+
+
+def finalize_session(session: UploadSession) -> list:
+    """
+    Переносит полученный файл на место и создаёт записи; возвращает созданные объекты.
+    Хэш файла считается до транзакции, затем сессия перечитывается под блокировкой: из двух одновременных
+    вызовов второй получит UploadSession.DoesNotExist.
+    """
+    if session.offset != session.size:
+        raise ValidationError('Файл получен не полностью.')
+    path = session_path(session)
+    try:
+        digest = hash_file(path) if session.target == UploadSession.Target.FILE else None
+    except FileNotFoundError:  # Файл уже забрал параллельный вызов
+        raise UploadSession.DoesNotExist
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.target == UploadSession.Target.FILE:
+            category = Departments.objects.get(pk=session.metadata['cat'])
+            blob = adopt_blob(path, session.filename, sha256=digest)
+            created = publish_blobs([(blob, session.filename)], category, title=session.metadata.get('title'))
+        else:
+            video_field = Video._meta.get_field('file')
+            name = default_storage.get_available_name(video_field.generate_filename(None, session.filename))
+            os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+            os.replace(path, default_storage.path(name))
+            created = [Video.objects.create(title=session.metadata['title'], slug=session.metadata['slug'],
+                                            file=name)]
+        session.delete()
+    return created
+
+
+def expire_sessions() -> int:
+    """Удаляет незавершённые загрузки старше UPLOAD_SESSION_TTL вместе с их файлами."""
+    expired = list(UploadSession.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=UPLOAD_SESSION_TTL)))
+    for session in expired:
+        if os.path.isfile(session_path(session)):
+            os.remove(session_path(session))
+    UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+    return len(expired)
@@ -7,15 +7,22 @@ app_name = 'main'
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('maindoc/<slug:dep_slug>/', views.Mainfiles.as_view(), name='maindoc'),
+    path('maindoc/<slug:dep_slug>/archive/', views.UploadFilesArchiveView.as_view(), name='files_archive'),
+    path('maindoc/<slug:dep_slug>/file/<int:pk>/', views.UploadFileDownloadView.as_view(), name='file_download'),
+    path('maindoc/<slug:dep_slug>/file/<int:pk>/preview/', views.UploadFilePreviewView.as_view(), name='file_preview'),
     path('about/', views.about, name='about'),
     path('consent/', views.consent, name='consent'),
     path('addfile/', views.UploadFileView.as_view(), name='add_file'),
+    path('uploads/', views.UploadSessionCreateView.as_view(), name='upload_create'),
+    path('uploads/<uuid:pk>/', views.UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:pk>/finalize/', views.UploadSessionFinalizeView.as_view(), name='upload_finalize'),
     path('posts/', views.ArticlePosts.as_view(), name='home'),
     path('addpost/', views.AddPostView.as_view(), name='addpost'),
     path('post/<slug:post_slug>/', views.ShowPost.as_view(), name='post'),
     path('post/<int:pk>/comments/create/', views.CommentCreateView.as_view(), name='comment_create_view'),
     path('post/<int:post_pk>/comments/delete/<int:pk>/', views.CommentDeleteView.as_view(), name='comment_delete_view'),
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
+    path('notifications/read-all/', views.NotificationMarkAllReadView.as_view(), name='notification_read_all'),
     path('archive/', views.ArchiveNotifications.as_view(), name='archive'),
     path('notifications/read/<int:pk>/', views.NotificationReadView.as_view(), name='notification_read'),
     path('notice/read/<int:pk>/', views.NoticeReadView.as_view(), name='notice_read'),
@@ -26,6 +33,7 @@ urlpatterns = [
     path('rating/', views.RatingCreateView.as_view(), name='rating'),
     path('contact/', views.contact_view, name='contact'),
     path('login-history/', views.LoginHistoryView.as_view(), name='login_history'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
 
@@ -1,9 +1,19 @@
+import logging
 import os
+import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from html import unescape
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
+from django.utils.html import strip_tags
 from ohr.settings import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
 
+logger = logging.getLogger(__name__)
+
 
 def get_upload_path(instance, filename: str) -> str:
     """ Определяет путь для загрузки файла в зависимости от категории и других параметров объекта. :param instance: Экземпляр модели, для которого определяется путь загрузки. :param filename: Имя загружаемого файла. :return: Строка с полным путем для сохранения файла. """
@@ -56,10 +66,100 @@ def get_client_ip(request):
 def validate_file(file):
     """Метод для проверки файла."""
     try:
-        if file.size > MAX_FILE_SIZE:
-            raise ValidationError(f"Размер файла {file.name} превышает допустимый предел ({MAX_FILE_SIZE / 1048576:.0f} МБ).")
-        _, ext = os.path.splitext(file.name.lower())
-        if ext[1:] not in ALLOWED_EXTENSIONS:
-            raise ValidationError(f"Разрешено загружать только файлы с расширениями: {', '.join(ALLOWED_EXTENSIONS)}.")
+        validate_upload(file.name, file.size)
     except AttributeError as e:
         raise ValidationError(f"Произошла ошибка при проверке размера файла: {e}")
+
+
+def validate_upload(name: str, size: int, extensions=ALLOWED_EXTENSIONS) -> None:
+    """Проверка имени и размера файла до получения его содержимого (в том числе при загрузке по частям)."""
+    if size > MAX_FILE_SIZE:
+        raise ValidationError(f"Размер файла {name} превышает допустимый предел ({MAX_FILE_SIZE / 1048576:.0f} МБ).")
+    _, ext = os.path.splitext(name.lower())
+    if ext[1:] not in extensions:
+        raise ValidationError(f"Разрешено загружать только файлы с расширениями: {', '.join(extensions)}.")
+
+
+class CacheQueue:
+    """
+    Простая очередь поверх кэша Django (Redis в продакшене, локальный кэш в разработке).
+    Индексы элементов выдаются атомарным cache.incr, поэтому запись возможна из любого процесса,
+    а разбор очереди выполняет один обработчик под блокировкой.
+    """
+    GAP_TIMEOUT = 60  # Сколько ждать элемент, индекс которого выдан, а значение не записано или уже истекло
+
+    def __init__(self, name: str, timeout: int = 60 * 60 * 24) -> None:
+        self.name = name
+        self.timeout = timeout  # Время жизни необработанного элемента
+        self.head_key = f'{name}:head'  # Индекс последнего добавленного элемента
+        self.tail_key = f'{name}:tail'  # Индекс последнего обработанного элемента
+        self.lock_key = f'{name}:lock'
+
+    def _item_key(self, index: int) -> str:
+        return f'{self.name}:item:{index}'
+
+    def push(self, item) -> None:
+        """Добавляет элемент в очередь."""
+        cache.add(self.head_key, 0, timeout=None)
+        index = cache.incr(self.head_key)
+        cache.set(self._item_key(index), item, self.timeout)
+
+    def _gap_expired(self, index: int) -> bool:
+        """Пропуск в очереди ждёт GAP_TIMEOUT секунд: запись элемента могла ещё не завершиться."""
+        gap_key = f'{self.name}:gap:{index}'
+        cache.add(gap_key, time.time(), self.timeout)
+        if time.time() - cache.get(gap_key, time.time()) < self.GAP_TIMEOUT:
+            return False
+        logger.warning('Очередь %s: элемент %s не найден, пропускается', self.name, index)
+        return True
+
+    @contextmanager
+    def consume(self, limit: int = 1000):
+        """
+        Выдаёт не более limit элементов в порядке добавления. Из очереди они удаляются только после того,
+        как блок with завершился без ошибки, иначе будут выданы снова. Блокировка очереди держится до конца блока;
+        если другой процесс уже разбирает очередь, выдаётся пустой список.
+        """
+        if not cache.add(self.lock_key, 1, timeout=300):
+            yield []
+            return
+        try:
+            head = cache.get(self.head_key, 0)
+            tail = cache.get(self.tail_key, 0)
+            indexes = range(tail + 1, min(head, tail + limit) + 1)
+            found = cache.get_many([self._item_key(index) for index in indexes])
+            keys = []
+            for index in indexes:
+                # Следующие элементы не выдаём раньше пропущенного, чтобы сдвигать tail без дыр
+                if self._item_key(index) not in found and not self._gap_expired(index):
+                    break
+                keys.append(self._item_key(index))
+            yield [found[key] for key in keys if key in found]
+            cache.delete_many(keys)
+            cache.set(self.tail_key, tail + len(keys), timeout=None)
+        finally:
+            cache.delete(self.lock_key)
+
+    def drain(self, limit: int = 1000) -> list:
+        """Забирает из очереди не более limit элементов сразу, без подтверждения обработки."""
+        with self.consume(limit) as items:
+            return items
+
+
+def claim_batch(queryset, batch_size: int, last_pk: int = 0, **marks) -> list[int]:
+    """
+    Забирает следующую пачку строк queryset (по pk после last_pk) для обработки в одном процессе.
+    Строки, которые в этот момент забирает другой процесс, пропускаются (SKIP LOCKED), а забранные сразу
+    получают значения marks, чтобы после фиксации не попадать в выборку остальных. Возвращает pk строк.
+    """
+    with transaction.atomic():
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').select_for_update(skip_locked=True)
+                   .values_list('pk', flat=True)[:batch_size])
+        if pks:
+            queryset.model.objects.filter(pk__in=pks).update(**marks)
+    return pks
+
+
+def html_to_text(html: str) -> str:
+    """Текст без HTML-разметки и сущностей, пригодный для полнотекстового поиска."""
+    return re.sub(r'\s+', ' ', unescape(strip_tags(html or ''))).strip()
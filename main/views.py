@@ -1,4 +1,3 @@
-from itertools import chain
 from typing import Any, Dict, List, Optional
 from django.core.mail import send_mail
 from django.http import HttpRequest, HttpResponse
@@ -8,20 +7,37 @@ from babel.dates import format_datetime
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
-from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
-from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Substr
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views import View
 from django.views.decorators.http import require_safe
 from django.views.generic import FormView, CreateView, ListView, DetailView, UpdateView, DeleteView
+from main.archives import archive_entries, cached_archive_name, manifest_hash, remove_stale_archives, stream_zip
+from main.blobs import publish_files
+from main.counters import record_view
+from main.feed import FEED_KINDS, notification_feed, mark_all_read
 from main.forms import UploadFileForm, SearchForm, AddPostForm, CommentCreateForm, ContactForm
-from main.models import UploadFiles, Article, TagPost, Rating, Comment, UniqueView, \
-    Notification, Notice, UserLoginHistory, SentMessage
+from main.models import UploadFiles, Article, TagPost, Rating, Comment, \
+    Notification, Notice, UserLoginHistory, SentMessage, UploadSession
+from main.metrics import registry as metrics_registry
 from main.permissions import AuthorPermissionsMixin
+from main.previews import preview_name
+from main.search import search_articles, search_files
+from main.sendfile import sendfile
+from main.summary import invalidate_header_summary
+from main.uploads import create_session, write_chunk, finalize_session
 from main.utils import DataMixin, get_client_ip
-from ohr.settings import EMAIL_HOST_USER, EMAIL_RECIPIENT_LIST, DEFAULT_USER_IMAGE
+from ohr.settings import EMAIL_HOST_USER, EMAIL_RECIPIENT_LIST, DEFAULT_USER_IMAGE, PREVIEW_EXCERPT_LENGTH, \
+    DEBUG, METRICS_ALLOWED_IPS, METRICS_TOKEN
 from users.models import Departments
 from users.permissions import StatusRequiredMixin
 
@@ -56,6 +72,22 @@ def consent(request: HttpRequest) -> HttpResponse:
     })
 
 
+@require_safe
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики процесса в формате Prometheus. Нужен заголовок Authorization: Bearer <METRICS_TOKEN>; без токена при DEBUG
+    метрики доступны с адресов METRICS_ALLOWED_IPS. Администраторам сайта метрики доступны всегда.
+    """
+    if METRICS_TOKEN:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}')
+    else:
+        # За прокси REMOTE_ADDR — адрес nginx, поэтому вне отладки адресу без токена не доверяем
+        allowed = DEBUG and request.META.get('REMOTE_ADDR') in METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_superuser):
+        raise PermissionDenied
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class UploadFileView(LoginRequiredMixin, UserPassesTestMixin, FormView):
     """Представление для загрузки файлов, требует аутентификации и проверки прав доступа"""
     template_name = 'main/addfile.html'  # Шаблон для формы загрузки
@@ -66,32 +98,9 @@ class UploadFileView(LoginRequiredMixin, UserPassesTestMixin, FormView):
         # Обработка валидной формы
         category = form.cleaned_data['cat']  # Получаем выбранную категорию из формы
         files: List[Any] = self.request.FILES.getlist('files')  # Получаем загруженные файлы
-        is_common: bool = category.is_inpatient  # Проверяем, является ли категория стационарной
-        departments = Departments.objects.filter(is_inpatient=is_common)  # Получаем отделения по критерию
-
-        if is_common:
-            # Если категория стационарная, создаем общие записи для каждого файла
-            common_uploads = []
-            for uploaded_file in files:
-                common_upload = UploadFiles.objects.create(
-                    cat=departments.first(),  # Берем первое отделение для создания общей записи
-                    file=uploaded_file,
-                    is_common=True
-                )
-                common_uploads.append(common_upload)
-
-            # Копируем общие записи для остальных отделений
-            for common_upload in common_uploads:
-                for department in departments.exclude(pk=common_upload.cat.pk):
-                    UploadFiles.objects.create(
-                        cat=department,
-                        file=common_upload.file,
-                        is_common=True
-                    )
-        else:
-            # Если категория не стационарная, создаем записи только для выбранной категории
-            for uploaded_file in files:
-                UploadFiles.objects.create(file=uploaded_file, cat=category, is_common=False)
+        # Файл стационарного отделения публикуется для всех стационарных отделений,
+        # при этом на диске хранится одна копия содержимого
+        publish_files(files, category)
 
         return super().form_valid(form)  # Возвращаем результат обработки формы
 
@@ -106,6 +115,68 @@ class UploadFileView(LoginRequiredMixin, UserPassesTestMixin, FormView):
         return self.request.user.is_staff or self.request.user.is_superuser
 
 
+class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    """Доступ только для администраторов"""
+    def test_func(self) -> bool:
+        return self.request.user.is_staff or self.request.user.is_superuser
+
+
+class UploadSessionCreateView(StaffRequiredMixin, View):
+    """ Создание сессии загрузки большого файла по частям"""
+    def post(self, request: HttpRequest) -> JsonResponse:
+        try:
+            session = create_session(request.user, request.POST)
+        except ValidationError as e:
+            return JsonResponse({'errors': e.messages}, status=400)
+        response = JsonResponse({'id': str(session.pk), 'offset': 0}, status=201)
+        response['Location'] = reverse('main:upload_session', kwargs={'pk': session.pk})
+        response['Upload-Offset'] = 0
+        return response
+
+
+class UploadSessionView(StaffRequiredMixin, View):
+    """ Состояние загрузки (HEAD) и приём очередной части файла (PATCH)"""
+    # Коды ответа как в протоколе tus
+    ERROR_STATUS = {'offset': 409, 'size': 413, 'checksum': 460}
+
+    def head(self, request: HttpRequest, pk) -> HttpResponse:
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        response = HttpResponse(status=200)
+        response['Upload-Offset'] = session.offset
+        response['Upload-Length'] = session.size
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def patch(self, request: HttpRequest, pk) -> JsonResponse:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return JsonResponse({'errors': ['Не указан заголовок Upload-Offset.']}, status=400)
+        try:
+            new_offset = write_chunk(pk, request.user, offset, request, length, request.headers.get('Upload-Checksum'))
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'errors': ['Загрузка не найдена.']}, status=404)
+        except ValidationError as e:
+            return JsonResponse({'errors': e.messages}, status=self.ERROR_STATUS.get(e.code, 400))
+        response = JsonResponse({'offset': new_offset})
+        response['Upload-Offset'] = new_offset
+        return response
+
+
+class UploadSessionFinalizeView(StaffRequiredMixin, View):
+    """ Завершение загрузки: создание записей файла отделений или видео"""
+    def post(self, request: HttpRequest, pk) -> JsonResponse:
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        try:
+            created = finalize_session(session)
+        except UploadSession.DoesNotExist:  # Загрузку уже завершил параллельный запрос
+            return JsonResponse({'errors': ['Загрузка не найдена.']}, status=404)
+        except ValidationError as e:
+            return JsonResponse({'errors': e.messages}, status=400)
+        return JsonResponse({'created': [obj.pk for obj in created]}, status=201)
+
+
 class Mainfiles(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin, ListView):
     """Представление для отображения загруженных файлов в зависимости от категории"""
     template_name = 'main/mainfiles.html'  # Шаблон для отображения файлов
@@ -115,7 +186,11 @@ class Mainfiles(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin,
     def get_queryset(self):
         # Получаем набор данных файлов в зависимости от прав доступа и параметров сортировки
         if self.has_permissions():
-            queryset = UploadFiles.objects.filter(cat__slug=self.kwargs['dep_slug'])  # Фильтруем по slug категории
+            # Фильтруем по slug категории
+            queryset = UploadFiles.objects.filter(cat__slug=self.kwargs['dep_slug']).select_related('cat', 'blob')
+            # Для карточки достаточно начала текста документа, полный текст и поисковый вектор не загружаем
+            queryset = queryset.annotate(excerpt=Substr('content_text', 1, PREVIEW_EXCERPT_LENGTH)).defer(
+                'content_text', 'search_vector')
             order_by = self.request.GET.get('order_by', '')  # Получаем параметр сортировки из запроса
 
             # Применяем сортировку по выбранному критерию
@@ -139,6 +214,61 @@ class Mainfiles(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin,
         return context
 
 
+class UploadFileDownloadView(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin, View):
+    """Скачивание файла отделения с теми же правами доступа, что и у списка файлов"""
+    def get(self, request: HttpRequest, dep_slug: str, pk: int) -> HttpResponse:
+        if not self.has_permissions():
+            raise PermissionDenied
+        upload = get_object_or_404(UploadFiles, pk=pk, cat__slug=dep_slug)
+        return sendfile(request, upload.file.name, as_attachment=True)
+
+
+class UploadFilePreviewView(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin, View):
+    """Миниатюра первой страницы файла отделения"""
+    def get(self, request: HttpRequest, dep_slug: str, pk: int) -> HttpResponse:
+        if not self.has_permissions():
+            raise PermissionDenied
+        upload = get_object_or_404(UploadFiles.objects.select_related('blob'), pk=pk, cat__slug=dep_slug)
+        if upload.blob is None or not upload.blob.has_preview:
+            raise Http404('Миниатюра ещё не создана')
+        response = sendfile(request, preview_name(upload.blob.sha256))
+        patch_cache_control(response, private=True, max_age=60 * 60)
+        return response
+
+
+class UploadFilesArchiveView(LoginRequiredMixin, StatusRequiredMixin, AuthorPermissionsMixin, View):
+    """Скачивание всех или выбранных файлов отделения одним ZIP-архивом"""
+    def get(self, request: HttpRequest, dep_slug: str) -> HttpResponse:
+        if not self.has_permissions():
+            raise PermissionDenied
+        department = get_object_or_404(Departments, slug=dep_slug)
+        uploads = UploadFiles.objects.filter(cat=department).select_related('blob').order_by('title')
+        selected = request.GET.getlist('file')
+        if selected:
+            uploads = uploads.filter(pk__in=[pk for pk in selected if pk.isdigit()])
+        uploads = list(uploads)
+        if not uploads:
+            raise Http404('Нет файлов для скачивания')
+        filename = f'{department.slug}.zip'
+
+        if selected:
+            # Выборка каждый раз своя, её архив не кэшируется
+            return self.streaming_response(stream_zip(archive_entries(uploads)), filename)
+
+        # Архив всей папки кэшируется по хэшу её состава и отдаётся веб-сервером, пока состав не изменится
+        cached_name = cached_archive_name(department.slug, manifest_hash(uploads))
+        if default_storage.exists(cached_name):
+            return sendfile(request, cached_name, as_attachment=True, filename=filename)
+        remove_stale_archives(department.slug, keep=cached_name)
+        return self.streaming_response(stream_zip(archive_entries(uploads), save_as=cached_name), filename)
+
+    @staticmethod
+    def streaming_response(content, filename: str) -> StreamingHttpResponse:
+        response = StreamingHttpResponse(content, content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+
 class ArticlePosts(DataMixin, ListView):
     """ Представление для отображения статей"""
     template_name = 'main/posts.html'  # Шаблон для отображения списка статей
@@ -148,7 +278,7 @@ class ArticlePosts(DataMixin, ListView):
 
     def get_queryset(self):
         # Получаем список опубликованных статей с предварительной выборкой связанных данных
-        return Article.published.select_related('category').prefetch_related('ratings')
+        return Article.published.select_related('category')  # Рейтинг хранится в самой статье
 
 
 class AddPostView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
@@ -178,15 +308,8 @@ class ShowPost(DataMixin, DetailView):
         # Получаем объект статьи по слагу из URL
         article = get_object_or_404(Article.published.prefetch_related('comments__user__profile'),
                                     slug=self.kwargs[self.slug_url_kwarg])
-        ip_address = get_client_ip(self.request)  # Получаем IP-адрес пользователя
-        if not UniqueView.objects.filter(article=article, ip_address=ip_address).exists():
-            # Если запись о уникальном просмотре отсутствует, создаем ее
-            UniqueView.objects.create(article=article, ip_address=ip_address)
-
-            # Увеличиваем количество уникальных просмотров
-        article.views = article.unique_views.count()  # Обновляем общее количество просмотров
-        article.save(update_fields=['views'])  # Сохраняем только поле views
-        # Увеличиваем количество просмотров
+        # Просмотр учитывается в кэше, в базу его переносит периодическая задача flush_views
+        record_view(article.pk, get_client_ip(self.request))
         return article
 
 
@@ -242,40 +365,23 @@ class RatingCreateView(View):
     model = Rating  # Определяем модель рейтинга
 
     def post(self, request, *args, **kwargs):
-        post_id = request.POST.get('post_id')  # Получаем ID поста из POST-запроса
-        value = int(request.POST.get('value'))  # Получаем значение рейтинга
-        ip_address = get_client_ip(request)  # Получаем IP-адрес пользователя
+        try:
+            post_id = int(request.POST.get('post_id'))  # Получаем ID поста из POST-запроса
+            value = int(request.POST.get('value'))  # Получаем значение рейтинга
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Некорректный запрос'}, status=400)
+        if value not in (1, -1):
+            return JsonResponse({'error': 'Недопустимое значение оценки'}, status=400)
         user = request.user if request.user.is_authenticated else None  # Определяем пользователя (авторизованный или нет)
+        ip_address = None if user else get_client_ip(request)  # IP нужен только для оценок анонимов
 
-        # Для неавторизованных пользователей:
-        if user is None:
-            rating_queryset = self.model.objects.filter(post_id=post_id, ip_address=ip_address, user=None)
-        else:  # Для авторизованных пользователей:
-            rating_queryset = self.model.objects.filter(post_id=post_id, user=user)
-
-        if rating_queryset.exists():  # Если рейтинг уже существует
-            rating = rating_queryset.first()  # Получаем первый найденный рейтинг
-            if rating.value == value:  # Если значение рейтинга совпадает с текущим
-                rating.delete()  # Удаляем рейтинг
-                return JsonResponse({'status': 'deleted',
-                                     'rating_sum': rating.post.get_sum_rating()})  # Возвращаем статус удаления и сумму рейтинга
-            else:
-                rating.value = value  # Обновляем значение рейтинга
-                if user is None:  # Обновляем ip_address только для неавторизованных пользователей
-                    rating.ip_address = ip_address
-                rating.save()  # Сохраняем изменения в рейтинге
-                return JsonResponse({'status': 'updated',
-                                     'rating_sum': rating.post.get_sum_rating()})  # Возвращаем статус обновления и сумму рейтинга
-        else:
-            # Создаем новый рейтинг, если он не существует
-            rating = self.model.objects.create(
-                post_id=post_id,
-                user=user,
-                ip_address=ip_address,
-                value=value,
-            )
-            return JsonResponse({'status': 'created',
-                                 'rating_sum': rating.post.get_sum_rating()})  # Возвращаем статус создания и сумму рейтинга
+        # Оценка ставится, меняется или снимается одним запросом вместе с пересчётом счётчиков статьи
+        try:
+            status, rating_sum = self.model.objects.toggle(post_id=post_id, value=value,
+                                                           user_id=user.pk if user else None, ip_address=ip_address)
+        except Article.DoesNotExist:
+            return JsonResponse({'error': 'Статья не найдена'}, status=404)
+        return JsonResponse({'status': status, 'rating_sum': max(rating_sum, 0)})  # Статус и сумма рейтинга
 
 
 class CommentCreateView(LoginRequiredMixin, CreateView):
@@ -303,7 +409,9 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         comment.user = self.request.user  # Устанавливаем текущего пользователя как автора комментария.
         comment.parent_id = form.cleaned_data.get(
             'parent')  # Получаем идентификатор родительского комментария (если есть).
-        comment.save()  # Сохраняем комментарий в базе данных.
+        with transaction.atomic():
+            comment.save()  # Сохраняем комментарий в базе данных.
+            Article.objects.filter(pk=comment.post_id).update(comments_count=F('comments_count') + 1)
 
         # Если в запросе есть изображение, сохраняем его вместе с комментарием.
         if 'image' in self.request.FILES:
@@ -351,7 +459,10 @@ class CommentDeleteView(LoginRequiredMixin, DeleteView):
         # Переопределяем метод удаления комментария.
         comment = get_object_or_404(Comment, pk=kwargs['pk'],
                                     user=request.user)  # Получаем комментарий по идентификатору и проверяем, что он принадлежит текущему пользователю.
-        comment.delete()  # Удаляем комментарий из базы данных.
+        removed = comment.get_descendant_count() + 1  # Вместе с комментарием удаляются все ответы на него
+        with transaction.atomic():
+            comment.delete()  # Удаляем комментарий из базы данных.
+            Article.objects.filter(pk=comment.post_id).update(comments_count=Greatest(F('comments_count') - removed, 0))
 
         if self.is_ajax():
             # Если запрос AJAX, возвращаем успешный ответ в формате JSON.
@@ -379,20 +490,14 @@ class PostSearchView(View):
         if 'query' in request.GET:
             form = self.form_class(request.GET)  # Заполняем форму данными из запроса
             if form.is_valid():  # Проверяем, является ли форма валидной
-                A = 1.0  # Вес для заголовка статьи
-                B = 0.4  # Вес для содержимого статьи
                 query = form.cleaned_data['query']  # Получаем очищенные данные из формы
 
-                # Поиск файлов с использованием триграммного сходства
-                results_files = UploadFiles.objects.annotate(
-                    similarity=TrigramSimilarity('file', query),
-                ).filter(similarity__gt=0.07).order_by('title', '-similarity').distinct('title')
+                # Поиск файлов по тексту документов, названию и описанию среди доступных пользователю
+                if request.user.is_authenticated:
+                    results_files = search_files(query, request.user)
 
-                # Поиск статей с использованием взвешенного триграммного сходства
-                results_articles = Article.objects.annotate(
-                    similarity=(A / (A + B) * TrigramSimilarity('title', query)
-                                + B / (A + B) * TrigramWordSimilarity(query, 'content'))
-                ).filter(similarity__gt=0.25).order_by('-similarity')
+                # Полнотекстовый поиск статей по индексу с ранжированием и учётом опечаток в заголовке
+                results_articles = search_articles(query)
 
         # Подготавливаем контекст для рендеринга шаблона
         context = {
@@ -404,56 +509,41 @@ class PostSearchView(View):
         }
         return render(request, self.template_name, context)  # Возвращаем отрендеренный шаблон
 
-        # search_vector = SearchVector('title', weight='A') + \
-        #                 SearchVector('body', weight='B')
-        # search_query = SearchQuery(query)
-        # results = Post.published.annotate(
-        #     search=search_vector,
-        #     rank=SearchRank(search_vector, search_query)
-        # ).filter(search=search_query).order_by('-rank')
-
 
 class NotificationListView(LoginRequiredMixin, ListView):
     """ Представление для отображения уведомлений"""
     extra_context = {'title': 'Уведомления'}  # Дополнительный контекст для шаблона (заголовок страницы).
     template_name = 'main/notification_list.html'  # Шаблон для отображения уведомлений.
     context_object_name = 'notifications_and_notices'  # Имя контекста для доступа к уведомлениям в шаблоне.
-    paginate_by = 15  # Количество уведомлений на странице.
+    page_size = 15  # Количество уведомлений на странице.
+    is_read = False
 
     def get_queryset(self) -> list[Notification | Notice]:
-        # Метод для получения списка уведомлений (непрочитанных).
-        return self.get_notifications(is_read=False)
-
-    def get_notifications(self, is_read: bool, notification_type: str = None) -> list[Notification | Notice]:
-        # Метод для получения уведомлений и уведомлений (notice).
-        notifications = Notification.objects.filter(user=self.request.user,
-                                                    is_read=is_read)  # Получаем уведомления текущего пользователя по статусу прочтения.
-        notices = Notice.objects.filter(user=self.request.user,
-                                        is_read=is_read)  # Получаем уведомления (notice) текущего пользователя по статусу прочтения.
-
-        if notification_type == 'notification':
-            return notifications.order_by(
-                '-created_at')  # Если тип - уведомление, сортируем по времени создания (новые первыми).
-        elif notification_type == 'notice':
-            return notices.order_by(
-                '-created_at')  # Если тип - notice, сортируем по времени создания (новые первыми).
-
-        # Если тип не указан, возвращаем все уведомления и notice в отсортированном виде.
-        return sorted(
-            chain(notifications, notices),  # Объединяем списки уведомлений и notice.
-            key=lambda instance: instance.created_at,
-            reverse=True
-        )
+        # Лента собирается в базе одним запросом, страницы листаются по курсору, а не по номеру.
+        notification_type = self.request.GET.get('type')
+        kinds = [notification_type] if notification_type in FEED_KINDS else None
+        items, self.next_cursor = notification_feed(self.request.user, is_read=self.is_read, kinds=kinds,
+                                                    cursor=self.request.GET.get('cursor'), limit=self.page_size)
+        return items
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor  # Курсор следующей страницы
+        return context
 
 
 class ArchiveNotifications(NotificationListView):
     """ Представление для отображения архивных уведомлений"""
     extra_context = {'title': 'Архив уведомлений'}  # Заголовок для страницы архива уведомлений.
+    is_read = True
 
-    def get_queryset(self) -> list[Notification | Notice]:
-        notification_type = self.request.GET.get('type', None)
-        notifications = self.get_notifications(is_read=True, notification_type=notification_type)
-        return notifications
+
+class NotificationMarkAllReadView(LoginRequiredMixin, View):
+    """ Представление для отметки всех уведомлений прочитанными"""
+    def post(self, request: HttpRequest) -> HttpResponse:
+        mark_all_read(request.user)
+        invalidate_header_summary(request.user.pk)  # update() не отправляет сигналы
+        return redirect('main:notification-list')
 
 
 class NotificationReadView(View):
@@ -45,7 +45,6 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'rest_framework_simplejwt',
     'djoser',
-    "debug_toolbar",
     'main',
     'users',
     'study',
@@ -74,6 +73,8 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.MetricsMiddleware',  # Первым после SecurityMiddleware, чтобы учитывать всю цепочку
+    'main.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,12 +83,17 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'users.middleware.UpdateLastActivityMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django_auto_logout.middleware.auto_logout",
     'simple_history.middleware.HistoryRequestMiddleware',
     "axes.middleware.AxesMiddleware",
 ]
 
+if DEBUG:
+    # Панель отладки только для разработки: в рабочем режиме она не участвует в обработке запросов
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.clickjacking.XFrameOptionsMiddleware') + 1,
+                      'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'ohr.urls'
 
 TEMPLATES = [
@@ -229,6 +235,13 @@ CKEDITOR_CONFIGS = {
     },
 }
 
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+# Попадания и промахи кэша считаются для метрик: настоящий бэкенд оборачивается main.metrics.InstrumentedCache
+CACHES['default']['WRAPPED_BACKEND'] = CACHES['default']['BACKEND']
+CACHES['default']['BACKEND'] = 'main.metrics.InstrumentedCache'
+
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
@@ -342,11 +355,87 @@ AXES_NEVER_LOCKOUT_GET_USERS = lambda request: [
 
 ALLOWED_EXTENSIONS = ('pdf', 'docx', 'doc', '.xlsx', 'rtf', 'xlsx', 'pptx')
 MAX_FILE_SIZE = 200 * 1024 * 1024
+VIDEO_EXTENSIONS = ('mp4', 'webm')
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024  # максимальный размер одной части при загрузке по частям
+UPLOAD_SESSION_TTL = 60 * 60 * 24  # незавершённые загрузки по частям удаляются через это число секунд
+
+# Кто передаёт защищённые файлы после проверки прав: 'nginx' (X-Accel-Redirect), 'apache' (X-Sendfile)
+# или 'python' (FileResponse с поддержкой Range). Для nginx нужен internal-location SENDFILE_URL,
+# указывающий на MEDIA_ROOT: location /protected/ { internal; alias /path/to/media/; }
+SENDFILE_BACKEND = env('SENDFILE_BACKEND', default='python')
+SENDFILE_URL = '/protected/'
+
+FFMPEG_BINARY = env('FFMPEG_BINARY', default='ffmpeg')
+FFPROBE_BINARY = env('FFPROBE_BINARY', default='ffprobe')
+# Варианты качества видео инструктажа: (высота кадра, битрейт видео, битрейт звука)
+VIDEO_RENDITIONS = ((360, '800k', '96k'), (720, '2500k', '128k'), (1080, '5000k', '192k'))
+HLS_SEGMENT_SECONDS = 4
+HLS_PRELOAD_SEGMENTS = 2  # сколько первых сегментов следующих видео загружать заранее
+VIDEO_TRANSCODE_INTERVAL = 60 * 5  # как часто (в секундах) проверяются видео, ожидающие обработки
+
+# Уменьшенные копии изображений: название размера -> наибольшая сторона в пикселях
+IMAGE_SIZES = {'thumb': 160, 'medium': 640, 'large': 1280}
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+IMAGE_QUEUE_INTERVAL = 15  # как часто (в секундах) обрабатывается очередь изображений
+
+# Миниатюры первых страниц документов, общие для всех записей с одинаковым содержимым
+SOFFICE_BINARY = env('SOFFICE_BINARY', default='soffice')
+PDFTOPPM_BINARY = env('PDFTOPPM_BINARY', default='pdftoppm')
+PREVIEWS_DIR = 'previews'
+PREVIEW_WIDTH = 320
+PREVIEW_TIMEOUT = 120  # максимальное время (в секундах) на преобразование одного документа
+PREVIEW_EXCERPT_LENGTH = 300  # длина фрагмента текста документа в списке файлов и результатах поиска
+PREVIEW_INTERVAL = 60 * 2  # как часто (в секундах) создаются миниатюры новых файлов
+
+ARCHIVES_DIR = 'archives'  # собранные ZIP-архивы папок отделений (пересобираются при изменении состава)
+
+VIEWS_FLUSH_INTERVAL = 60  # секунд между сбросами буфера просмотров в базу
+VIEWS_DEDUP_TIMEOUT = 60 * 60 * 24  # время хранения отметки о просмотре статьи с одного IP
+
+TRAINING_DEADLINE_DAYS = 60  # сколько дней после приёма на работу даётся на сдачу тестирования
+EXPORT_CHUNK_SIZE = 2000  # сколько строк за раз читается из серверного курсора при выгрузке результатов
+
+LEADERBOARD_TIMEOUT = 60 * 5  # время жизни закэшированных рейтингов в боковой панели
+LEADERBOARD_SIZE = 10  # количество статей в закэшированных рейтингах
+TAGS_POOL_SIZE = 50  # размер пула тегов, из которого выбираются случайные
+
+HEADER_SUMMARY_TIMEOUT = 60 * 5  # время жизни сводки для шапки сайта (уведомления, достижения, курсы)
+HEADER_SUMMARY_LATEST = 5  # количество последних непрочитанных уведомлений в сводке
+
+LAST_ACTIVITY_WINDOW = 60  # активность пользователя записывается не чаще раза за это число секунд
+USER_ONLINE_TIMEOUT = 60 * 5  # пользователь считается онлайн, если был активен за это число секунд
+
+GEOIP_DATABASE = BASE_DIR / 'geoip' / 'GeoLite2-City.mmdb'  # база геолокации для истории входов
+LOGIN_EVENTS_INTERVAL = 10  # как часто (в секундах) обрабатывается очередь входов пользователей
+
+SEARCH_CONFIG = 'russian'  # конфигурация полнотекстового поиска PostgreSQL
+DOCUMENT_INDEX_INTERVAL = 60  # как часто (в секундах) индексируется текст новых файлов
+DOCUMENT_INDEX_WORKERS = 2  # количество процессов для извлечения текста из документов
+DOCUMENT_TEXT_LIMIT = 500_000  # максимальная длина сохраняемого текста документа (tsvector ограничен 1 МБ)
+
+# Метрики запросов для Prometheus (main.metrics): /metrics/ доступен по METRICS_TOKEN; список адресов учитывается
+# только при DEBUG. Адрес 127.0.0.1 сюда не добавлять: за nginx все запросы приходят с него
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_SAMPLE_RATE = 0.1  # доля ответов, для которых считаются запросы к базе и сохраняется их SQL
+METRICS_SLOW_REQUEST_MS = 1000  # ответы из выборки дольше этого времени пишутся в журнал вместе с SQL
+METRICS_SLOW_SQL_LIMIT = 10  # сколько самых долгих SQL медленного ответа попадает в журнал
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+METRICS_SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 10_000_000)
+
+# Журнал медленных SQL-запросов (main.slowlog), просматривается в админке
+SLOW_QUERY_MS = env.int('SLOW_QUERY_MS', default=200)  # запросы дольше этого времени попадают в журнал
+SLOW_QUERY_SAMPLE_RATE = 0.5  # доля медленных запросов, которые записываются в журнал
+SLOW_QUERY_INTERVAL = 60  # как часто (в секундах) обрабатывается очередь медленных запросов
+SLOW_QUERY_EXPLAIN_BATCH = 5  # сколько планов EXPLAIN (ANALYZE, BUFFERS) получается за один проход
+SLOW_QUERY_EXPLAIN_TTL = 60 * 60 * 24  # через сколько секунд план запроса получается заново
+SLOW_QUERY_EXPLAIN_TIMEOUT = 30_000  # statement_timeout (в миллисекундах) для EXPLAIN ANALYZE
 
 API_URL_KANDINSKY = 'https://api-key.fusionbrain.ai/'
 
 DEBUG_TOOLBAR_CONFIG = {
-    'SHOW_TOOLBAR_CALLBACK': lambda request: request.user.is_superuser,
+    'SHOW_TOOLBAR_CALLBACK': lambda request: DEBUG and request.user.is_superuser,
 }
 
 TELEPHONE=env('TELEPHONE')
@@ -0,0 +1,55 @@
+// Загрузка больших файлов по частям с докачкой после обрыва соединения (см. main/uploads.py)
+const CHUNK_SIZE = 4 * 1024 * 1024;
+const MAX_RETRIES = 5;
+
+const sha256Header = async (blob) => {
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return "sha256 " + btoa(String.fromCharCode(...new Uint8Array(digest)));
+};
+
+const uploadRequest = (url, options = {}) =>
+  fetch(url, { ...options, headers: { "X-CSRFToken": csrftoken, ...(options.headers || {}) } });
+
+const currentOffset = async (sessionUrl) => {
+  const response = await uploadRequest(sessionUrl, { method: "HEAD" });
+  return parseInt(response.headers.get("Upload-Offset"), 10);
+};
+
+const uploadInChunks = async (createUrl, file, params, onProgress) => {
+  const body = new FormData();
+  Object.entries({ ...params, filename: file.name, size: file.size }).forEach(([key, value]) => body.append(key, value));
+  const created = await uploadRequest(createUrl, { method: "POST", body });
+  if (!created.ok) throw new Error((await created.json()).errors.join(" "));
+  const sessionUrl = created.headers.get("Location");
+
+  let offset = 0;
+  let retries = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + CHUNK_SIZE);
+    try {
+      const response = await uploadRequest(sessionUrl, {
+        method: "PATCH",
+        body: chunk,
+        headers: {
+          "Content-Type": "application/offset+octet-stream",
+          "Upload-Offset": offset,
+          "Upload-Checksum": crypto.subtle ? await sha256Header(chunk) : "",
+        },
+      });
+      if (!response.ok && response.status !== 409 && response.status !== 460) {
+        throw new Error((await response.json()).errors.join(" "));
+      }
+      offset = response.ok ? parseInt(response.headers.get("Upload-Offset"), 10) : await currentOffset(sessionUrl);
+      retries = 0;
+    } catch (error) {
+      // Обрыв сети: ждём и продолжаем с того места, которое сервер успел получить
+      if (++retries > MAX_RETRIES) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+      offset = await currentOffset(sessionUrl);
+    }
+    onProgress(offset / file.size);
+  }
+  const finalized = await uploadRequest(sessionUrl + "finalize/", { method: "POST" });
+  if (!finalized.ok) throw new Error((await finalized.json()).errors.join(" "));
+  return finalized.json();
+};
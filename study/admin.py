@@ -3,6 +3,8 @@ from django.utils.safestring import mark_safe
 from simple_history.admin import SimpleHistoryAdmin
 
 from main.models import Article
+from main.summary import invalidate_header_summary
+from study.compliance import refresh_employee
 from study.models import Subject, Question, Answer, Slide, Video, UserAnswer, SubjectCompletion, Achievement
 
 
@@ -41,6 +43,14 @@ class SlideAdmin(admin.ModelAdmin):
 class VideoAdmin(admin.ModelAdmin):
     search_fields = ['title']
     prepopulated_fields = {"slug": ("title",)}
+    list_display = ['title', 'slug', 'transcode_status']
+    readonly_fields = ['transcode_status']
+    actions = ['retranscode']
+
+    @admin.action(description='Перекодировать заново')
+    def retranscode(self, request, queryset):
+        updated_count = queryset.update(transcode_status=Video.TranscodeStatus.PENDING)
+        self.message_user(request, f'Поставлено в очередь на перекодирование: {updated_count}')
 
 
 @admin.register(SubjectCompletion)
@@ -88,12 +98,18 @@ class SubjectCompletionAdmin(SimpleHistoryAdmin):
 
     @admin.action(description='Сбросить прогресс обучения')
     def reset_current_slide(self, request, queryset):
+        user_ids = set(queryset.values_list('users_id', flat=True))
         updated_count = queryset.update(current_slide=None, study_completed=False)
+        invalidate_header_summary(*user_ids)  # update() не отправляет сигналы, сводку сбрасываем явно
         self.message_user(request, f'Успешно сброшено {updated_count} текущих слайдов.')
 
     @admin.action(description='Сбросить тестирование')
     def reset_current_test(self, request, queryset):
+        user_ids = set(queryset.values_list('users_id', flat=True))
         updated_count = queryset.update(completed=False, score=0)
+        invalidate_header_summary(*user_ids)
+        for user_id in user_ids:
+            refresh_employee(user_id)
         self.message_user(request, f'Успешно сброшено {updated_count} тестирование')
 
 
@@ -0,0 +1,135 @@
+"""
+Сводки обучения для страницы руководителя. Строки сотрудников пересчитываются сигналами при изменении
+курсов, профиля и отделения пользователя, итоги отделения — вместе с ними; refresh_compliance
+пересобирает всё целиком (ночная задача и команда refresh_compliance).
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ohr.settings import TRAINING_DEADLINE_DAYS
+from study.models import DepartmentCompliance, EmployeeCompliance
+from users.models import Departments
+
+EMPLOYEE_FIELDS = ['department', 'deadline', 'total_subjects', 'pending_subjects', 'briefing_done', 'updated_at']
+DEPARTMENT_FIELDS = ['employees', 'incomplete', 'pending_total', 'overdue', 'no_briefing', 'updated_at']
+
+
+def employee_queryset():
+    """Пользователи с количеством назначенных и несданных курсов."""
+    return get_user_model().objects.select_related('profile').annotate(
+        total_subjects=Count('subject_completions'),
+        pending_subjects=Count('subject_completions', filter=Q(subject_completions__completed=False)),
+    )
+
+
+def build_employee(user) -> EmployeeCompliance:
+    try:
+        profile = user.profile
+    except ObjectDoesNotExist:  # Профиль создаётся после пользователя, при регистрации
+        profile = None
+    return EmployeeCompliance(
+        user_id=user.pk,
+        department_id=user.cat2_id,
+        deadline=profile.date_of_work + timedelta(days=TRAINING_DEADLINE_DAYS) if profile else None,
+        total_subjects=user.total_subjects,
+        pending_subjects=user.pending_subjects,
+        briefing_done=profile.instructaj if profile else False,
+    )
+
+
+def department_totals() -> dict:
+    """Выражения для итогов по строкам EmployeeCompliance; ключи совпадают с полями DepartmentCompliance."""
+    pending = Q(pending_subjects__gt=0)
+    return {
+        'employees': Count('pk'),
+        'incomplete': Count('pk', filter=pending),
+        'pending_total': Coalesce(Sum('pending_subjects'), 0),
+        'overdue': Count('pk', filter=pending & Q(deadline__lte=timezone.now().date())),
+        'no_briefing': Count('pk', filter=Q(briefing_done=False)),
+    }
+
+
+def department_summary(department_id: int | None = None) -> dict:
+    """Итоги отделения для страницы руководителя; без department_id — по всем отделениям."""
+    fields = DEPARTMENT_FIELDS[:-1]
+    if department_id:
+        return DepartmentCompliance.objects.filter(department_id=department_id).values(*fields).first() or {}
+    return DepartmentCompliance.objects.aggregate(**{field: Coalesce(Sum(field), 0) for field in fields})
+
+
+def attach_days_left(users) -> None:
+    """
+    Подставляет пользователям дни до отстранения из сводки. Пока строки сводки нет (например, до первого
+    refresh_compliance), срок считается по профилю; без профиля срок неизвестен (None).
+    """
+    for user in users:
+        compliance = getattr(user, 'compliance', None)
+        if compliance is not None:
+            user.days_left = compliance.days_left
+        else:
+            profile = getattr(user, 'profile', None)
+            user.days_left = profile.calculate_date if profile else None
+
+
+def refresh_department(department_id: int | None) -> None:
+    if department_id is None or not Departments.objects.filter(pk=department_id).exists():
+        return
+    totals = EmployeeCompliance.objects.filter(department_id=department_id, user__is_active=True) \
+        .aggregate(**department_totals())
+    DepartmentCompliance.objects.update_or_create(department_id=department_id, defaults=totals)
+
+
+def refresh_employee(user_id: int) -> None:
+    """Пересчитывает строку сотрудника и итоги его прежнего и текущего отделения."""
+    previous = EmployeeCompliance.objects.filter(user_id=user_id).values_list('department_id', flat=True).first()
+    user = employee_queryset().filter(pk=user_id).first()
+    if user is None:
+        refresh_department(previous)
+        return
+    build_employee(user).save()
+    for department_id in {previous, user.cat2_id}:
+        refresh_department(department_id)
+
+
+def schedule_employee_refresh(user_id: int) -> None:
+    """Пересчёт после фиксации транзакции: при каскадном удалении пользователя строки уже не будет."""
+    transaction.on_commit(lambda: refresh_employee(user_id))
+
+
+def schedule_department_refresh(department_id: int | None) -> None:
+    transaction.on_commit(lambda: refresh_department(department_id))
+
+
+def refresh_compliance(batch_size: int = 2000) -> int:
+    """
+    Пересобирает сводки всех сотрудников и отделений. Нужна после массовой загрузки в обход сигналов и раз
+    в сутки, чтобы число просроченных в итогах отделений учитывало смену даты. Возвращает число сотрудников.
+    """
+    processed = 0
+    batch = []
+    for user in employee_queryset().order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(build_employee(user))
+        if len(batch) == batch_size:
+            processed += _save_employees(batch)
+            batch = []
+    processed += _save_employees(batch)
+
+    totals = EmployeeCompliance.objects.filter(user__is_active=True, department__isnull=False) \
+        .values('department').annotate(**department_totals()).order_by()
+    departments = [DepartmentCompliance(department_id=row.pop('department'), **row) for row in totals]
+    DepartmentCompliance.objects.bulk_create(departments, update_conflicts=True, unique_fields=['department'],
+                                             update_fields=DEPARTMENT_FIELDS)
+    DepartmentCompliance.objects.exclude(department__in=[row.department_id for row in departments]).delete()
+    return processed
+
+
+def _save_employees(batch: list[EmployeeCompliance]) -> int:
+    EmployeeCompliance.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user'],
+                                           update_fields=EMPLOYEE_FIELDS)
+    return len(batch)
@@ -1,16 +1,19 @@
+from main.summary import get_header_summary
+
+
 def subject_completions(request):
     if request.user.is_authenticated:
         return {
-            'subject_completions': request.user.subject_completions.all().select_related('subjects')
+            'subject_completions': get_header_summary(request)['subject_completions']
         }
     return {}
 
 
 def achievements(request):
     if request.user.is_authenticated:
-        achievements=request.user.achievements.filter(user=request.user, is_received=False)
+        summary = get_header_summary(request)
         return {
-            'achievements': achievements,
-            'achievements_count':achievements.count()
+            'achievements': summary['achievements'],
+            'achievements_count': summary['achievements_count']
         }
     return {}
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Выгрузка результатов обучения для проверок по охране труда: строка на каждый курс сотрудника
+(сотрудники без курсов — одной строкой), потоком из серверного курсора в CSV или XLSX.
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+
+from main.exports import CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE, stream_csv, stream_xlsx
+from ohr.settings import EXPORT_CHUNK_SIZE
+from study.models import Subject
+
+HEADER = ['Отделение', 'Фамилия', 'Имя', 'Отчество', 'Логин', 'Должность', 'Дата приёма', 'Инструктаж',
+          'Курс', 'Обучение пройдено', 'Тест сдан', 'Баллы', 'Дата сдачи']
+FORMATS = {
+    'csv': (stream_csv, CSV_CONTENT_TYPE),
+    'xlsx': (stream_xlsx, XLSX_CONTENT_TYPE),
+}
+
+
+def training_results(department_id: int | None = None, date_from: date | None = None,
+                     date_to: date | None = None):
+    """
+    Строки выгрузки активных сотрудников. С фильтром по датам остаются только курсы, сданные в этот период.
+    Строки читаются из серверного курсора по EXPORT_CHUNK_SIZE, без создания объектов моделей.
+    """
+    queryset = get_user_model().objects.filter(is_active=True)
+    if department_id:
+        queryset = queryset.filter(cat2_id=department_id)
+    # Условия по датам в одном filter(): тогда столбцы курса ниже берутся из того же соединения таблиц
+    completion_filter = {}
+    if date_from:
+        completion_filter['subject_completions__data__gte'] = date_from
+    if date_to:
+        completion_filter['subject_completions__data__lte'] = date_to
+    if completion_filter:
+        queryset = queryset.filter(**completion_filter)
+
+    rows = queryset.values_list(
+        'cat2__name', 'last_name', 'first_name', 'profile__patronymic', 'username', 'profile__profession__name',
+        'profile__date_of_work', 'profile__instructaj', 'subject_completions__subjects__title',
+        'subject_completions__study_completed', 'subject_completions__completed', 'subject_completions__score',
+        'subject_completions__data',
+    ).order_by('cat2__name', 'last_name', 'first_name', 'pk', 'subject_completions__subjects__title')
+    titles = dict(Subject.TypeOfStudy.choices)
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield *row[:8], titles.get(row[8], row[8]), *row[9:]
+
+
+def export_training_results(file_format: str, **filters):
+    """Генератор байтов выгрузки в формате csv или xlsx и её MIME-тип."""
+    stream, content_type = FORMATS[file_format]
+    return stream(HEADER, training_results(**filters)), content_type
@@ -1,7 +1,15 @@
 from django import forms
+from users.models import Departments
 from .models import SubjectCompletion
 
 class SubjectCompletionForm(forms.ModelForm):
     class Meta:
         model = SubjectCompletion
-        fields = ['subjects']
\ No newline at end of file
+        fields = ['subjects']
+
+class TrainingExportForm(forms.Form):
+    """Параметры выгрузки результатов обучения"""
+    format = forms.ChoiceField(choices=[('xlsx', 'XLSX'), ('csv', 'CSV')], required=False)
+    department = forms.ModelChoiceField(queryset=Departments.objects.all(), required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
@@ -1,8 +1,11 @@
+import posixpath
+
 from ckeditor.fields import RichTextField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
 
@@ -92,10 +95,21 @@ class Slide(models.Model):
 
 
 class Video(models.Model):
+    class TranscodeStatus(models.TextChoices):
+        PENDING = 'pending', 'Ожидает обработки'
+        PROCESSING = 'processing', 'Обрабатывается'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
     title = models.CharField(max_length=100, verbose_name='Название видео')
     file = models.FileField(upload_to='videos/', verbose_name='Файл')
     slug = models.SlugField(max_length=255, unique=True, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
+    transcode_status = models.CharField(max_length=20, choices=TranscodeStatus.choices,
+                                        default=TranscodeStatus.PENDING, editable=False, verbose_name='Обработка')
+    hls_dir = models.CharField(max_length=255, blank=True, editable=False, verbose_name='Каталог HLS')
+    # Плейлисты и первые сегменты, которые страница предыдущего видео загружает заранее
+    preload_files = models.JSONField(default=list, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Видео инструктажа"
@@ -104,6 +118,22 @@ class Video(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            previous_file = Video.objects.filter(pk=self.pk).values_list('file', flat=True).first()
+            if previous_file != self.file.name:
+                self.transcode_status = self.TranscodeStatus.PENDING  # Новый файл нужно перекодировать
+        super().save(*args, **kwargs)
+
+    @property
+    def is_streamable(self) -> bool:
+        return self.transcode_status == self.TranscodeStatus.READY
+
+    @property
+    def hls_version(self) -> str:
+        """Имя каталога HLS: меняется при каждом перекодировании и входит в адреса файлов HLS"""
+        return posixpath.basename(self.hls_dir)
+
 
 class Answer(models.Model):
     video = models.ForeignKey(Video, related_name='answers', on_delete=models.CASCADE, verbose_name='Видео')
@@ -137,12 +167,70 @@ class SubjectCompletion(models.Model):
         unique_together = ('users', 'subjects')
         verbose_name = "Экзамен"
         verbose_name_plural = "Экзамены"
+        # Выборки по пользователю обслуживает unique_together, по предмету и результату — этот индекс
+        indexes = [models.Index(fields=['subjects', 'completed'], name='completion_subject_idx')]
 
 
     def __str__(self):
         return f'{self.users.last_name} {str(self.users.first_name)} - {str(self.subjects)}'
 
 
+class EmployeeCompliance(models.Model):
+    """
+    Сводка обучения сотрудника для страницы руководителя, обновляется сигналами (study.compliance).
+    Хранится срок сдачи, а не остаток дней, поэтому строка не устаревает со сменой даты.
+    """
+    user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, primary_key=True,
+                                related_name='compliance', verbose_name='Пользователь')
+    department = models.ForeignKey('users.Departments', on_delete=models.CASCADE, null=True, blank=True,
+                                   related_name='employee_compliance', verbose_name='Отделение')
+    deadline = models.DateField(null=True, blank=True, verbose_name='Срок сдачи тестирования')
+    total_subjects = models.PositiveSmallIntegerField(default=0, verbose_name='Назначено курсов')
+    pending_subjects = models.PositiveSmallIntegerField(default=0, verbose_name='Не сдано курсов')
+    briefing_done = models.BooleanField(default=False, verbose_name='Инструктаж пройден')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = "Сводка обучения сотрудника"
+        verbose_name_plural = "Сводки обучения сотрудников"
+        # Несдавшие сотрудники отделения и просроченные среди них
+        indexes = [models.Index(fields=['department', 'deadline'], condition=models.Q(pending_subjects__gt=0),
+                                name='compliance_pending_idx')]
+
+    def __str__(self):
+        return f'{self.user}: не сдано {self.pending_subjects} из {self.total_subjects}'
+
+    @property
+    def days_left(self) -> int | None:
+        """Дней до отстранения; 0 и меньше — срок истёк."""
+        if self.deadline is None:
+            return None
+        return (self.deadline - timezone.now().date()).days
+
+    @property
+    def overdue(self) -> bool:
+        return bool(self.pending_subjects) and self.days_left is not None and self.days_left <= 0
+
+
+class DepartmentCompliance(models.Model):
+    """Итоги обучения активных сотрудников отделения (study.compliance)."""
+    department = models.OneToOneField('users.Departments', on_delete=models.CASCADE, primary_key=True,
+                                      related_name='compliance', verbose_name='Отделение')
+    employees = models.PositiveIntegerField(default=0, verbose_name='Сотрудников')
+    incomplete = models.PositiveIntegerField(default=0, verbose_name='С несданными тестами')
+    pending_total = models.PositiveIntegerField(default=0, verbose_name='Не сдано курсов')
+    overdue = models.PositiveIntegerField(default=0, verbose_name='Просрочено')
+    no_briefing = models.PositiveIntegerField(default=0, verbose_name='Без инструктажа')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = "Сводка обучения отделения"
+        verbose_name_plural = "Сводки обучения отделений"
+
+    def __str__(self):
+        return f'{self.department}: {self.incomplete} из {self.employees}'
+
+
 
 
 class Achievement(models.Model):
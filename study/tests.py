@@ -1,3 +1,79 @@
+import io
+import zipfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from study.models import DepartmentCompliance, EmployeeCompliance, Subject, SubjectCompletion
+from users.models import Departments, Profession, Profile
+
+
+class ComplianceSummaryTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.department = Departments.objects.create(name='Хирургия', slug='surgery')
+        profession = Profession.objects.create(name='Медсестра')
+        subject = Subject.objects.create(title=Subject.TypeOfStudy.FIRST_AID, slug='first-aid')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leader = User.objects.create_user(username='leader', email='leader@example.com', password='password',
+                                                   cat2=self.department, status=User.Status.LEADER)
+            self.worker = User.objects.create_user(username='worker', email='worker@example.com', password='password',
+                                                   cat2=self.department, status=User.Status.WORKER)
+            for user in (self.leader, self.worker):
+                Profile.objects.create(user=user, profession=profession,
+                                       date_of_work=timezone.now().date() - timedelta(days=90))
+            self.completion = SubjectCompletion.objects.create(users=self.worker, subjects=subject)
+
+    def test_summary_follows_completions(self):
+        self.assertTrue(EmployeeCompliance.objects.get(user=self.worker).overdue)
+        summary = DepartmentCompliance.objects.get(department=self.department)
+        self.assertEqual((summary.employees, summary.incomplete, summary.overdue), (2, 1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.completion.completed = True
+            self.completion.save(update_fields=['completed'])
+        summary.refresh_from_db()
+        self.assertEqual((summary.incomplete, summary.overdue), (0, 0))
+
+    def test_incomplete_filter_runs_in_database(self):
+        self.client.force_login(self.leader)
+        response = self.client.get(reverse('study:leader_results'), {'show_incomplete': 'on'})
+        self.assertEqual([user.pk for user in response.context['users']], [self.worker.pk])
+        self.assertEqual(response.context['summary']['incomplete'], 1)
+
+
+class TrainingExportTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        profession = Profession.objects.create(name='Медсестра')
+        subject = Subject.objects.create(title=Subject.TypeOfStudy.FIRST_AID, slug='first-aid')
+        self.departments = [Departments.objects.create(name=name, slug=slug)
+                            for name, slug in (('Хирургия', 'surgery'), ('Терапия', 'therapy'))]
+        for number, department in enumerate(self.departments):
+            user = User.objects.create_user(username=f'leader{number}', email=f'leader{number}@example.com',
+                                            password='password', cat2=department, status=User.Status.LEADER)
+            Profile.objects.create(user=user, profession=profession, date_of_work='2024-01-01')
+            SubjectCompletion.objects.create(users=user, subjects=subject, completed=True, score=10)
+        self.leader = user
+
+    def test_leader_exports_own_department(self):
+        self.client.force_login(self.leader)
+        response = self.client.get(reverse('study:results_export'),
+                                   {'format': 'csv', 'department': self.departments[0].pk})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Терапия;', lines[1])
+        self.assertIn('Первая помощь пострадавшим;Нет;Да;10', lines[1])
 
-# Create your tests here.
+    def test_xlsx_is_a_valid_workbook(self):
+        self.leader.is_staff = True
+        self.leader.save()
+        self.client.force_login(self.leader)
+        response = self.client.get(reverse('study:results_export'), {'format': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as book:
+            sheet = book.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Хирургия', sheet)
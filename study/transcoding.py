@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import uuid
+
+from django.core.files.storage import default_storage
+
+from ohr.settings import FFMPEG_BINARY, FFPROBE_BINARY, VIDEO_RENDITIONS, HLS_SEGMENT_SECONDS, \
+    HLS_PRELOAD_SEGMENTS
+from study.models import Video
+
+logger = logging.getLogger(__name__)
+
+HLS_ROOT = 'videos/hls'
+MASTER_PLAYLIST = 'master.m3u8'
+POSTER = 'poster.jpg'
+
+
+def probe(path: str) -> tuple[int, bool]:
+    """Высота кадра и наличие звуковой дорожки в исходном видео."""
+    output = subprocess.run(
+        [FFPROBE_BINARY, '-v', 'error', '-show_entries', 'stream=codec_type,height', '-of', 'json', path],
+        capture_output=True, check=True, text=True).stdout
+    streams = json.loads(output).get('streams', [])
+    height = max((stream.get('height') or 0 for stream in streams if stream['codec_type'] == 'video'), default=0)
+    return height, any(stream['codec_type'] == 'audio' for stream in streams)
+
+
+def hls_command(source: str, output_dir: str, renditions, has_audio: bool) -> list[str]:
+    """Одна команда ffmpeg: декодирование исходника один раз, несколько вариантов качества и мастер-плейлист."""
+    count = len(renditions)
+    filters = [f'[0:v]split={count}' + ''.join(f'[v{i}]' for i in range(count))]
+    filters += [f'[v{i}]scale=-2:{height}[v{i}out]' for i, (height, _, _) in enumerate(renditions)]
+    command = [FFMPEG_BINARY, '-y', '-v', 'error', '-i', source, '-filter_complex', ';'.join(filters)]
+    for i, (_, video_bitrate, audio_bitrate) in enumerate(renditions):
+        command += ['-map', f'[v{i}out]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', video_bitrate,
+                    f'-maxrate:v:{i}', video_bitrate, f'-bufsize:v:{i}', video_bitrate]
+        if has_audio:
+            command += ['-map', 'a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', audio_bitrate]
+    stream_map = ' '.join(f'v:{i},a:{i}' if has_audio else f'v:{i}' for i in range(count))
+    command += [
+        '-preset', 'veryfast', '-sc_threshold', '0',
+        # Ключевой кадр в начале каждого сегмента, чтобы переключение качества было без артефактов
+        '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+        '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%03d.ts'),
+        '-master_pl_name', MASTER_PLAYLIST, '-var_stream_map', stream_map,
+        os.path.join(output_dir, '%v', 'index.m3u8'),
+    ]
+    return command
+
+
+def transcode_video(video: Video) -> None:
+    """Создаёт HLS-варианты видео, кадр-заставку и список файлов для предзагрузки."""
+    source = video.file.path
+    height, has_audio = probe(source)
+    # Варианты выше исходного разрешения не создаём; самый низкий оставляем всегда
+    renditions = [rendition for rendition in VIDEO_RENDITIONS if rendition[0] <= height] or [VIDEO_RENDITIONS[0]]
+
+    hls_dir = f'{HLS_ROOT}/{video.pk}-{uuid.uuid4().hex[:8]}'
+    output_dir = default_storage.path(hls_dir)
+    for i in range(len(renditions)):
+        os.makedirs(os.path.join(output_dir, str(i)), exist_ok=True)
+    try:
+        subprocess.run(hls_command(source, output_dir, renditions, has_audio), check=True, capture_output=True)
+        subprocess.run([FFMPEG_BINARY, '-y', '-v', 'error', '-ss', '1', '-i', source, '-frames:v', '1',
+                        '-vf', f'scale=-2:{renditions[-1][0]}', os.path.join(output_dir, POSTER)],
+                       check=True, capture_output=True)
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    # Первые сегменты самого низкого качества: с него плеер начинает воспроизведение
+    preload = [MASTER_PLAYLIST, '0/index.m3u8'] + [f'0/segment_{i:03d}.ts' for i in range(HLS_PRELOAD_SEGMENTS)]
+    previous_dir = video.hls_dir
+    video.hls_dir = hls_dir
+    video.preload_files = [name for name in preload if os.path.isfile(os.path.join(output_dir, name))]
+    video.transcode_status = Video.TranscodeStatus.READY
+    video.save(update_fields=['hls_dir', 'preload_files', 'transcode_status'])
+    if previous_dir:
+        shutil.rmtree(default_storage.path(previous_dir), ignore_errors=True)
+
+
+def transcode_pending_videos() -> int:
+    """Перекодирует видео, ожидающие обработки (периодическая задача). Возвращает количество готовых видео."""
+    done = 0
+    for video in Video.objects.filter(transcode_status=Video.TranscodeStatus.PENDING):
+        # Видео забирает только один обработчик
+        claimed = Video.objects.filter(pk=video.pk, transcode_status=Video.TranscodeStatus.PENDING).update(
+            transcode_status=Video.TranscodeStatus.PROCESSING)
+        if not claimed:
+            continue
+        try:
+            transcode_video(video)
+            done += 1
+        except Exception:
+            # Любая ошибка (ffmpeg, хранилище, разбор ffprobe, база) завершает обработку: иначе видео осталось бы
+            # в PROCESSING, а повторно забираются только PENDING
+            logger.exception('Не удалось перекодировать видео %s', video.slug)
+            Video.objects.filter(pk=video.pk).update(transcode_status=Video.TranscodeStatus.FAILED)
+    return done
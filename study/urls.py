@@ -7,9 +7,12 @@ urlpatterns = [
     path('test/<slug:test_slug>/', views.test_view, name='test'),
     path('subject/<slug:subject_slug>/', views.subject_detail, name='subject_detail'),
     path('video/<slug:video_slug>/', views.VideoInstruktajView.as_view(), name='video_detail'),
+    path('video/<slug:video_slug>/file/', views.VideoFileView.as_view(), name='video_file'),
+    path('video/<slug:video_slug>/hls/<str:version>/<path:name>', views.VideoHlsFileView.as_view(), name='video_hls'),
     path('answer/<int:answer_id>/', views.AnswerView.as_view(), name='answer'),
     path('result/', views.MyResult.as_view(), name='result'),
     path('leader/', views.LeaderResultsView.as_view(), name='leader_results'),
+    path('leader/export/', views.TrainingResultsExportView.as_view(), name='results_export'),
     path('achievements/', views.Achievements.as_view(), name='achievements'),
 
 ]
\ No newline at end of file
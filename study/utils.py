@@ -56,13 +56,13 @@ class UserQuerysetMixin:
         """
         # Проверяем статус пользователя и его права
         if user.is_staff or user.is_superuser:
-            return get_user_model().objects.filter(is_active=True).prefetch_related('subject_completions__subjects').select_related('profile__profession').order_by('cat2','status')
+            return get_user_model().objects.filter(is_active=True).prefetch_related('subject_completions__subjects').select_related('cat2', 'profile__profession').order_by('cat2','status')
         if user.status == get_user_model().Status.LEADER or user.zamestitel:
             # Получаем активных пользователей с той же категорией и предзагружаем связанные данные
             return get_user_model().objects.filter(
                 cat2=user.cat2,
                 is_active=True
-            ).prefetch_related('subject_completions__subjects').select_related('profile__profession').order_by('status')
+            ).prefetch_related('subject_completions__subjects').select_related('cat2', 'profile__profession').order_by('status')
 
         # Если у пользователя нет прав доступа, выбрасываем исключение
         raise PermissionDenied("You do not have permission to access this resource.")
@@ -1,16 +1,26 @@
+import posixpath
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import F
-from django.http import HttpRequest, HttpResponse
+from django.core.exceptions import PermissionDenied
+from django.db.models import F, Prefetch
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.views import View
 from django.views.generic import ListView, RedirectView
 
 from main.models import Notice
+from main.sendfile import sendfile
+from study.compliance import attach_days_left, department_summary
+from study.exports import export_training_results
+from study.forms import TrainingExportForm
 from study.models import Subject, SubjectCompletion, Video, Answer, Question, UserAnswer, Achievement
 from study.utils import UserQuerysetMixin, create_notice_if_not_exists
+from users.activity import attach_last_activity
 from users.models import Profile, User, Departments
 from users.permissions import StatusRequiredMixin
 from django.contrib import messages
@@ -73,7 +83,7 @@ class VideoInstruktajView(LoginRequiredMixin, View):
     def get(self, request: HttpRequest, video_slug: str) -> HttpResponse:
         profile = Profile.objects.get(user=request.user)
         video = get_object_or_404(Video, slug=video_slug)
-        answers = video.answers.all()  # Получаем ответы для текущего видео
+        answers = video.answers.select_related('next_video')  # Ответы и следующие видео (для предзагрузки)
         if video.slug == 'finish':
             profile.instructaj = True
             profile.save(update_fields=['instructaj'])
@@ -82,6 +92,27 @@ class VideoInstruktajView(LoginRequiredMixin, View):
                       {'video': video, 'answers': answers, 'title': f'Вводный инструктаж-{video}'})
 
 
+class VideoFileView(LoginRequiredMixin, View):
+    """Файл видео инструктажа: передаёт веб-сервер, перемотка работает через запросы Range"""
+    def get(self, request: HttpRequest, video_slug: str) -> HttpResponse:
+        video = get_object_or_404(Video, slug=video_slug)
+        return sendfile(request, video.file.name)
+
+
+class VideoHlsFileView(LoginRequiredMixin, View):
+    """Плейлисты, сегменты HLS и кадр-заставка перекодированного видео"""
+    def get(self, request: HttpRequest, video_slug: str, version: str, name: str) -> HttpResponse:
+        video = get_object_or_404(Video, slug=video_slug, transcode_status=Video.TranscodeStatus.READY)
+        name = posixpath.normpath(name)
+        if version != video.hls_version or name.startswith(('/', '..')):
+            raise Http404  # Каталог прежнего перекодирования уже удалён
+        response = sendfile(request, f'{video.hls_dir}/{name}')
+        # Адрес содержит имя каталога HLS, а при перекодировании создаётся новый каталог: файлы по одному адресу
+        # не меняются, поэтому их можно кэшировать, в том числе плейлисты и предзагруженные сегменты
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
 class AnswerView(RedirectView):
     """Представление для выбора ответа на инструктаже"""
     permanent = False  # Указывает, что перенаправление не является постоянным (HTTP 302)
@@ -208,17 +239,37 @@ class LeaderResultsView(LoginRequiredMixin, ListView, UserQuerysetMixin):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = self.get_user_queryset(user)
+        queryset = self.get_user_queryset(user).select_related('compliance')
         cat2 = self.request.GET.get('department')
         if cat2:
             queryset = queryset.filter(cat2=cat2)
+        # Фильтры по сводке обучения (study.compliance) выполняются в базе до разбиения на страницы
+        if self.request.GET.get('overdue'):
+            queryset = queryset.filter(compliance__pending_subjects__gt=0,
+                                       compliance__deadline__lte=timezone.now().date())
+        elif self.request.GET.get('show_incomplete'):
+            queryset = queryset.filter(compliance__pending_subjects__gt=0)
+        if self.request.GET.get('overdue') or self.request.GET.get('show_incomplete'):
+            pending = SubjectCompletion.objects.filter(completed=False).select_related('subjects')
+            queryset = queryset.prefetch_related(None).prefetch_related(Prefetch('subject_completions', pending))
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        attach_last_activity(context['users'])  # Время активности из кэша одним запросом
+        attach_days_left(context['users'])
         context['title'] = "Результаты подразделения"
         context['departments'] = Departments.objects.all().order_by('name')
         context['subjects'] = Subject.objects.all()
+        user = self.request.user
+        if user.is_staff or user.is_superuser:
+            context['summary'] = department_summary(self.request.GET.get('department') or None)
+        elif user.cat2_id:
+            context['summary'] = department_summary(user.cat2_id)
+        # Ссылки на страницы сохраняют выбранные фильтры
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['filter_query'] = f'&{query.urlencode()}' if query else ''
         return context
 
     def post(self, request, *args, **kwargs):
@@ -298,3 +349,25 @@ class Achievements(LoginRequiredMixin, ListView):
         context['all_complete'] = all(achievement['is_completed'] for achievement in context['achievements'])
 
         return context
+
+
+class TrainingResultsExportView(LoginRequiredMixin, View):
+    """Выгрузка результатов обучения в XLSX или CSV: администраторам — всей организации, руководителю — отделения"""
+    def get(self, request: HttpRequest) -> HttpResponse:
+        user = request.user
+        form = TrainingExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        department = form.cleaned_data['department']
+        if not (user.is_staff or user.is_superuser):
+            if not (user.status == User.Status.LEADER or user.zamestitel) or not user.cat2_id:
+                raise PermissionDenied
+            department = user.cat2
+        file_format = form.cleaned_data['format'] or 'xlsx'
+        content, content_type = export_training_results(
+            file_format, department_id=department.pk if department else None,
+            date_from=form.cleaned_data['date_from'], date_to=form.cleaned_data['date_to'])
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f'training-results-{timezone.now():%Y-%m-%d}.{file_format}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from main.utils import CacheQueue
+from ohr.settings import LAST_ACTIVITY_WINDOW
+
+activity_queue = CacheQueue('user-activity')
+
+
+def _last_seen_key(user_id: int) -> str:
+    return f'user-activity:last-seen:{user_id}'
+
+
+def touch(user_id: int) -> None:
+    """
+    Отмечает активность пользователя не чаще одного раза за LAST_ACTIVITY_WINDOW секунд.
+    Время хранится в кэше, а в базу попадает пачкой через flush_activity.
+    """
+    if cache.add(f'user-activity:window:{user_id}', 1, LAST_ACTIVITY_WINDOW):
+        now = timezone.now()
+        cache.set(_last_seen_key(user_id), now, 60 * 60 * 24)
+        activity_queue.push((user_id, now))
+
+
+def get_last_activity(user) -> datetime:
+    """Время последней активности: из кэша, если оно ещё не перенесено в базу."""
+    last_seen = cache.get(_last_seen_key(user.pk))
+    return max(last_seen, user.last_activity) if last_seen else user.last_activity
+
+
+def attach_last_activity(users) -> None:
+    """Подставляет пользователям время активности из кэша одним запросом get_many."""
+    users = list(users)
+    last_seen = cache.get_many([_last_seen_key(user.pk) for user in users])
+    for user in users:
+        cached = last_seen.get(_last_seen_key(user.pk))
+        if cached and cached > user.last_activity:
+            user.last_activity = cached
+        user.activity_attached = True
+
+
+def flush_activity(batch_size: int = 5000) -> int:
+    """
+    Переносит накопленные отметки активности в базу через bulk_update. Отметки удалённых пользователей
+    отбрасываются; при ошибке записи пачка остаётся в очереди. Возвращает количество пользователей.
+    """
+    user_model = get_user_model()
+    processed = 0
+    while True:
+        with activity_queue.consume(limit=batch_size) as hits:
+            if not hits:
+                break
+            latest = {}
+            for user_id, last_seen in hits:
+                latest[user_id] = max(last_seen, latest.get(user_id, last_seen))
+            existing = set(user_model.objects.filter(pk__in=latest).values_list('pk', flat=True))
+            user_model.objects.bulk_update(
+                [user_model(pk=user_id, last_activity=last_seen) for user_id, last_seen in latest.items()
+                 if user_id in existing],
+                ['last_activity'], batch_size=1000)
+            processed += len(existing)
+    return processed
@@ -3,7 +3,21 @@ from datetime import date
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.utils import timezone
 
+from main.counters import flush_views
+from main.images import process_image_queue
+from main.leaderboards import refresh_leaderboards
+from main.logins import process_login_events
 from main.models import Notice
+from main.previews import generate_pending_previews
+from main.search import index_pending_files
+from main.slowlog import process_slow_queries
+from main.uploads import expire_sessions
+from ohr.settings import VIEWS_FLUSH_INTERVAL, LEADERBOARD_TIMEOUT, LAST_ACTIVITY_WINDOW, \
+    LOGIN_EVENTS_INTERVAL, DOCUMENT_INDEX_INTERVAL, VIDEO_TRANSCODE_INTERVAL, \
+    IMAGE_QUEUE_INTERVAL, PREVIEW_INTERVAL, SLOW_QUERY_INTERVAL
+from study.compliance import refresh_compliance
+from study.transcoding import transcode_pending_videos
+from users.activity import flush_activity
 from users.models import Profile
 
 
@@ -25,4 +39,15 @@ def send_birthday_notices():
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(send_birthday_notices, trigger='cron', hour=0)
+scheduler.add_job(flush_views, trigger='interval', seconds=VIEWS_FLUSH_INTERVAL)
+scheduler.add_job(refresh_leaderboards, trigger='interval', seconds=LEADERBOARD_TIMEOUT // 2)
+scheduler.add_job(flush_activity, trigger='interval', seconds=LAST_ACTIVITY_WINDOW)
+scheduler.add_job(process_login_events, trigger='interval', seconds=LOGIN_EVENTS_INTERVAL)
+scheduler.add_job(index_pending_files, trigger='interval', seconds=DOCUMENT_INDEX_INTERVAL, max_instances=1)
+scheduler.add_job(expire_sessions, trigger='cron', hour=3)
+scheduler.add_job(refresh_compliance, trigger='cron', hour=0, minute=5, max_instances=1)
+scheduler.add_job(transcode_pending_videos, trigger='interval', seconds=VIDEO_TRANSCODE_INTERVAL, max_instances=1)
+scheduler.add_job(process_image_queue, trigger='interval', seconds=IMAGE_QUEUE_INTERVAL, max_instances=1)
+scheduler.add_job(generate_pending_previews, trigger='interval', seconds=PREVIEW_INTERVAL, max_instances=1)
+scheduler.add_job(process_slow_queries, trigger='interval', seconds=SLOW_QUERY_INTERVAL, max_instances=1)
 scheduler.start()
\ No newline at end of file
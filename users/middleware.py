@@ -1,16 +1,21 @@
+from ohr.settings import STATIC_URL, MEDIA_URL
+from users.activity import touch
+
+
 class UpdateLastActivityMiddleware:
     """
         Middleware для обновления времени последней активности пользователя.
         Этот middleware проверяет, аутентифицирован ли пользователь при каждом запросе.
-        Если пользователь аутентифицирован, вызывается метод update_last_activity(),
-        который обновляет время последней активности пользователя.
+        Активность отмечается в кэше не чаще одного раза за LAST_ACTIVITY_WINDOW,
+        в базу она переносится периодической задачей flush_activity.
     """
+    SKIPPED_PREFIXES = ('/' + STATIC_URL.lstrip('/'), MEDIA_URL)
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            request.user.update_last_activity()  # Обновление времени последней активности
+        if request.user.is_authenticated and not request.path.startswith(self.SKIPPED_PREFIXES):
+            touch(request.user.pk)  # Обновление времени последней активности
         response = self.get_response(request)
         return response
\ No newline at end of file
@@ -11,6 +11,8 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from ohr.settings import USER_ONLINE_TIMEOUT, TRAINING_DEADLINE_DAYS
+
 class User(AbstractUser):
     class Status(models.TextChoices):
         LEADER=('leader', 'Руководитель')
@@ -36,15 +38,20 @@ class User(AbstractUser):
         constraints = [
             models.UniqueConstraint(fields=['phone'], name='unique_phone', condition=models.Q(phone__isnull=False))
         ]
+        # Сотрудники отделения по статусу: руководитель отделения, результаты подразделения
+        indexes = [models.Index(fields=['cat2', 'status', 'is_active'], name='user_department_status_idx')]
 
 
     def update_last_activity(self):
-        self.last_activity = timezone.now()
-        self.save(update_fields=['last_activity'])
+        from users.activity import touch
+        touch(self.pk)
 
 
     def is_online(self):
-        return timezone.now() - self.last_activity < timedelta(minutes=5)  # например, 5 минут
+        from users.activity import get_last_activity
+        # Если время уже подставлено из кэша (attach_last_activity), повторно в кэш не обращаемся
+        last_activity = self.last_activity if getattr(self, 'activity_attached', False) else get_last_activity(self)
+        return timezone.now() - last_activity < timedelta(seconds=USER_ONLINE_TIMEOUT)
 
     def hashed_id(self) -> str:
         # Хэшируем UUID
@@ -78,7 +85,7 @@ class Profile(models.Model):
         return self.user.username
 
     def calculate_date(self):
-        return 60 - (timezone.now().date() - self.date_of_work).days
+        return TRAINING_DEADLINE_DAYS - (timezone.now().date() - self.date_of_work).days
 
 class SecurityQuestion(models.Model):
     class SecretQuestions(models.TextChoices):
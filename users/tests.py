@@ -5,6 +5,8 @@ from http import HTTPStatus
 import uuid
 from random import randint
 
+from django.core.cache import cache
+from users.activity import touch, flush_activity
 from users.models import Departments
 
 
@@ -47,4 +49,18 @@ class RegisterUserTestCase(TestCase):
         path = reverse('users:register')
         response = self.client.post(path, data)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
-        self.assertTrue(user_model.objects.filter(username=data['username']).exists())
\ No newline at end of file
+        self.assertTrue(user_model.objects.filter(username=data['username']).exists())
+
+
+class LastActivityTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='active', email='active@example.com',
+                                                         password='password')
+
+    def test_activity_is_written_once_per_window(self):
+        touch(self.user.pk)
+        touch(self.user.pk)
+        self.assertTrue(self.user.is_online())
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_activity(), 1)